@@ -14,13 +14,20 @@
 
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, ClientsideFunction, Input, Output, State
 
 from json import JSONDecodeError
 import datetime
+import flask
+import functools
+import hashlib
+import os
+import tempfile
+import threading
 
 from dwave.cloud import Client
 
+from helpers import cache
 from helpers import formatting
 from helpers import graphics
 from helpers import jobs
@@ -29,7 +36,10 @@ from helpers.layout import (description_space_plot, description_time_plot,
     description_feasibility_plot, description_problem_print, description_solutions_print,
     description_cqm_print, description_locomotion_print)
 from helpers.tool_tips import tool_tips
-from tour_planning import (build_cqm, set_legs, tour_budget_boundaries,
+from tour_planning import (TourModel, build_cqm, decode_samples, dominated_modes,
+    fixed_sampleset, presolve_cqm, restore_sampleset, sample_heuristic, set_legs,
+    solve_exact, tour_budget_boundaries, update_cqm,
+    leg_ranges,
     names_locomotion_inputs, names_leg_inputs, names_slope_inputs,
     names_weight_inputs, names_budget_inputs, names_all_modes)
 from tour_planning import MAX_SOLVER_RUNTIME
@@ -46,6 +56,17 @@ except Exception as client_err:
     init_job_status = "NO_SOLVER"
     job_status_color = dict(color="red")
 
+# Leap submissions and answer downloads run as background callbacks, if the
+# "dash[diskcache]" extras are installed, so they do not tie up web workers.
+# Local jobs already run in threads, which must stay in this process.
+background_manager = None
+if client:
+    try:
+        import diskcache
+        background_manager = dash.DiskcacheManager(diskcache.Cache("./cache/callbacks"))
+    except ImportError:
+        pass
+
 # Problem-submission section
 
 solver_card = dbc.Card([
@@ -55,6 +76,8 @@ solver_card = dbc.Card([
         dbc.Button("Solve CQM", id="btn_solve_cqm", color="primary", className="me-1",
             style={"marginBottom":"5px"}),
         dcc.Interval(id="wd_job", interval=None, n_intervals=0, disabled=True, max_intervals=1),
+        dcc.Store(id="job_events"),     # "push" while job status is pushed, else "polling"
+        dcc.Store(id="job_push"),
         dbc.Progress(id="bar_job_status", value=jobs.job_bar[init_job_status][0],
             color=jobs.job_bar[init_job_status][1], className="mb-3",
             style={"width": "60%"}),
@@ -95,10 +118,15 @@ graph_tabs = [dbc.Tab(
             align="start")],
         color="dark"),
     label=f"{graph}",
+    tab_id=f"tab_{graph.lower()}",
     id=f"graph_{graph.lower()}",
     label_style={"color": "white", "backgroundColor": "black"},)
     for graph in ["Space", "Time", "Feasibility"]]
-tabs["Graph"] = dbc.Tabs(graph_tabs)
+# True while the graphs show the solutions in "solutions_print_code", and per
+# graph, the figure-cache key of its figure and a digest of the data it shows
+tabs["Graph"] = html.Div([dbc.Tabs(graph_tabs, id="graph_tabs", active_tab="tab_space"),
+    dcc.Store(id="graph_solutions")] + [dcc.Store(id=f"{graph}_graph_state")
+    for graph in ["space", "time", "feasibility"]])
 
 double_tabs = {
     "Problem": "Displays the configured tour: length of each leg, elevation, and "\
@@ -128,6 +156,21 @@ for key, val in double_tabs.items():
         for reader in readers])
 
 tabs["CQM"] = dbc.Card([
+    dbc.Row([
+        dbc.Col([
+            dcc.RadioItems(["All", "Objective", *formatting.cqm_families],
+                value="All", id="cqm_family", inline=True,
+                inputStyle={"margin-right": "5px", "margin-left": "10px"},
+                labelStyle={"color": "white", "font-size": 12})],
+            width=9),
+        dbc.Col([
+            html.Div([
+                html.P("Page:", style={"color": "white", "fontSize": 12,
+                    "margin": "0 10px 0 0"}),
+                dcc.Input(id="cqm_page", type="number", min=1, step=1, value=1,
+                    style={"max-width": "40%"})],
+                style={"display": "flex"})],
+            width=3)]),
     dbc.Row([
         dbc.Col([
             dcc.Textarea(id=f"cqm_print", value="",
@@ -335,8 +378,135 @@ app.layout = dbc.Container([
 server = app.server
 app.config["suppress_callback_exceptions"] = True
 
+# Each event stream holds a server thread while open, so streams are served only
+# by threaded servers (the development server, or gunicorn's gthread workers) and
+# are limited in number and duration; browsers refused a stream, or whose stream
+# ends, poll. Set TOUR_PLANNING_SERVER_THREADS to the threads per server process
+# (gunicorn's --threads): streams take at most half, leaving the rest to callbacks
+SERVER_THREADS = int(os.environ.get("TOUR_PLANNING_SERVER_THREADS", 16))
+MAX_EVENT_STREAMS = max(SERVER_THREADS // 2, 1)
+EVENT_STREAM_SECONDS = 120
+event_streams = threading.BoundedSemaphore(MAX_EVENT_STREAMS)
+
+@server.route("/events/job/<job_id>")
+def job_events(job_id):
+    """Stream server-sent events of a job's status and elapsed time."""
+
+    submitted = flask.request.args.get("submitted", "")
+    try:
+        datetime.datetime.strptime(submitted, "%c")
+    except ValueError:
+        return flask.Response("Missing or malformed 'submitted' time", status=400)
+
+    if not flask.request.environ.get("wsgi.multithread"):
+        return flask.Response("Event streams need a threaded server, poll instead",
+            status=503)
+
+    if not event_streams.acquire(blocking=False):
+        return flask.Response("Too many event streams, poll instead", status=503)
+
+    response = flask.Response(jobs.status_events(client, job_id, submitted,
+        timeout=EVENT_STREAM_SECONDS), mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache"})
+    response.call_on_close(event_streams.release)
+
+    return response
+
+@server.route("/metrics/problems")
+def problems_metrics():
+    """Report usage and request latency of the pooled Problems API clients."""
+
+    return flask.jsonify(jobs.problems_pool(client).metrics() if client else {})
+
 # Callbacks Section
 
+@functools.lru_cache(maxsize=32)
+def tour_model(problem_print_code, locomotion_state):
+    """Return the (cached) coefficient model for the saved tour and locomotion."""
+
+    return TourModel(formatting.tour_from_json(problem_print_code),
+        formatting.state_from_json(locomotion_state))
+
+# Decoded samples, by a digest of the tour, locomotion and solutions code, so
+# that samples are decoded once for the solutions text and all graphics
+decoded_samples = cache.LRUCache(maxsize=16)
+
+def solutions_digest(problem_print_code, locomotion_state, solutions_print_code):
+    """Return a hex digest of the tour, locomotion and solutions shown."""
+
+    return hashlib.sha256(repr((problem_print_code, locomotion_state,
+        solutions_print_code)).encode()).hexdigest()
+
+def sample_decoding(key, sampleset, problem_print_code, locomotion_state):
+    """Return the (cached) decoded samples for the saved tour and locomotion.
+
+    ``key`` is the :func:`solutions_digest` of the sampleset's solutions code,
+    which identifies inline and stored samplesets alike.
+    """
+
+    decoded = decoded_samples.get(key)
+    if decoded is None:
+        decoded = decode_samples(sampleset, tour_model(problem_print_code, locomotion_state))
+        decoded_samples.put(key, decoded)
+
+    return decoded
+
+# Figures by a digest of the tour, locomotion, solutions and x-axis range
+# they show
+figure_cache = cache.LRUCache(maxsize=32)
+
+def cached_figure(plot, *key_parts):
+    """Return the key and the (cached) figure returned by ``plot()`` for the key parts."""
+
+    key = hashlib.sha256(repr(key_parts).encode()).hexdigest()
+    fig = figure_cache.get(key)
+    if fig is None:
+        fig = plot()
+        figure_cache.put(key, fig)
+
+    return key, fig
+
+cqm_cache = cache.LRUCache(maxsize=8)
+# Variables pruned or presolved, by job ID, uploaded problem data IDs,
+# prefetched samplesets, downloads in flight and jobs solved at submission are
+# shared with background-callback processes
+if background_manager:
+    presolved_fixed = cache.DiskCache("./cache/presolved")
+    jobs.solved_jobs = cache.DiskCache("./cache/solved")
+    jobs.uploaded_cqms = cache.DiskCache("./cache/uploads", ttl=jobs.UPLOAD_TTL)
+    jobs.prefetched = cache.DiskCache("./cache/samplesets")
+    jobs.prefetch_pending = cache.DiskCache("./cache/prefetching", ttl=jobs.PREFETCH_WAIT)
+    formatting.results = cache.DiskCache("./cache/results")
+else:
+    presolved_fixed = cache.LRUCache(maxsize=32)
+    # Removed, with any spilled samplesets, when the server exits
+    results_spill = tempfile.TemporaryDirectory(prefix="tour-planning-results-")
+    formatting.results = cache.ResultStore(spill_directory=results_spill.name)
+
+def tour_cqm(problem_print_code, locomotion_state, max_leg_slope, max_cost,
+    max_time, weight_vals):
+    """Return the cached CQM for the tour, updated for the given settings.
+
+    The CQM is rebuilt when the tour, locomotion values, slope limit or slope
+    weight change. Callers should hold ``cqm_cache.lock`` while using the
+    returned CQM.
+    """
+
+    model = tour_model(problem_print_code, locomotion_state)
+
+    with cqm_cache.lock:
+        cqm = cqm_cache.get((problem_print_code, locomotion_state))
+        if cqm is None:
+            cqm = build_cqm(formatting.tour_from_json(problem_print_code),
+                max_leg_slope, max_cost, max_time, weight_vals,
+                formatting.state_from_json(locomotion_state), model=model)
+            cqm_cache.put((problem_print_code, locomotion_state), cqm)
+        else:
+            cqm = update_cqm(cqm, model, max_leg_slope, max_cost, max_time, weight_vals)
+            cqm_cache.put((problem_print_code, locomotion_state), cqm)
+
+    return cqm
+
 @app.callback(
     Output("solver_modal", "is_open"),
     Input("btn_solve_cqm", "n_clicks"),)
@@ -456,7 +626,8 @@ def display_locomotion(cqm_print, problem_print_code, locomotion_state):
 
         locomotion_vals = formatting.state_from_json(locomotion_state)
         legs = formatting.tour_from_json(problem_print_code)
-        boundaries = tour_budget_boundaries(legs, locomotion_vals)
+        boundaries = tour_budget_boundaries(legs, locomotion_vals,
+            model=tour_model(problem_print_code, locomotion_state))
 
         return formatting.locomotion_to_display(boundaries)
 
@@ -467,10 +638,13 @@ def display_locomotion(cqm_print, problem_print_code, locomotion_state):
     [State("max_leg_slope", "value")],
     [State(id, "value") for id in names_budget_inputs],
     [State("weights_state", "children")],
-    [State("locomotion_state", "children")])
+    [State("locomotion_state", "children")],
+    [Input("cqm_family", "value")],
+    [Input("cqm_page", "value")])
 def generate_cqm(changed_input, problem_print_code, max_leg_slope,
-    max_cost, max_time, weights_state, locomotion_state,):
-    """Create the CQM and write to json & readable text."""
+    max_cost, max_time, weights_state, locomotion_state, cqm_family="All",
+    cqm_page=1):
+    """Create the CQM and write to json & readable text, one page at a time."""
 
     trigger = dash.callback_context.triggered
     trigger_id = trigger[0]["prop_id"].split(".")[0]
@@ -478,16 +652,16 @@ def generate_cqm(changed_input, problem_print_code, max_leg_slope,
     # Even when `changed_input` is generated by inputs in names_leg_inputs, no need
     # to wait for `problem_print_code`: update_legs() callback completes
     # first, even if it is deliberately slowed.
-    if trigger_id == "changed_input" or trigger_id == "problem_print_code":
-        legs = formatting.tour_from_json(problem_print_code)
-
+    if trigger_id in ["changed_input", "problem_print_code", "cqm_family", "cqm_page"]:
         weight_vals = formatting.state_from_json(weights_state)
-        locomotion_vals = formatting.state_from_json(locomotion_state)
 
-        cqm = build_cqm(legs, max_leg_slope, max_cost, max_time,
-            weight_vals, locomotion_vals)
+        with cqm_cache.lock:
+            cqm = tour_cqm(problem_print_code, locomotion_state, max_leg_slope,
+                max_cost, max_time, weight_vals)
 
-        return formatting.cqm_to_display(cqm)
+            return formatting.cqm_to_display(cqm, num_dominated=int(dominated_modes(
+                tour_model(problem_print_code, locomotion_state), max_leg_slope).sum()),
+                family=cqm_family, page=cqm_page)
 
     return dash.no_update
 
@@ -556,34 +730,147 @@ def check_user_inputs(num_legs, max_leg_length, min_leg_length, max_leg_slope,
         walk_use, cycle_use, bus_use, drive_use, usemodes_modal, \
         formatting.state_to_json(locomotion_vals), formatting.state_to_json(weight_vals)
 
-@app.callback(
-    [Output(f"{graph.lower()}_graph", "figure") for graph in ["Space", "Time", "Feasibility"]],
-    Input("solutions_print_code", "value"),
-    Input("problem_print_code", "value"),
-    [State("locomotion_state", "children")])
-def display_graphics(solutions_print_code, problem_print_code, locomotion_state):
-    """Generate graphics for legs and samples."""
+def display_graph(graph, solutions_print_code, problem_print_code, locomotion_state,
+    relayout, active_tab, graph_tab, graph_solutions, graph_state):
+    """Return the figure, or a patch of the figure shown, and state of a graph.
 
-    trigger = dash.callback_context.triggered
-    trigger_id = trigger[0]["prop_id"].split(".")[0]
+    Graphs in hidden tabs are not computed until their tab is opened.
+    Zooming into the Space or Time graph of a long tour re-renders it at full
+    detail for the visible legs. Figures are cached, and a graph showing a
+    cached figure is sent only a patch of what changed.
+    """
 
-    legs = formatting.tour_from_json(problem_print_code)
+    trigger_id = dash.callback_context.triggered[0]["prop_id"].split(".")[0]
+
+    if active_tab != "tab_graph" or graph_tab != f"tab_{graph.lower()}":
+        return dash.no_update, dash.no_update
+
+    x_range = None
+    if trigger_id == f"{graph.lower()}_graph":
+        x_range = graphics.relayout_x_range(relayout)
+        # Graphs of short tours already show every leg and zoom in the browser
+        if x_range is False or \
+            tour_model(problem_print_code, locomotion_state).num_legs <= graphics.MAX_BARS:
+            return dash.no_update, dash.no_update
 
     if trigger_id == "solutions_print_code":
+        show_solutions = True
+    elif trigger_id == "problem_print_code":
+        show_solutions = False
+    else:
+        show_solutions = bool(graph_solutions)
+
+    sampleset = None
+    if show_solutions:
         try:
             sampleset = formatting.sampleset_from_json(solutions_print_code)
         except JSONDecodeError:
-            sampleset = None    # For cancelled/failed jobs
-    else:
-        sampleset = None
+            pass    # For cancelled/failed jobs
+    solutions = solutions_print_code if sampleset else None
+
+    # A graph opened with the data it last showed keeps its figure and zoom
+    data = solutions_digest(problem_print_code, locomotion_state, solutions)
+    if trigger_id in ["tabs", "graph_tabs"] and graph_state and graph_state["data"] == data:
+        return dash.no_update, dash.no_update
 
+    legs = formatting.tour_from_json(problem_print_code)
     locomotion_vals = formatting.state_from_json(locomotion_state)
+    model = tour_model(problem_print_code, locomotion_state)
+
+    decoded = sample_decoding(data, sampleset, problem_print_code,
+        locomotion_state) if sampleset else None
+
+    if graph == "Space":
+        # Solutions are overlaid on the unchanged legs of the tour
+        key, fig = cached_figure(lambda: graphics.plot_space(legs, None, model,
+            x_range=x_range), "Space", problem_print_code, x_range)
+        if sampleset:
+            key, fig = cached_figure(lambda: graphics.plot_space(legs, sampleset,
+                model, decoded, x_range=x_range, base=fig), "Space", problem_print_code,
+                locomotion_state, solutions, x_range)
+    elif graph == "Time":
+        key, fig = cached_figure(lambda: graphics.plot_time(legs, locomotion_vals,
+            sampleset, model, decoded, x_range=x_range), "Time", problem_print_code,
+            locomotion_state, solutions, x_range)
+    else:
+        key, fig = cached_figure(lambda: graphics.plot_feasiblity(legs,
+            locomotion_vals, sampleset, model), "Feasibility", problem_print_code,
+            locomotion_state, solutions)
+
+    state = {"key": key, "data": data}
+    shown = graph_state["key"] if graph_state else None
+    if shown == key:
+        return dash.no_update, state
+
+    shown_fig = figure_cache.get(shown) if shown else None
+    return (fig if shown_fig is None else graphics.figure_patch(shown_fig, fig)), state
+
+@app.callback(
+    Output("graph_solutions", "data"),
+    Input("solutions_print_code", "value"),
+    Input("problem_print_code", "value"),)
+def select_graph_solutions(solutions_print_code, problem_print_code):
+    """Show solutions in the graphs until the legs change."""
+
+    trigger_id = dash.callback_context.triggered[0]["prop_id"].split(".")[0]
+
+    return trigger_id == "solutions_print_code"
+
+@app.callback(
+    Output("space_graph", "figure"),
+    Output("space_graph_state", "data"),
+    Input("solutions_print_code", "value"),
+    Input("problem_print_code", "value"),
+    State("locomotion_state", "children"),
+    Input("space_graph", "relayoutData"),
+    Input("tabs", "active_tab"),
+    Input("graph_tabs", "active_tab"),
+    State("graph_solutions", "data"),
+    State("space_graph_state", "data"),)
+def display_space(solutions_print_code, problem_print_code, locomotion_state,
+    relayout=None, active_tab="tab_graph", graph_tab="tab_space", graph_solutions=None,
+    graph_state=None):
+    """Generate the Space graph of legs and solutions."""
+
+    return display_graph("Space", solutions_print_code, problem_print_code,
+        locomotion_state, relayout, active_tab, graph_tab, graph_solutions, graph_state)
 
-    fig_space = graphics.plot_space(legs, sampleset)
-    fig_time = graphics.plot_time(legs, locomotion_vals, sampleset)
-    fig_feasiblity = graphics.plot_feasiblity(legs, locomotion_vals, sampleset)
+@app.callback(
+    Output("time_graph", "figure"),
+    Output("time_graph_state", "data"),
+    Input("solutions_print_code", "value"),
+    Input("problem_print_code", "value"),
+    State("locomotion_state", "children"),
+    Input("time_graph", "relayoutData"),
+    Input("tabs", "active_tab"),
+    Input("graph_tabs", "active_tab"),
+    State("graph_solutions", "data"),
+    State("time_graph_state", "data"),)
+def display_time(solutions_print_code, problem_print_code, locomotion_state,
+    relayout=None, active_tab="tab_graph", graph_tab="tab_time", graph_solutions=None,
+    graph_state=None):
+    """Generate the Time graph of solutions."""
+
+    return display_graph("Time", solutions_print_code, problem_print_code,
+        locomotion_state, relayout, active_tab, graph_tab, graph_solutions, graph_state)
 
-    return fig_space, fig_time, fig_feasiblity
+@app.callback(
+    Output("feasibility_graph", "figure"),
+    Output("feasibility_graph_state", "data"),
+    Input("solutions_print_code", "value"),
+    Input("problem_print_code", "value"),
+    State("locomotion_state", "children"),
+    Input("tabs", "active_tab"),
+    Input("graph_tabs", "active_tab"),
+    State("graph_solutions", "data"),
+    State("feasibility_graph_state", "data"),)
+def display_feasibility(solutions_print_code, problem_print_code, locomotion_state,
+    active_tab="tab_graph", graph_tab="tab_feasibility", graph_solutions=None,
+    graph_state=None):
+    """Generate the Feasibility graph of solutions."""
+
+    return display_graph("Feasibility", solutions_print_code, problem_print_code,
+        locomotion_state, None, active_tab, graph_tab, graph_solutions, graph_state)
 
 @app.callback(
     Output("alert_cancel", "children"),
@@ -643,8 +930,9 @@ def disable_buttons(job_submit_state):
 @app.callback(
     Output("bar_job_status", "value"),
     Output("bar_job_status", "color"),
-    Input("job_submit_state", "children"),)
-def set_progress_bar(job_submit_state):
+    Input("job_submit_state", "children"),
+    State("job_id", "children"),)
+def set_progress_bar(job_submit_state, job_id=None):
     """Update progress bar for job submissions."""
 
     trigger_id = dash.callback_context.triggered[0]["prop_id"].split(".")[0]
@@ -653,8 +941,18 @@ def set_progress_bar(job_submit_state):
         return jobs.job_bar["READY"][0], jobs.job_bar["READY"][1]
     else:
         state = formatting.job_status_to_str(job_submit_state)
+        progress = jobs.get_progress(job_id) if job_id and state == "IN_PROGRESS" else None
+        if progress is not None:
+            start = jobs.job_bar["PENDING"][0]
+            return int(start + (100 - start)*progress), jobs.job_bar[state][1]
         return jobs.job_bar[state][0], jobs.job_bar[state][1]
 
+def set_submission_progress(fraction):
+    """Advance the job-status bar by the fraction of a submission done."""
+
+    start, end = jobs.job_bar["SUBMITTED"][0], jobs.job_bar["PENDING"][0]
+    dash.set_props("bar_job_status", {"value": int(start + (end - start)*fraction)})
+
 @app.callback(
     Output("job_id", "children"),
     [Input("job_submit_time", "children")],
@@ -663,7 +961,9 @@ def set_progress_bar(job_submit_state):
     [State(id, "value") for id in names_budget_inputs],
     [State("weights_state", "children")],
     [State("locomotion_state", "children")],
-    [State("max_runtime", "value")],)
+    [State("max_runtime", "value")],
+    background=background_manager is not None,
+    manager=background_manager,)
 def submit_job(job_submit_time, problem_print_code, max_leg_slope,
     max_cost, max_time,  weights_state, locomotion_state, max_runtime):
     """Submit job and provide job ID."""
@@ -672,21 +972,44 @@ def submit_job(job_submit_time, problem_print_code, max_leg_slope,
 
     if trigger_id =="job_submit_time":
 
-        solver = client.get_solver(supported_problem_types__issuperset={"cqm"})
-
         weight_vals = formatting.state_from_json(weights_state)
         locomotion_vals = formatting.state_from_json(locomotion_state)
         legs = formatting.tour_from_json(problem_print_code)
+        label = f"Examples - Tour Planning, submitted: {job_submit_time}"
+
+        if not client:      # Fall back to solving locally
+            model = tour_model(problem_print_code, locomotion_state)
+            if model.num_legs <= leg_ranges["num_legs"][1]:
+                return jobs.submit_local(lambda progress: solve_exact(legs,
+                    max_leg_slope, max_cost, max_time, locomotion_vals,
+                    weight_vals=weight_vals, model=model), label)
+            return jobs.submit_local(lambda progress: sample_heuristic(legs,
+                max_leg_slope, max_cost, max_time, locomotion_vals,
+                progress=progress, model=model), label)
 
-        cqm = build_cqm(legs, max_leg_slope, max_cost, max_time,
-            weight_vals, locomotion_vals)
+        solver = client.get_solver(supported_problem_types__issuperset={"cqm"})
 
-        problem_data_id = solver.upload_cqm(cqm).result()
+        model = tour_model(problem_print_code, locomotion_state)
+        dominated = dominated_modes(model, max_leg_slope)
+        full_cqm = build_cqm(legs, max_leg_slope, max_cost, max_time, weight_vals,
+            locomotion_vals, model=model, dominated=dominated)
+        cqm, fixed = presolve_cqm(full_cqm)
+        fixed.update((label, 0) for label, pruned in
+            zip(model.labels, dominated.ravel().tolist()) if pruned)
+        if len(cqm.variables) == 0:     # Nothing left to solve
+            return jobs.submit_solved(fixed_sampleset(full_cqm, fixed), label)
+        set_submission_progress(1/3)
+
+        problem_data_id = jobs.upload_cqm(solver, cqm)
+        set_submission_progress(2/3)
         computation = solver.sample_cqm(problem_data_id,
-                    label=f"Examples - Tour Planning, submitted: {job_submit_time}",
+                    label=label,
                     time_limit=max_runtime)
 
-        return computation.wait_id()
+        job_id = computation.wait_id()
+        presolved_fixed.put(job_id, fixed)
+
+        return job_id
 
     return dash.no_update
 #
@@ -694,8 +1017,13 @@ def submit_job(job_submit_time, problem_print_code, max_leg_slope,
     Output("solutions_print_code", "value"),
     Output("solutions_print_human", "value"),
     Input("job_submit_state", "children"),
-    State("job_id", "children"),)
-def display_solutions(job_submit_state, job_id):
+    State("job_id", "children"),
+    State("problem_print_code", "value"),
+    State("locomotion_state", "children"),
+    background=background_manager is not None,
+    manager=background_manager,)
+def display_solutions(job_submit_state, job_id, problem_print_code=None,
+    locomotion_state=None):
     """Update solutions and write to json & readable text."""
 
     trigger_id = dash.callback_context.triggered[0]["prop_id"].split(".")[0]
@@ -705,13 +1033,28 @@ def display_solutions(job_submit_state, job_id):
 
     if any(formatting.job_status_to_str(job_submit_state) == status for status in jobs.TERMINATED):
         if formatting.job_status_to_str(job_submit_state) == "COMPLETED":
-            sampleset = client.retrieve_answer(job_id).sampleset
-            return formatting.sampleset_to_json(sampleset), formatting.solutions_to_display(sampleset)
+            sampleset = restore_sampleset(jobs.get_sampleset(client, job_id),
+                presolved_fixed.get(job_id))
+            code = formatting.sampleset_to_json(sampleset, key=job_id)
+            decoded = sample_decoding(solutions_digest(problem_print_code,
+                locomotion_state, code), sampleset, problem_print_code,
+                locomotion_state) if problem_print_code and locomotion_state else None
+            return code, formatting.solutions_to_display(sampleset, decoded=decoded)
         else:
-            return "No solutions for last submission", "No solutions for last submission"
+            error = jobs.get_error(job_id) if job_id else None
+            return "No solutions for last submission", "No solutions for last submission" + \
+                (f" (local solver failed with {error})" if error else "")
     else: # Other submission states like PENDING
         return dash.no_update, dash.no_update
 
+# Listens for pushed job statuses, writing them to "job_push"; if the browser
+# cannot, or the stream breaks, the "wd_job" watchdog keeps polling
+app.clientside_callback(
+    ClientsideFunction(namespace="jobs", function_name="listen"),
+    Output("job_events", "data"),
+    Input("job_id", "children"),
+    State("job_submit_time", "children"),)
+
 @app.callback(
     Output("btn_solve_cqm", "disabled"),
     Output("wd_job", "disabled"),
@@ -724,13 +1067,28 @@ def display_solutions(job_submit_state, job_id):
     Input("wd_job", "n_intervals"),
     State("job_id", "children"),
     State("job_submit_state", "children"),
-    State("job_submit_time", "children"),)
-def manage_submission(n_clicks, n_intervals, job_id, job_submit_state, job_submit_time):
+    State("job_submit_time", "children"),
+    Input("job_push", "data"),
+    State("job_events", "data"),)
+def manage_submission(n_clicks, n_intervals, job_id, job_submit_state, job_submit_time,
+    job_push=None, job_events=None):
     """Manage job submission."""
 
     trigger_id = dash.callback_context.triggered[0]["prop_id"].split(".")[0]
 
-    if not any(trigger_id == input for input in ["btn_solve_cqm", "wd_job"]):
+    if not any(trigger_id == input for input in ["btn_solve_cqm", "wd_job", "job_push"]):
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, \
+            dash.no_update, dash.no_update, dash.no_update
+
+    if trigger_id == "job_push":   # Pushed statuses replace polling
+
+        terminated = job_push["status"] in jobs.TERMINATED
+
+        return not terminated, True, dash.no_update, 0, \
+            formatting.job_status_to_display(job_push["status"]), dash.no_update, \
+            f"Elapsed: {job_push['elapsed']} sec."
+
+    if trigger_id == "wd_job" and job_events == "push":   # Tick sent before the push began
         return dash.no_update, dash.no_update, dash.no_update, dash.no_update, \
             dash.no_update, dash.no_update, dash.no_update
 
@@ -0,0 +1,43 @@
+// Pushes job status from the server's event stream into the "job_push" store.
+// Without EventSource support, or if the stream breaks, falls back to polling
+// by re-enabling the "wd_job" watchdog; its ticks are ignored while "job_events"
+// is "push".
+
+const TERMINATED = ["COMPLETED", "CANCELLED", "FAILED"];
+
+let jobEvents = null;
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    jobs: {
+        listen: function(job_id, job_submit_time) {
+            if (jobEvents) {
+                jobEvents.close();
+                jobEvents = null;
+            }
+            if (!job_id || typeof EventSource === "undefined") {
+                return "polling";
+            }
+
+            const source = new EventSource(`events/job/${encodeURIComponent(job_id)}` +
+                `?submitted=${encodeURIComponent(job_submit_time)}`);
+            source.onmessage = function(event) {
+                const data = JSON.parse(event.data);
+                if (TERMINATED.includes(data.status)) {
+                    source.close();
+                }
+                dash_clientside.set_props("job_push", {data: data});
+            };
+            source.onerror = function() {
+                source.close();
+                if (jobEvents === source) {
+                    jobEvents = null;
+                    dash_clientside.set_props("job_events", {data: "polling"});
+                    dash_clientside.set_props("wd_job", {disabled: false});
+                }
+            };
+            jobEvents = source;
+
+            return "push";
+        }
+    }
+});
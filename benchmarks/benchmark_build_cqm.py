@@ -0,0 +1,45 @@
+# Copyright 2022 D-Wave Systems Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Compare CQM construction times for the array and expression methods.
+
+Run from the repository root: ``python -m benchmarks.benchmark_build_cqm``
+"""
+
+import timeit
+
+from tour_planning import (build_cqm, set_legs, locomotion_init_values,
+    slope_init_values, names_all_modes)
+
+locomotion_vals = {mode: {"speed": locomotion_init_values[f"{mode}_speed"],
+    "cost": locomotion_init_values[f"{mode}_cost"],
+    "exercise": locomotion_init_values[f"{mode}_exercise"], "use": True}
+    for mode in names_all_modes}
+weight_vals = {"weight_cost":  {"weight": 100, "penalty": "linear"},
+    "weight_time": {"weight": 30, "penalty": "linear"},
+    "weight_slope": {"weight": 150, "penalty": "linear"}}
+
+if __name__ == "__main__":
+
+    print(f"{'num_legs':>10} {'expressions':>14} {'arrays':>14} {'speedup':>9}")
+    for num_legs in [10, 100, 1000, 10000]:
+        legs = set_legs(num_legs, 2, 10)
+        repeat = max(1, 1000 // num_legs)
+        times = {}
+        for method in ["expressions", "arrays"]:
+            times[method] = min(timeit.repeat(lambda: build_cqm(legs,
+                slope_init_values["max_leg_slope"], 1000, 1000, weight_vals,
+                locomotion_vals, method=method), number=repeat, repeat=3)) / repeat
+        print(f"{num_legs:>10} {times['expressions']*1000:>12.2f}ms "
+            f"{times['arrays']*1000:>12.2f}ms {times['expressions']/times['arrays']:>8.1f}x")
@@ -0,0 +1,45 @@
+# Copyright 2022 D-Wave Systems Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Time the local-search heuristic on long tours.
+
+Run from the repository root: ``python -m benchmarks.benchmark_sample_heuristic``
+"""
+
+import time
+
+from tour_planning import (TourModel, sample_heuristic, set_legs,
+    tour_budget_boundaries, locomotion_init_values, slope_init_values,
+    names_all_modes)
+
+locomotion_vals = {mode: {"speed": locomotion_init_values[f"{mode}_speed"],
+    "cost": locomotion_init_values[f"{mode}_cost"],
+    "exercise": locomotion_init_values[f"{mode}_exercise"], "use": True}
+    for mode in names_all_modes}
+
+if __name__ == "__main__":
+
+    print(f"{'num_legs':>10} {'first sweep':>14} {'all sweeps':>14} {'feasible':>9}")
+    for num_legs in [100, 1000, 10000, 100000]:
+        legs = set_legs(num_legs, 2, 10, seed=0, columnar=True)
+        model = TourModel(legs, locomotion_vals)
+        budgets = tour_budget_boundaries(legs, locomotion_vals, model=model)
+        times = []
+        start = time.perf_counter()
+        sampleset = sample_heuristic(legs, slope_init_values["max_leg_slope"],
+            budgets["cost_avg"], 2*budgets["time_avg"], locomotion_vals, seed=0,
+            progress=lambda fraction: times.append(time.perf_counter() - start),
+            model=model)
+        print(f"{num_legs:>10} {times[0]:>13.2f}s {times[-1]:>13.2f}s "
+            f"{sampleset.record.is_feasible.sum():>9}")
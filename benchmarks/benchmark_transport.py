@@ -0,0 +1,83 @@
+# Copyright 2022 D-Wave Systems Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Compare payload sizes and encode/decode times of JSON and the binary format.
+
+Run from the repository root: ``python -m benchmarks.benchmark_transport``
+"""
+
+import json
+import time
+
+import dimod
+import numpy as np
+
+from helpers import transport
+from tour_planning import set_legs, names_all_modes
+
+NUM_SAMPLES = 20
+
+def random_sampleset(num_legs, seed=0):
+    """Return one-hot samples, with feasibility vectors, for ``num_legs`` legs."""
+
+    rng = np.random.default_rng(seed)
+    modes = list(names_all_modes)
+    choice = rng.integers(len(modes), size=(NUM_SAMPLES, num_legs))
+    samples = np.zeros((NUM_SAMPLES, num_legs, len(modes)), dtype=np.int8)
+    np.put_along_axis(samples, choice[..., None], 1, axis=2)
+    labels = [f"{mode}_{leg}" for leg in range(num_legs) for mode in modes]
+
+    return dimod.SampleSet.from_samples((samples.reshape(NUM_SAMPLES, -1), labels),
+        "BINARY", rng.random(NUM_SAMPLES),
+        is_satisfied=rng.random((NUM_SAMPLES, 2*num_legs + 2)) < 0.9,
+        is_feasible=rng.random(NUM_SAMPLES) < 0.5)
+
+def timed(f):
+    """Return the result of ``f()`` and its best time over three runs."""
+
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        result = f()
+        times.append(time.perf_counter() - start)
+
+    return result, min(times)
+
+def compare(name, obj, to_json, from_json, encode, decode):
+
+    code, json_enc = timed(lambda: to_json(obj))
+    _, json_dec = timed(lambda: from_json(code))
+    text, bin_enc = timed(lambda: transport.to_transport(encode(obj)))
+    _, bin_dec = timed(lambda: decode(transport.from_transport(text)))
+
+    print(f"{name:>10} {obj_size(obj):>8} {len(code)/1e3:>10.1f}kB {len(text)/1e3:>10.1f}kB "
+        f"{json_enc*1000:>9.1f}ms {bin_enc*1000:>9.1f}ms "
+        f"{json_dec*1000:>9.1f}ms {bin_dec*1000:>9.1f}ms")
+
+def obj_size(obj):
+
+    return len(obj) if isinstance(obj, list) else len(obj.variables) // len(names_all_modes)
+
+if __name__ == "__main__":
+
+    print(f"{'payload':>10} {'num_legs':>8} {'json size':>12} {'binary size':>12} "
+        f"{'json enc':>11} {'binary enc':>11} {'json dec':>11} {'binary dec':>11}")
+    for num_legs in [10, 100, 10000, 100000]:
+        compare("tour", set_legs(num_legs, 2, 10, seed=0), json.dumps, json.loads,
+            transport.encode_tour, transport.decode_tour)
+    for num_legs in [10, 100, 10000, 100000]:
+        compare("sampleset", random_sampleset(num_legs),
+            lambda s: json.dumps(s.to_serializable()),
+            lambda code: dimod.SampleSet.from_serializable(json.loads(code)),
+            transport.encode_sampleset, transport.decode_sampleset)
@@ -0,0 +1,57 @@
+# Copyright 2022 D-Wave Systems Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Compare in-place CQM update times for each kind of setting change to a rebuild.
+
+Run from the repository root: ``python -m benchmarks.benchmark_update_cqm``
+"""
+
+import timeit
+
+from tour_planning import (TourModel, build_cqm, update_cqm, set_legs,
+    locomotion_init_values, names_all_modes)
+
+locomotion_vals = {mode: {"speed": locomotion_init_values[f"{mode}_speed"],
+    "cost": locomotion_init_values[f"{mode}_cost"],
+    "exercise": locomotion_init_values[f"{mode}_exercise"], "use": True}
+    for mode in names_all_modes}
+weight_vals = {"weight_cost":  {"weight": 100, "penalty": "linear"},
+    "weight_time": {"weight": 30, "penalty": "linear"},
+    "weight_slope": {"weight": 150, "penalty": "linear"}}
+weight_vals_time = {**weight_vals, "weight_time": {"weight": 60, "penalty": "quadratic"}}
+
+changes = {"budget": (5, 2000, 1000, weight_vals),
+    "weight": (5, 1000, 1000, weight_vals_time),
+    "slope": (6, 1000, 1000, weight_vals)}
+
+if __name__ == "__main__":
+
+    print(f"{'num_legs':>10} {'rebuild':>12} " +
+        " ".join(f"{change:>12}" for change in changes))
+    for num_legs in [100, 1000, 5000]:
+        legs = set_legs(num_legs, 2, 10)
+        model = TourModel(legs, locomotion_vals)
+        repeat = max(1, 1000 // num_legs)
+        times = {"rebuild": min(timeit.repeat(lambda: build_cqm(legs, 5, 1000, 1000,
+            weight_vals, locomotion_vals, model=model), number=repeat, repeat=3)) / repeat}
+        for change, settings in changes.items():
+            elapsed = []
+            for _ in range(3):
+                cqm = build_cqm(legs, 5, 1000, 1000, weight_vals, locomotion_vals,
+                    model=model)
+                elapsed.append(timeit.timeit(lambda: update_cqm(cqm, model, *settings),
+                    number=1))
+            times[change] = min(elapsed)
+        print(f"{num_legs:>10} {times['rebuild']*1000:>10.2f}ms " +
+            " ".join(f"{times[change]*1000:>10.2f}ms" for change in changes))
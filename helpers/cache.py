@@ -0,0 +1,248 @@
+# Copyright 2022 D-Wave Systems Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+from collections import OrderedDict
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+__all__ = ["DiskCache", "LRUCache", "ResultStore"]
+
+class LRUCache:
+    """Thread-safe mapping that evicts its least-recently used entries.
+
+    Entries also expire ``ttl`` seconds after they are put, if given.
+    """
+
+    def __init__(self, maxsize=32, ttl=None):
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self._data = OrderedDict()
+        self._expires = {}
+
+    def __len__(self):
+
+        return len(self._data)
+
+    def __contains__(self, key):
+
+        with self.lock:
+            return self._live(key)
+
+    def _live(self, key):
+        """Return True if ``key`` is cached and unexpired, dropping it if expired."""
+
+        if key not in self._data:
+            return False
+        if self.ttl is not None and time.monotonic() >= self._expires[key]:
+            del self._data[key], self._expires[key]
+            return False
+        return True
+
+    def get(self, key, default=None):
+        """Return the value for ``key`` and mark it as recently used."""
+
+        with self.lock:
+            if not self._live(key):
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        """Add or replace ``key``, evicting old entries beyond ``maxsize``."""
+
+        with self.lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.ttl is not None:
+                self._expires[key] = time.monotonic() + self.ttl
+            while len(self._data) > self.maxsize:
+                self._expires.pop(self._data.popitem(last=False)[0], None)
+
+    def pop(self, key, default=None):
+        """Remove ``key`` and return its value."""
+
+        with self.lock:
+            self._expires.pop(key, None)
+            return self._data.pop(key, default)
+
+    def clear(self):
+
+        with self.lock:
+            self._data.clear()
+            self._expires.clear()
+
+class DiskCache:
+    """Process-safe mapping on disk with the interface of :class:`LRUCache`.
+
+    For entries shared with background-callback processes. Entries expire
+    ``ttl`` seconds after they are put, if given, and the least-recently used
+    are evicted beyond ``size_limit`` bytes. Requires ``diskcache``.
+    """
+
+    def __init__(self, directory, ttl=None, size_limit=2**28):
+
+        import diskcache
+
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self._cache = diskcache.Cache(directory, size_limit=size_limit,
+            eviction_policy="least-recently-used")
+
+    def __len__(self):
+
+        return len(self._cache)
+
+    def __contains__(self, key):
+
+        return key in self._cache
+
+    def get(self, key, default=None):
+        """Return the value for ``key`` and mark it as recently used."""
+
+        return self._cache.get(key, default)
+
+    def put(self, key, value):
+        """Add or replace ``key``, evicting old entries beyond ``size_limit``."""
+
+        self._cache.set(key, value, expire=self.ttl)
+
+    def pop(self, key, default=None):
+        """Remove ``key`` and return its value."""
+
+        return self._cache.pop(key, default)
+
+    def clear(self):
+
+        self._cache.clear()
+
+class ResultStore:
+    """Thread-safe mapping bounded by the total pickled size of its entries.
+
+    Least-recently used entries beyond ``max_bytes`` are evicted or, if
+    ``spill_directory`` is given, spilled to files there and loaded back on
+    access. Spilled files beyond ``max_spill_bytes`` are deleted, oldest first.
+    """
+
+    def __init__(self, max_bytes=2**28, spill_directory=None, max_spill_bytes=2**30):
+
+        self.max_bytes = max_bytes
+        self.spill_directory = spill_directory
+        self.max_spill_bytes = max_spill_bytes
+        self.lock = threading.RLock()
+        self._data = OrderedDict()      # Values and sizes, by key
+        self._spilled = OrderedDict()   # File paths and sizes, by key
+        self._bytes = 0
+        self._spilled_bytes = 0
+
+    def __len__(self):
+
+        return len(self._data) + len(self._spilled)
+
+    def __contains__(self, key):
+
+        with self.lock:
+            return key in self._data or key in self._spilled
+
+    def _spill_path(self, key):
+
+        return os.path.join(self.spill_directory,
+            hashlib.sha256(repr(key).encode()).hexdigest() + ".pkl")
+
+    def _unspill(self, key):
+        """Forget ``key``'s spilled file and delete it."""
+
+        path, size = self._spilled.pop(key)
+        self._spilled_bytes -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+
+        while self._bytes > self.max_bytes and self._data:
+            key, (value, size) = self._data.popitem(last=False)
+            self._bytes -= size
+            if self.spill_directory is not None and size <= self.max_spill_bytes:
+                os.makedirs(self.spill_directory, exist_ok=True)
+                path = self._spill_path(key)
+                with open(path, "wb") as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                self._spilled[key] = (path, size)
+                self._spilled_bytes += size
+        while self._spilled_bytes > self.max_spill_bytes:
+            self._unspill(next(iter(self._spilled)))
+
+    def _load(self, key):
+        """Return a spilled value, removing its file."""
+
+        path, size = self._spilled[key]
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+        self._unspill(key)
+        return value, size
+
+    def _insert(self, key, value, size):
+
+        self._data[key] = (value, size)
+        self._bytes += size
+        self._evict()
+
+    def get(self, key, default=None):
+        """Return the value for ``key``, loading it if spilled, and mark it as recently used."""
+
+        with self.lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key][0]
+            if key not in self._spilled:
+                return default
+            value, size = self._load(key)
+            self._insert(key, value, size)
+            return value
+
+    def put(self, key, value):
+        """Add or replace ``key``, evicting or spilling old entries beyond ``max_bytes``."""
+
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        with self.lock:
+            if key in self._data:
+                self._bytes -= self._data.pop(key)[1]
+            if key in self._spilled:
+                self._unspill(key)
+            self._insert(key, value, size)
+
+    def pop(self, key, default=None):
+        """Remove ``key`` and return its value."""
+
+        with self.lock:
+            if key in self._data:
+                value, size = self._data.pop(key)
+                self._bytes -= size
+                return value
+            if key in self._spilled:
+                return self._load(key)[0]
+            return default
+
+    def clear(self):
+
+        with self.lock:
+            for key in list(self._spilled):
+                self._unspill(key)
+            self._data.clear()
+            self._bytes = 0
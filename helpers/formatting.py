@@ -13,17 +13,40 @@
 #    limitations under the License.
 
 import pandas as pd
+import hashlib
+import itertools
 import json
 
 import dimod
 
-from tour_planning import weight_ranges, budget_ranges
+from helpers import transport
+from helpers.cache import ResultStore
+from tour_planning import weight_ranges, budget_ranges, decode_samples
 
 __all__ = ["job_status_to_str", "tour_from_json",
     "job_status_to_display",  "tour_to_display", "tour_to_json",
     "locomotion_to_display", "solutions_to_display",
-    "sampleset_to_json", "sampleset_from_json", "cqm_to_display",
-    "state_from_json", "state_to_json"]
+    "sampleset_to_json", "sampleset_from_json", "cqm_to_display", "cqm_families",
+    "state_from_json", "state_to_json", "stored_key"]
+
+# Large samplesets, by job ID, and large tours, by digest, are kept server-side
+# and only their keys and summaries are written for the browser. The store is
+# per process unless shared on disk, as the app does for background callbacks.
+# Samplesets are stored in the compact binary format of ``helpers.transport``;
+# what is written for the browser stays JSON, shown to users as code to copy
+results = ResultStore()
+LARGE_TOUR_LEGS = 1000
+LARGE_SAMPLESET_VALUES = 100_000    # Samples x variables
+
+def _stored_key(data):
+    """Return the key of parsed code for a stored result, else None."""
+
+    return data["key"] if isinstance(data, dict) and "key" in data else None
+
+def stored_key(code):
+    """Return the key of a stored result written by this module, else None."""
+
+    return _stored_key(json.loads(code))
 
 def job_status_to_display(code):
     """Output status as 'Status: <status>'."""
@@ -42,14 +65,32 @@ def tour_to_display(problem):
     return df.to_string()
 
 def tour_to_json(problem):
-    """Output problem for code."""
+    """Output problem for code, storing tours of over ``LARGE_TOUR_LEGS`` legs."""
+
+    code = json.dumps(problem)
+    if len(problem) <= LARGE_TOUR_LEGS:
+        return code
+
+    key = "tour-" + hashlib.sha256(code.encode()).hexdigest()
+    results.put(key, problem)
 
-    return json.dumps(problem)
+    return json.dumps({"key": key, "summary": {"num_legs": len(problem),
+        "length": round(sum(leg["length"] for leg in problem), 1),
+        "tollbooths": sum(leg["toll"] for leg in problem)}})
 
 def tour_from_json(code):
-    """Input problem from code."""
+    """Input problem from code, loading stored tours."""
 
-    return json.loads(code)
+    data = json.loads(code)
+    key = _stored_key(data)
+    if key is None:
+        return data
+
+    problem = results.get(key)
+    if problem is None:
+        raise KeyError(f"Tour {key} is no longer stored; regenerate the legs")
+
+    return problem
 
 def locomotion_to_display(boundaries):
     """Output locomotion for humans."""
@@ -63,56 +104,152 @@ Average time is {boundaries['time_avg']}.
 
     return first_lines
 
-def solutions_to_display(sampleset):
-    """Output solutions for humans."""
+def solutions_to_display(sampleset, model=None, decoded=None):
+    """Output solutions for humans, reusing the ``decoded`` samples if given."""
 
     s = ""
-    sampleset_feasible = sampleset.filter(lambda row: row.is_feasible)
-    if len(sampleset_feasible) == 0:
+    if decoded is None:
+        decoded = decode_samples(sampleset, model)
+    if decoded.best is None:
         return "No feasible solutions found."
-    first = sorted({int(key.split('_')[1]): key.split('_')[0] for key,val in \
-        sampleset_feasible.first.sample.items() if val==1.0}.items())
-    ratio = round(len(sampleset_feasible)/len(sampleset), 3)
+    first = decoded.legs()
+    ratio = round(decoded.feasible.sum()/len(sampleset), 3)
     s += "Feasible solutions: {:.1%} of {} samples.\n".format((ratio), len(sampleset))
-    s += f"Best solution with energy {round(sampleset_feasible.first.energy)} is:\n"
+    s += f"Best solution with energy {round(decoded.energy[decoded.best])} is:\n"
     for leg in first:
         s += f"{leg}\n"
     return s
 
-def sampleset_to_json(sampleset):
-    """Output solutions for code."""
+def sampleset_to_json(sampleset, key=None):
+    """Output solutions for code, storing samplesets of over
+    ``LARGE_SAMPLESET_VALUES`` sample values under ``key``, if given."""
+
+    if key is None or len(sampleset)*len(sampleset.variables) <= LARGE_SAMPLESET_VALUES:
+        return json.dumps(sampleset.to_serializable())
+
+    try:
+        results.put(key, transport.encode_sampleset(sampleset))
+    except (TypeError, ValueError):     # Not binary, or info not JSON serializable
+        results.put(key, sampleset)
+    feasible = sampleset.record.is_feasible.reshape(len(sampleset))
 
-    return json.dumps(sampleset.to_serializable())
+    return json.dumps({"key": key, "summary": {"num_samples": len(sampleset),
+        "num_feasible": int(feasible.sum()), "num_variables": len(sampleset.variables),
+        "best_feasible_energy": float(sampleset.record.energy[feasible].min())
+            if feasible.any() else None}})
 
 def sampleset_from_json(saved_sampleset):
-    """Retrieve saved sampleset."""
-
-    return dimod.SampleSet.from_serializable(json.loads(saved_sampleset))
-
-def cqm_to_display(cqm):
-    """Output CQM for humans."""
-
-    one_hots_str = ""
-    for key, val in cqm.constraints.items():
-        if "One-hot" in key:
-            one_hots_str += "\n\t" + key + ": " + val.to_polystring()
-
-    slope_str = ""
-    for key, val in cqm.constraints.items():
-        if "Too steep" in key:
-            slope_str += "\n\t" + key + ": " + val.to_polystring()
-
-    toll_str = ""
-    for key, val in cqm.constraints.items():
-        if "Toll to drive" in key:
-            toll_str += "\n\t" + key + ": " + val.to_polystring()
-
-    print_str = "Objective (Maximize Exercise):\n\n\t" + cqm.objective.to_polystring()
-    print_str += "\n\nCost Constraint: \n\n\t" + cqm.constraints["Total cost"].to_polystring()
-    print_str += "\n\nTime Constraint: \n\n\t" + cqm.constraints["Total time"].to_polystring()
-    print_str += "\n\nSlope Constraints: \n" + slope_str
-    print_str += "\n\nSingle-Locomotion-Mode-Per-Leg Constraints: \n" + one_hots_str
-    print_str += "\n\nToll Booth Constraints: \n" + toll_str
+    """Retrieve saved sampleset, or None if it is no longer stored."""
+
+    data = json.loads(saved_sampleset)
+    key = _stored_key(data)
+    if key is None:
+        return dimod.SampleSet.from_serializable(data)
+
+    stored = results.get(key)
+    if isinstance(stored, bytes):
+        return transport.decode_sampleset(stored)
+
+    return stored
+
+# Constraints of the CQM display, by family: label match and section header
+cqm_families = {
+    "Cost": ("Total cost", "Cost Constraint"),
+    "Time": ("Total time", "Time Constraint"),
+    "Slope": ("Too steep", "Slope Constraints"),
+    "One-hot": ("One-hot", "Single-Locomotion-Mode-Per-Leg Constraints"),
+    "Toll": ("Toll to drive", "Toll Booth Constraints")}
+CQM_PAGE_SIZE = 50
+MAX_POLYSTRING_TERMS = 100
+
+def _num_terms(expression):
+
+    return expression.num_variables + expression.num_interactions
+
+def _polystring(expression):
+    """Return the polystring of an objective or constraint, truncated to
+    ``MAX_POLYSTRING_TERMS`` terms."""
+
+    lhs = getattr(expression, "lhs", expression)
+    num_terms = _num_terms(lhs)
+    if num_terms <= MAX_POLYSTRING_TERMS:
+        return expression.to_polystring()
+
+    qm = dimod.QuadraticModel()
+    for v, bias in itertools.islice(lhs.linear.items(), MAX_POLYSTRING_TERMS):
+        qm.add_variable(lhs.vartype(v), v)
+        qm.set_linear(v, bias)
+    for (u, v), bias in itertools.islice(lhs.quadratic.items(),
+        MAX_POLYSTRING_TERMS - qm.num_variables):
+        qm.add_variables_from([(lhs.vartype(u), u), (lhs.vartype(v), v)])
+        qm.set_quadratic(u, v, bias)
+    qm.offset = lhs.offset
+
+    print_str = qm.to_polystring() + f" + ... ({num_terms - _num_terms(qm)} more terms)"
+    if lhs is not expression:
+        print_str += f" {expression.sense.value} {expression.rhs}"
+
+    return print_str
+
+def _cqm_family_labels(cqm):
+    """Return the constraint labels of each family, in a single pass."""
+
+    labels = {family: [] for family in cqm_families}
+    for label in cqm.constraints:
+        for family, (match, _) in cqm_families.items():
+            if match in label:
+                labels[family].append(label)
+                break
+        else:
+            labels.setdefault("Other", []).append(label)
+
+    return labels
+
+def cqm_to_display(cqm, num_dominated=None, family="All", page=1):
+    """Output CQM for humans, noting any dominated variables left out on submission.
+
+    A summary of the constraint families precedes one page of ``CQM_PAGE_SIZE``
+    entries of the objective and all constraints or of a single ``family``.
+    Polystrings are generated only for the entries on the page.
+    """
+
+    labels = _cqm_family_labels(cqm)
+
+    print_str = f"Objective: {_num_terms(cqm.objective)} terms"
+    for name, family_labels in labels.items():
+        num_terms = sum(_num_terms(cqm.constraints[label].lhs) for label in family_labels)
+        print_str += f"\n{name}: {len(family_labels)} constraints, {num_terms} terms"
+    if num_dominated:
+        print_str += f"\n\nDominated leg x mode variables, left out on submission: {num_dominated}"
+
+    if family == "All":
+        entries = [("Objective", None)] + [(name, label) for name, family_labels in
+            labels.items() for label in family_labels]
+    elif family == "Objective":
+        entries = [("Objective", None)]
+    else:
+        entries = [(family, label) for label in labels.get(family, [])]
+
+    num_pages = max(-(-len(entries) // CQM_PAGE_SIZE), 1)
+    page = min(max(int(page or 1), 1), num_pages)
+    first = (page - 1)*CQM_PAGE_SIZE
+    print_str += f"\n\nPage {page} of {num_pages} ({family})"
+
+    section = None
+    for name, label in entries[first:first + CQM_PAGE_SIZE]:
+        if name != section:
+            section = name
+            if name == "Objective":
+                print_str += "\n\nObjective (Maximize Exercise):\n"
+            else:
+                header = cqm_families[name][1] if name in cqm_families else "Other Constraints"
+                print_str += f"\n\n{header}: \n"
+        if label is None:
+            print_str += "\n\t" + _polystring(cqm.objective)
+        elif name in ("Cost", "Time"):
+            print_str += "\n\t" + _polystring(cqm.constraints[label])
+        else:
+            print_str += "\n\t" + label + ": " + _polystring(cqm.constraints[label])
 
     return print_str
 
@@ -11,87 +11,256 @@
 #    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
+import json
+
+from dash import Patch
+import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+from plotly.utils import PlotlyJSONEncoder
+
+from tour_planning import TourModel, decode_samples
+
+__all__ = ["figure_patch", "plot_space", "plot_time", "plot_feasiblity",
+    "relayout_x_range"]
+
+
+# Tours of more legs draw tollbooths and mode icons as a few marker traces
+# rather than one layout image per icon
+ICON_IMAGE_LEGS = 50
+
+# Tours of more legs are drawn as at most MAX_BARS bar segments of merged,
+# adjacent legs, plus a few segments on either side of a zoomed-in range
+MAX_BARS = 500
+
+# Above this many distinct points, the feasibility plot keeps the
+# lowest-energy points and bins the others into a 3D grid
+MAX_FEASIBILITY_POINTS = 2000
+
+_mode_markers = {"walk": ("circle", "#17BEBB"), "cycle": ("diamond", "#2A7DE1"),
+    "bus": ("square", "#FFA143"), "drive": ("triangle-up", "#F37820")}
+
+def _use_markers(icons, num_legs):
+    """Return True if icons are drawn as marker traces."""
+
+    if icons is None:
+        return num_legs > ICON_IMAGE_LEGS
+    return icons == "markers"
+
+def _even_edges(start, stop, max_bars):
+    """Return boundaries splitting legs ``start`` to ``stop`` into ``max_bars`` segments at most."""
+
+    return np.unique(np.linspace(start, stop, min(stop - start, max_bars) + 1).round().astype(int))
+
+def _segment_edges(lengths, x_range=None, max_bars=None):
+    """Return leg indices bounding the bar segments of legs of the given lengths.
+
+    Legs overlapping ``x_range``, or all legs, get a segment each if they
+    number at most ``max_bars``, by default ``MAX_BARS``, and are otherwise
+    merged evenly; legs outside the range are merged into at most a tenth as
+    many segments per side.
+    """
+
+    max_bars = MAX_BARS if max_bars is None else max_bars
+    outside_bars = max(max_bars // 10, 1)
+    num_legs = len(lengths)
+    if x_range is None or num_legs <= max_bars:
+        return _even_edges(0, num_legs, max_bars)
+
+    ends = np.cumsum(lengths)
+    first = int(np.searchsorted(ends, x_range[0], side="right"))
+    last = max(int(np.searchsorted(ends - lengths, x_range[1], side="left")), first)
+
+    return np.unique(np.concatenate([_even_edges(0, first, outside_bars),
+        _even_edges(first, last, max_bars), _even_edges(last, num_legs, outside_bars)]))
+
+def _merge_legs(df, x_axis, color, edges):
+    """Return a DataFrame of the segments of ``df`` between ``edges``.
+
+    Segment colors are the ``x_axis``-weighted means of the merged legs.
+    """
+
+    x = df[x_axis].to_numpy(dtype=float)
+    segment_x = np.add.reduceat(x, edges[:-1])
+    segment_color = np.add.reduceat(x*df[color].to_numpy(dtype=float), edges[:-1])/segment_x
+
+    df_segments = pd.DataFrame({x_axis: segment_x, color: segment_color,
+        "Legs": _segment_labels(edges)})
+    df_segments["Tour"] = 0
+
+    return df_segments
+
+def _segment_labels(edges):
+    """Return labels, "<leg>" or "<first>-<last>", of the segments between ``edges``."""
+
+    return [str(a) if b - a == 1 else f"{a}-{b - 1}" for a, b in
+        zip(edges[:-1].tolist(), edges[1:].tolist())]
 
-import dimod
+def relayout_x_range(relayout_data):
+    """Return the x-axis range set by a graph's relayout event.
 
-from tour_planning import _calculate_total
+    Returns None if the axis was reset to the full range and False if the
+    event does not change the x axis.
+    """
 
-__all__ = ["plot_space", "plot_time", "plot_feasiblity"]
+    if not relayout_data:
+        return False
+    if relayout_data.get("xaxis.autorange"):
+        return None
+    if "xaxis.range" in relayout_data:
+        return tuple(relayout_data["xaxis.range"])
+    if "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        return relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+    return False
 
+def _add_markers(fig, x, y, symbol, color, name, legs):
+    """Add one trace of icon markers at the start of the given legs."""
 
-def _plot_background(fig, legs, df, x_axis, image):
-    """Plot the background and tollboths. For Time, requires feasible sample."""
+    fig.add_scatter(x=x, y=np.full(len(x), y), mode="markers", name=name,
+        marker=dict(symbol=symbol, color=color, size=10, line=dict(width=1, color="white")),
+        customdata=legs, hovertemplate=f"{name}, leg %{{customdata}}<extra></extra>",
+        showlegend=False)
+
+def _plot_background(fig, model, df, x_axis, image, icons=None, edges=None):
+    """Plot the background and tollboths. For Time, requires feasible sample.
+
+    For legs merged into segments between ``edges``, tollbooths are marked
+    per segment.
+    """
 
     fig.add_layout_image(
             dict(source=image, xref="x", yref="y", x=0, y=0.5,
             sizex=df[x_axis].sum(), sizey=1, sizing="stretch",
             opacity=0.5, layer="below"))
 
-    x_pos = 0
     x_width = df[x_axis].sum()
-    for indx, leg in enumerate(legs):
-        if leg["toll"]:
-            fig.add_layout_image(dict(source=f"assets/toll.png", xref="x",
-                yref="y", x=x_pos, y=0.2, sizex=0.025*x_width, sizey=0.025*x_width,
-                    opacity=1, layer="above"))
-        x_pos += df[x_axis][indx]
+    if edges is not None or _use_markers(icons, len(df)):
+        edges = np.arange(len(df) + 1) if edges is None else edges
+        starts = np.cumsum(df[x_axis].to_numpy()) - df[x_axis].to_numpy()
+        tolled = np.flatnonzero(np.add.reduceat(model.toll.astype(int), edges[:-1])) \
+            if len(df) else []
+        if len(tolled):
+            _add_markers(fig, starts[tolled], 0.15, "octagon", "red", "Tollbooth",
+                np.array(_segment_labels(edges))[tolled])
+    else:
+        x_pos = 0
+        for indx, toll in enumerate(model.toll.tolist()):
+            if toll:
+                fig.add_layout_image(dict(source=f"assets/toll.png", xref="x",
+                    yref="y", x=x_pos, y=0.2, sizex=0.025*x_width, sizey=0.025*x_width,
+                        opacity=1, layer="above"))
+            x_pos += df[x_axis][indx]
 
     title = "Distance" if x_axis == "Length" else "Time"
 
     fig.update_xaxes(showticklabels=True, title=title)
     fig.update_yaxes(showticklabels=False, title=None, range=(-0.5, 0.5))
-    fig.update_traces(width=.1)
+    fig.update_traces(width=.1, selector=dict(type="bar"))
     fig.update_layout(font_color="rgb(3, 184, 255)", margin=dict(l=20, r=20, t=20, b=20),
         paper_bgcolor="rgba(0,0,0,0)")
 
     return x_width
 
-def get_first_feasible_sorted(sampleset):
-    """Get first samples, preferably feasible."""
+def get_first_feasible_sorted(sampleset, model=None, decoded=None):
+    """Get the best feasible sample as ``(leg, mode)`` pairs, or None.
 
-    sampleset_feasible = sampleset.filter(lambda row: row.is_feasible)
-    if len(sampleset_feasible) > 0:
-        first = sorted({int(key.split("_")[1]): key.split("_")[0] for key,val in \
-            sampleset_feasible.first.sample.items() if val==1.0}.items())
-    else:
-        first = None
+    Pass the sampleset's ``decoded`` samples, if already decoded, to reuse them.
+    """
+
+    if decoded is None:
+        decoded = decode_samples(sampleset, model)
 
-    return first
+    return decoded.legs()
 
-def _plot_results(fig, first, df, x_axis, x_width):
-    """Add the best found, feasible solution to the graphics."""
+def _plot_results(fig, modes, df, x_axis, x_width, icons=None, edges=None):
+    """Add the best found, feasible solution, the mode of each leg, to the graphics.
 
-    fig.update_traces(texttemplate = [locomotion for leg, locomotion in first],
-        textposition = "inside")
+    For legs merged into segments between ``edges``, only segments of a
+    single leg are labeled.
+    """
+
+    if edges is None:
+        labels = modes
+    else:
+        labels = [modes[a] if b - a == 1 else "" for a, b in
+            zip(edges[:-1].tolist(), edges[1:].tolist())]
+
+    fig.update_traces(texttemplate = labels, textposition = "inside",
+        selector=dict(type="bar"))
+
+    if edges is not None or _use_markers(icons, len(modes)):
+        starts = np.cumsum(df[x_axis].to_numpy()) - df[x_axis].to_numpy()
+        labels = np.array(labels)
+        single = np.array(_segment_labels(np.arange(len(modes) + 1) if edges is None
+            else edges))
+        for mode in [mode for mode in dict.fromkeys(labels.tolist()) if mode]:
+            symbol, color = _mode_markers.get(mode, ("circle-open", "gray"))
+            _add_markers(fig, starts[labels == mode], -0.15, symbol, color, mode,
+                single[labels == mode])
+        return
 
     x_pos = 0
-    for leg, icon in first:
-        fig.add_layout_image(dict(source=f"assets/{icon}.png", xref="x",
-        yref="y", x=x_pos, y=-0.1, sizex=0.025*x_width, sizey=0.025*x_width,
-            opacity=1, layer="above"))
+    for leg, icon in enumerate(modes):
+        if icon:
+            fig.add_layout_image(dict(source=f"assets/{icon}.png", xref="x",
+            yref="y", x=x_pos, y=-0.1, sizex=0.025*x_width, sizey=0.025*x_width,
+                opacity=1, layer="above"))
         x_pos += df[x_axis][leg]
 
-def plot_space(legs, sampleset=None):
-    """Plot legs versus distance and slope, optionally with solutions."""
+def _level_of_detail(df, x_axis, color, x_range):
+    """Return segment edges and the DataFrame to plot, or None and ``df`` for one bar per leg."""
+
+    edges = _segment_edges(df[x_axis].to_numpy(), x_range)
+    if len(edges) - 1 == len(df):
+        return None, df
+
+    return edges, _merge_legs(df, x_axis, color, edges)
+
+def plot_space(legs, sampleset=None, model=None, decoded=None, icons=None,
+    x_range=None, base=None):
+    """Plot legs versus distance and slope, optionally with solutions.
+
+    Icons are drawn as "images" or "markers"; by default, as markers for tours
+    of over ``ICON_IMAGE_LEGS`` legs. Tours of over ``MAX_BARS`` legs are
+    drawn as segments of merged legs, except for the legs in ``x_range``, a
+    zoomed-in range of the x axis. Solutions are overlaid on a copy of
+    ``base``, if given, a figure returned for the same legs, icons and
+    ``x_range`` without solutions.
+    """
 
-    df_legs = pd.DataFrame({"Length": [l["length"] for l in legs],
-                            "Slope": [s["uphill"] for s in legs]})
+    if model is None:
+        model = TourModel(legs, {})     # Leg data only
+
+    df_legs = pd.DataFrame({"Length": model.length, "Slope": model.uphill})
     df_legs["Tour"] = 0
 
-    fig = px.bar(df_legs, x="Length", y="Tour", color="Slope", orientation="h",
-                 color_continuous_scale=["#074C91", "#2A7DE1", "#17BEBB", "#FFA143", "#F37820"],
-                 hover_data=["Length", "Slope"])    # looks like plotly bug (hover_data)
+    edges, df_plot = _level_of_detail(df_legs, "Length", "Slope", x_range)
+
+    if base is not None:
+        fig = go.Figure(base)
+        x_width = df_plot["Length"].sum()
+    else:
+        hover_data = ["Length", "Slope"] + (["Legs"] if edges is not None else [])
+
+        fig = px.bar(df_plot, x="Length", y="Tour", color="Slope", orientation="h",
+                     color_continuous_scale=["#074C91", "#2A7DE1", "#17BEBB", "#FFA143", "#F37820"],
+                     hover_data=hover_data)    # looks like plotly bug (hover_data)
+        if x_range is not None:
+            fig.update_xaxes(range=x_range)
 
-    x_width = _plot_background(fig, legs, df_legs, "Length", "assets/background_space.jpg")
+        x_width = _plot_background(fig, model, df_plot, "Length",
+            "assets/background_space.jpg", icons, edges)
 
     if sampleset:
 
-        first = get_first_feasible_sorted(sampleset)
+        first = get_first_feasible_sorted(sampleset, model, decoded)
 
         if first:
-            _plot_results(fig, first, df_legs, "Length", x_width)
+            modes = [""]*model.num_legs
+            for leg, mode in first:
+                modes[leg] = mode
+            _plot_results(fig, modes, df_plot, "Length", x_width, icons, edges)
         else:
              fig.add_annotation(x=0.1, y=0.85,  text="No feasible solutions found.",
                 xref="paper", yref="paper", font=dict(size=18, color="red"),
@@ -99,52 +268,127 @@ def plot_space(legs, sampleset=None):
 
     return fig
 
-def plot_time(legs, locomotion_vals, sampleset):
-    """Plot legs versus time and cost given solutions."""
+def plot_time(legs, locomotion_vals, sampleset, model=None, decoded=None, icons=None,
+    x_range=None):
+    """Plot legs versus time and cost given solutions.
+
+    Icons and long tours are drawn as for :func:`plot_space`.
+    """
 
     if not sampleset:
         return px.bar()
 
-    first = get_first_feasible_sorted(sampleset)
+    if model is None:
+        model = TourModel(legs, locomotion_vals)
+
+    first = get_first_feasible_sorted(sampleset, model, decoded)
 
-    if not first:
+    # Modes deactivated since the job was submitted have no coefficients
+    if not first or any(mode not in model.modes for leg, mode in first):
         return px.bar()
 
-    df_legs = pd.DataFrame({"Time": [l["length"]/locomotion_vals[f[1]]["speed"] for
-        l,f in zip(legs, first)],
-        "Cost": [locomotion_vals[f[1]]["cost"] for f in first]})
+    legs_index = [leg for leg, mode in first]
+    modes_index = [model.modes.index(mode) for leg, mode in first]
+    df_legs = pd.DataFrame({"Time": model.time[legs_index, modes_index],
+        "Cost": model.mode_cost[modes_index]})
     df_legs["Tour"] = 0
 
-    fig = px.bar(df_legs, x="Time", y="Tour", color="Cost", orientation="h",
-        color_continuous_scale=["#074C91", "#2A7DE1", "#17BEBB", "#FFA143", "#F37820"])
+    edges, df_plot = _level_of_detail(df_legs, "Time", "Cost", x_range)
 
-    x_width = _plot_background(fig, legs, df_legs, "Time", "assets/background_time.png")
+    fig = px.bar(df_plot, x="Time", y="Tour", color="Cost", orientation="h",
+        color_continuous_scale=["#074C91", "#2A7DE1", "#17BEBB", "#FFA143", "#F37820"],
+        hover_data=["Legs"] if edges is not None else None)
+    if x_range is not None:
+        fig.update_xaxes(range=x_range)
 
-    _plot_results(fig, first, df_legs, "Time", x_width)
+    x_width = _plot_background(fig, model, df_plot, "Time",
+        "assets/background_time.png", icons, edges)
+
+    _plot_results(fig, [mode for leg, mode in first], df_plot, "Time", x_width,
+        icons, edges)
 
     return fig
 
-def plot_feasiblity(legs, locomotion_vals, sampleset):
-    """Plot solutions."""
+def _bin_points(points, counts, budget):
+    """Reduce unique (Cost, Time, Exercise, Energy, Feasibility) rows to about ``budget``.
+
+    The ``budget // 20`` lowest-energy rows of each feasibility are kept. The
+    others are merged per cell of a grid over Cost, Time and Exercise, and
+    per feasibility, into their occurrence-weighted centre with the lowest
+    energy in the cell. Returns the rows, their occurrences, the number of
+    rows merged into each, and a note of what was merged.
+    """
+
+    top = budget // 20
+    feasible = points[:, 4].astype(bool)
+    kept = np.zeros(len(points), dtype=bool)
+    for mask in [feasible, ~feasible]:
+        rows = np.flatnonzero(mask)
+        kept[rows[np.argsort(points[rows, 3], kind="stable")[:top]]] = True
+
+    grid = max(int(((budget - 2*top) / 2) ** (1/3)), 1)
+    rest, weights = points[~kept], counts[~kept]
+    low, high = rest[:, :3].min(axis=0), rest[:, :3].max(axis=0)
+    scale = np.where(high > low, grid / np.where(high > low, high - low, 1), 0)
+    cells = np.minimum(((rest[:, :3] - low)*scale).astype(int), grid - 1)
+    cell_ids = (rest[:, 4].astype(int)*grid + cells[:, 0])*grid**2 + cells[:, 1]*grid + cells[:, 2]
+    _, inverse, merged = np.unique(cell_ids, return_inverse=True, return_counts=True)
+
+    binned = np.zeros((len(merged), 5))
+    binned_counts = np.bincount(inverse, weights)
+    for column in range(3):
+        binned[:, column] = np.bincount(inverse, rest[:, column]*weights)/binned_counts
+    binned[:, 3] = np.inf
+    np.minimum.at(binned[:, 3], inverse, rest[:, 3])
+    np.maximum.at(binned[:, 4], inverse, rest[:, 4])
+
+    note = (f"Showing {kept.sum() + len(merged)} of {len(points)} distinct points: "
+        f"the {kept.sum()} lowest-energy points exactly and the other {len(rest)} "
+        f"merged on a {grid}x{grid}x{grid} grid")
+
+    points = np.vstack([points[kept], binned])
+    order = np.lexsort(points.T[::-1])
+
+    return points[order], np.concatenate([counts[kept], binned_counts.astype(int)])[order], \
+        np.concatenate([np.ones(kept.sum(), dtype=int), merged])[order], note
+
+def plot_feasiblity(legs, locomotion_vals, sampleset, model=None):
+    """Plot solutions.
+
+    Above ``MAX_FEASIBILITY_POINTS`` distinct points, all but the lowest-energy
+    points are binned, and a note says how many points were merged.
+    """
 
     if not sampleset:
         return px.bar()
 
-    #Done only once per job submission but can move to NumPy if slow
-    modes = [key for key in locomotion_vals.keys() if locomotion_vals[key]["use"]]
-    t= [dimod.Binary(f"{mode}_{i}") for i in range(len(legs)) for mode in modes]
-
-    data = {"Cost": [], "Time": [], "Exercise": [], "Energy": [], "Feasibility": []}
-    for sample, energy, feasibility in sampleset.data(
-        fields=["sample", "energy", "is_feasible"]):
-        for measure in ["Cost", "Time", "Exercise"]:
-            data[measure].append(_calculate_total(t, measure, legs, locomotion_vals).energy(sample))
-        data["Energy"].append(energy)  # we're maximizing so switch symbol
-        data["Feasibility"].append(feasibility)
-    df = pd.DataFrame(data)
-
-    occurrences = df.groupby(df.columns.tolist(),as_index=False).size()
-    occurrences = occurrences.rename({"size": "Occurrences"}, axis=1)
+    if model is None:
+        model = TourModel(legs, locomotion_vals)
+
+    # Variables the model lacks, such as modes deactivated since submission,
+    # index the trailing zero row; dominated variables left out on submission
+    # are simply absent from the samples
+    coefficients = np.vstack([np.column_stack([model.coefficients(measure).ravel()
+        for measure in ["Cost", "Time", "Exercise"]]), np.zeros((1, 3))])
+    flat = {label: i for i, label in enumerate(model.labels)}
+    rows = np.array([flat.get(v, -1) for v in sampleset.variables], dtype=int)
+
+    record = sampleset.record
+    totals = record.sample @ coefficients[rows]
+
+    # Rows sort lexicographically as the former all-columns groupby did
+    points, counts = np.unique(np.column_stack([totals[:, :3], record.energy,
+        record.is_feasible]), axis=0, return_counts=True)
+    hover_data = ["Cost", "Time", "Exercise", "Energy", "Occurrences"]
+    if len(points) > MAX_FEASIBILITY_POINTS:
+        points, counts, merged, note = _bin_points(points, counts, MAX_FEASIBILITY_POINTS)
+        hover_data.append("Merged")
+
+    occurrences = pd.DataFrame(points[:, :4], columns=["Cost", "Time", "Exercise", "Energy"])
+    occurrences["Feasibility"] = points[:, 4].astype(bool)
+    occurrences["Occurrences"] = counts
+    if "Merged" in hover_data:
+        occurrences["Merged"] = merged
 
     colors = ['blue', 'red']
     symbols = ['circle', 'x']
@@ -157,7 +401,11 @@ def plot_feasiblity(legs, locomotion_vals, sampleset):
     fig = px.scatter_3d(occurrences.round(3), x="Time", y="Cost", z="Exercise",
         color="Feasibility", size="Occurrences", size_max=50, symbol="Feasibility",
         color_discrete_sequence = colors, symbol_sequence= symbols,
-        hover_data=["Cost", "Time", "Exercise", "Energy", "Occurrences"])
+        hover_data=hover_data)
+
+    if "Merged" in hover_data:
+        fig.add_annotation(x=0, y=1, xref="paper", yref="paper", xanchor="left",
+            text=note, font=dict(size=12), showarrow=False)
 
     fig.update_scenes(xaxis_title_text="Time",
                       yaxis_title_text="Cost",
@@ -166,3 +414,51 @@ def plot_feasiblity(legs, locomotion_vals, sampleset):
         margin=dict(l=20, r=20, t=20, b=20), paper_bgcolor="rgba(0,0,0,0)")
 
     return fig
+
+def _same(a, b):
+    """Return True if two figure properties serialize identically."""
+
+    return json.dumps(a, cls=PlotlyJSONEncoder, sort_keys=True) == \
+        json.dumps(b, cls=PlotlyJSONEncoder, sort_keys=True)
+
+def _patch_node(node, old, new):
+    """Add to ``node``, a location in a Patch, the operations turning ``old`` into ``new``."""
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        if old.get("type") != new.get("type"):     # A trace replaced by another type
+            return False
+        for key, value in new.items():
+            if key not in old:
+                node[key] = value
+            elif not _same(old[key], value) and not _patch_node(node[key], old[key], value):
+                node[key] = value
+        for key in old.keys() - new.keys():
+            del node[key]
+        return True
+
+    if isinstance(old, list) and isinstance(new, list) and \
+        all(isinstance(item, dict) for item in old + new):
+        for i, (a, b) in enumerate(zip(old, new)):
+            if not _same(a, b) and not _patch_node(node[i], a, b):
+                node[i] = b
+        for i in reversed(range(len(new), len(old))):
+            del node[i]
+        if len(new) > len(old):
+            node.extend(new[len(old):])
+        return True
+
+    return False
+
+def figure_patch(old, new):
+    """Return a Dash ``Patch`` turning figure ``old`` into ``new``.
+
+    Only the traces, images and other properties that differ are sent; for
+    example, only the solution layer of a Space graph for the same legs.
+    """
+
+    patch = Patch()
+    old, new = old.to_plotly_json(), new.to_plotly_json()
+    _patch_node(patch, {"data": old["data"], "layout": old["layout"]},
+        {"data": new["data"], "layout": new["layout"]})
+
+    return patch
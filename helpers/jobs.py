@@ -13,10 +13,21 @@
 #    limitations under the License.
 from dash import dcc, html
 import datetime
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
 
 from dwave.cloud.api import exceptions, Problems
 
-__all__ = ["job_bar", "TERMINATED", "RUNNING", "cancel", "elapsed", "get_status",]
+from helpers.cache import LRUCache
+
+__all__ = ["job_bar", "TERMINATED", "RUNNING", "ProblemsPool", "StatusPoller", "cancel",
+    "cqm_digest", "elapsed", "get_error", "get_progress", "get_status", "get_sampleset", "is_local",
+    "is_solved", "prefetch_sampleset", "problems_pool", "status_events", "status_poller",
+    "submit_local", "submit_solved", "upload_cqm",]
 
 job_bar = {"READY": [0, "link"],
 #          "WAITING": [0, "dark"],     Placeholder, to remember the color
@@ -31,12 +42,383 @@ job_bar = {"READY": [0, "link"],
 TERMINATED = ["COMPLETED", "CANCELLED", "FAILED"]
 RUNNING = ["PENDING", "IN_PROGRESS"]
 
+LOCAL_JOB_PREFIX = "local-"
+SOLVED_JOB_PREFIX = "solved-"
+
+logger = logging.getLogger(__name__)
+
+local_jobs = LRUCache(maxsize=64)   # Local jobs, by job ID
+
+status_changed = threading.Condition()     # Notified on any job's status change
+_status_version = 0
+
+def _notify_status_change():
+
+    global _status_version
+    with status_changed:
+        _status_version += 1
+        status_changed.notify_all()
+
+class ProblemsPool:
+    """Thread-safe pool of long-lived Problems API clients for one configuration.
+
+    Clients keep their HTTP sessions, and so their connections, between
+    requests. At most ``size`` requests run at once; others wait for a free
+    client. A client whose request fails, other than for a problem not found,
+    is closed and replaced by a new connection on next use.
+    """
+
+    def __init__(self, config, size=4):
+
+        self.config = config
+        self.size = size
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._metrics = {"connections": 0, "reconnects": 0, "in_use": 0,
+            "max_in_use": 0, "requests": 0, "failures": 0, "latency_total": 0.0,
+            "latency_max": 0.0}
+
+    def request(self, method, *args, **kwargs):
+        """Call a ``Problems`` method, such as "get_problem_status", on a pooled client."""
+
+        with self._slots:
+            with self._lock:
+                problems = self._idle.pop() if self._idle else None
+                self._metrics["in_use"] += 1
+                self._metrics["max_in_use"] = max(self._metrics["max_in_use"],
+                    self._metrics["in_use"])
+            healthy = True
+            start = time.perf_counter()
+            try:
+                if problems is None:
+                    problems = Problems.from_config(self.config)
+                    with self._lock:
+                        self._metrics["connections"] += 1
+                return getattr(problems, method)(*args, **kwargs)
+            except exceptions.ResourceNotFoundError:
+                raise
+            except Exception:
+                healthy = False
+                raise
+            finally:
+                latency = time.perf_counter() - start
+                with self._lock:
+                    self._metrics["in_use"] -= 1
+                    self._metrics["requests"] += 1
+                    self._metrics["latency_total"] += latency
+                    self._metrics["latency_max"] = max(self._metrics["latency_max"], latency)
+                    if healthy:
+                        self._idle.append(problems)
+                    else:
+                        self._metrics["failures"] += 1
+                        self._metrics["reconnects"] += problems is not None
+                if not healthy and problems is not None:
+                    problems.close()
+
+    def metrics(self):
+        """Return pool usage and request latency, in seconds, so far."""
+
+        with self._lock:
+            metrics = dict(self._metrics, size=self.size, idle=len(self._idle))
+        latency_total = metrics.pop("latency_total")
+        metrics["latency_mean"] = latency_total/metrics["requests"] if \
+            metrics["requests"] else None
+
+        return metrics
+
+problems_pools = {}     # Pools by client, shared across callbacks and sessions
+_pools_lock = threading.Lock()
+
+def problems_pool(client):
+    """Return the shared :class:`ProblemsPool` for a client's configuration."""
+
+    with _pools_lock:
+        if client not in problems_pools:
+            problems_pools[client] = ProblemsPool(client.config)
+        return problems_pools[client]
+
+class StatusPoller:
+    """Background refresher of the statuses of all active Leap jobs, in bulk.
+
+    Jobs are watched from their first status read until they terminate, are
+    not found, or go unread for ``expire`` seconds. Every ``interval`` seconds,
+    one request per 1000 watched jobs refreshes the cache status reads are
+    served from. The polling thread stops while no jobs are watched.
+    """
+
+    def __init__(self, client, interval=0.5, expire=60):
+
+        self.client = client
+        self.interval = interval
+        self.expire = expire
+        self.statuses = LRUCache(maxsize=1024)
+        self.missing = LRUCache(maxsize=1024)
+        self._active = {}       # Time of last read, by job ID
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def status(self, job_id):
+        """Return the cached status of a job, if any, watching it until it terminates."""
+
+        status = self.statuses.get(job_id)
+        if job_id not in self.missing and (status is None or
+            status.status.value not in TERMINATED):
+            with self._lock:
+                self._active[job_id] = time.monotonic()
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True)
+                    self._thread.start()
+
+        return status
+
+    def _fetch(self, job_ids):
+        """Return statuses of the jobs, one request at a time if any is not found."""
+
+        pool = problems_pool(self.client)
+        try:
+            return pool.request("get_problem_statuses", job_ids)
+        except exceptions.ResourceNotFoundError:
+            statuses = []
+            for job_id in job_ids:
+                try:
+                    statuses.append(pool.request("get_problem_status", job_id))
+                except exceptions.ResourceNotFoundError:
+                    self.missing.put(job_id, True)
+            return statuses
+
+    def poll(self):
+        """Refresh the statuses of all watched jobs once."""
+
+        now = time.monotonic()
+        with self._lock:
+            for job_id, read in list(self._active.items()):
+                if now - read > self.expire:
+                    del self._active[job_id]
+            job_ids = list(self._active)
+
+        for start in range(0, len(job_ids), 1000):
+            try:
+                statuses = self._fetch(job_ids[start:start + 1000])
+            except Exception:
+                continue        # Retried next interval
+            changed = False
+            for status in statuses:
+                cached = self.statuses.get(status.id)
+                changed |= cached is None or cached.status != status.status
+                self.statuses.put(status.id, status)
+                if status.status.value == "IN_PROGRESS":
+                    prefetch_sampleset(self.client, status.id)
+            if changed:
+                _notify_status_change()
+            with self._lock:
+                for job_id in job_ids[start:start + 1000]:
+                    if job_id in self.missing or (job_id in self.statuses and
+                        self.statuses.get(job_id).status.value in TERMINATED):
+                        self._active.pop(job_id, None)
+
+    def _run(self):
+
+        while True:
+            time.sleep(self.interval)
+            self.poll()
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+
+status_pollers = {}     # Pollers by client, shared across callbacks and sessions
+
+def status_poller(client):
+    """Return the shared :class:`StatusPoller` for a client."""
+
+    with _pools_lock:
+        if client not in status_pollers:
+            status_pollers[client] = StatusPoller(client)
+        return status_pollers[client]
+
+# Seconds to reuse uploaded problem data, well within the server's retention
+UPLOAD_TTL = 60*60
+
+uploaded_cqms = LRUCache(maxsize=32, ttl=UPLOAD_TTL)   # Problem data IDs, by digest
+
+def is_local(job_id):
+    """Return True for jobs solved locally rather than by a Leap solver."""
+
+    return job_id.startswith(LOCAL_JOB_PREFIX)
+
+def submit_local(solve, label):
+    """Run a local solver as a background job and return its job ID.
+
+    ``solve`` is called with a callback for reporting the fraction of work
+    done and returns a sampleset.
+    """
+
+    job_id = f"{LOCAL_JOB_PREFIX}{uuid.uuid4()}"
+    job = {"label": label, "status": "PENDING", "progress": None, "sampleset": None,
+        "error": None}
+
+    def progress(fraction):
+        job["progress"] = fraction
+
+    def run():
+        job["status"] = "IN_PROGRESS"
+        _notify_status_change()
+        try:
+            job["sampleset"] = solve(progress)
+            job["status"] = "COMPLETED"
+        except Exception as err:
+            logger.exception("Local job %s failed", job_id)
+            job["error"] = f"{type(err).__name__}: {err}"
+            job["status"] = "FAILED"
+        _notify_status_change()
+
+    job["thread"] = threading.Thread(target=run, daemon=True)
+    local_jobs.put(job_id, job)
+    job["thread"].start()
+
+    return job_id
+
+# Labels and samplesets of jobs solved at submission, by job ID. Unlike local
+# jobs, these need no thread, so a shared store lets any process submit them.
+solved_jobs = LRUCache(maxsize=16)
+
+def is_solved(job_id):
+    """Return True for jobs solved at submission, such as fully presolved CQMs."""
+
+    return job_id.startswith(SOLVED_JOB_PREFIX)
+
+def submit_solved(sampleset, label):
+    """Record a job completed with a known sampleset and return its job ID."""
+
+    job_id = f"{SOLVED_JOB_PREFIX}{uuid.uuid4()}"
+    solved_jobs.put(job_id, {"label": label, "sampleset": sampleset})
+    _notify_status_change()
+
+    return job_id
+
+def get_progress(job_id):
+    """Return the fraction of work done by a local job, if it reports one."""
+
+    job = local_jobs.get(job_id) if is_local(job_id) else None
+
+    return job["progress"] if job else None
+
+def get_error(job_id):
+    """Return the error of a failed local job, if any."""
+
+    job = local_jobs.get(job_id) if is_local(job_id) else None
+
+    return job["error"] if job else None
+
+prefetched = LRUCache(maxsize=16)    # Samplesets of Leap jobs, by job ID
+_prefetching = {}       # Download threads, by job ID
+_prefetch_lock = threading.Lock()
+
+# Seconds to wait for another process's download before downloading anew
+PREFETCH_WAIT = 60
+# Downloads in flight, by job ID; shared with background-callback processes,
+# which otherwise download again, like ``prefetched``. Markers of downloads that
+# never finish expire.
+prefetch_pending = LRUCache(maxsize=64, ttl=PREFETCH_WAIT)
+
+def prefetch_sampleset(client, job_id):
+    """Start downloading the sampleset of a running Leap job, once per job.
+
+    The decoded sampleset is staged in ``prefetched`` when the job completes.
+    """
+
+    def download():
+        try:
+            prefetched.put(job_id, client.retrieve_answer(job_id).sampleset)
+        except Exception:
+            pass        # Downloaded again by get_sampleset
+        finally:
+            prefetch_pending.pop(job_id)
+            with _prefetch_lock:
+                _prefetching.pop(job_id, None)
+
+    with _prefetch_lock:
+        if job_id in _prefetching or job_id in prefetched or job_id in prefetch_pending:
+            return
+        prefetch_pending.put(job_id, True)
+        _prefetching[job_id] = threading.Thread(target=download, daemon=True)
+        _prefetching[job_id].start()
+
+def get_sampleset(client, job_id, poll=0.1):
+    """Return the sampleset of a completed job, prefetched if possible.
+
+    Waits, polling every ``poll`` seconds, for a download in flight in this or
+    another process before downloading the sampleset itself.
+    """
+
+    if is_local(job_id):
+        return local_jobs.get(job_id)["sampleset"]
+    if is_solved(job_id):
+        return solved_jobs.get(job_id)["sampleset"]
+
+    with _prefetch_lock:
+        download = _prefetching.get(job_id)
+    if download is not None:
+        download.join()
+
+    deadline = time.monotonic() + PREFETCH_WAIT
+    while job_id not in prefetched and job_id in prefetch_pending and \
+        time.monotonic() < deadline:
+        time.sleep(poll)
+
+    sampleset = prefetched.get(job_id)
+    if sampleset is None:
+        sampleset = client.retrieve_answer(job_id).sampleset
+
+    return sampleset
+
+def cqm_digest(cqm):
+    """Return a hex digest of a CQM's variables, objective and constraints.
+
+    Unlike the file of ``cqm.to_file()``, which has zip timestamps, the digest
+    is the same for equal CQMs built at different times.
+    """
+
+    digest = hashlib.sha256()
+
+    def add(*items):
+        digest.update(repr(items).encode())
+
+    def terms(model):
+        return model.offset, list(model.iter_linear()), list(model.iter_quadratic())
+
+    add([(v, cqm.vartype(v).name, cqm.lower_bound(v), cqm.upper_bound(v))
+        for v in cqm.variables])
+    add(terms(cqm.objective))
+    for label, constraint in cqm.constraints.items():
+        soft = (constraint.lhs.weight(), constraint.lhs.penalty()) if \
+            constraint.lhs.is_soft() else None
+        add(label, constraint.sense.value, constraint.rhs, terms(constraint.lhs), soft)
+
+    return digest.hexdigest()
+
+def upload_cqm(solver, cqm):
+    """Upload a CQM unless an equal one was recently uploaded; return its ID."""
+
+    key = (solver.id, cqm_digest(cqm))
+    problem_data_id = uploaded_cqms.get(key)
+    if problem_data_id is None:
+        problem_data_id = solver.upload_cqm(cqm).result()
+        uploaded_cqms.put(key, problem_data_id)
+
+    return problem_data_id
+
 def cancel(client, job_id):
     """Try to cancel a job submission."""
 
-    p = Problems.from_config(client.config)
+    if is_local(job_id):
+        return ValueError("local jobs run to completion")
+    if is_solved(job_id):
+        return ValueError("job was solved at submission")
+
     try:
-        status = p.cancel_problem(job_id)
+        status = problems_pool(client).request("cancel_problem", job_id)
         return status
     except Exception as err:
         return err
@@ -48,15 +430,54 @@ def elapsed(ref_time):
         datetime.datetime.strptime(ref_time, "%c")).seconds
 
 def get_status(client, job_id, job_submit_time):
-    """Return status of submitted job."""
+    """Return status of submitted job.
 
-    p = Problems.from_config(client.config)
-    try:
-        status = p.get_problem_status(job_id)
-        label_time = dict(status)["label"].split("submitted: ")[1]
-        if label_time == job_submit_time:
-            return status.status.value
-        else:
-            return None
-    except exceptions.ResourceNotFoundError as err:
+    Statuses of Leap jobs are read from the cache of the shared
+    :class:`StatusPoller`, so a job's first read returns None.
+    """
+
+    if is_local(job_id):
+        job = local_jobs.get(job_id)
+        if job and job["label"].split("submitted: ")[1] == job_submit_time:
+            return job["status"]
+        return None
+
+    if is_solved(job_id):
+        job = solved_jobs.get(job_id)
+        if job and job["label"].split("submitted: ")[1] == job_submit_time:
+            return "COMPLETED"
+        return None
+
+    status = status_poller(client).status(job_id)
+    if status is None:
         return None
+
+    label_time = dict(status)["label"].split("submitted: ")[1]
+    if label_time == job_submit_time:
+        return status.status.value
+    else:
+        return None
+
+def status_events(client, job_id, job_submit_time, tick=1, timeout=None):
+    """Yield server-sent events of a job's status and elapsed time as they change.
+
+    Events are JSON objects with "status", "SUBMITTED" until the job's status
+    is known, and "elapsed" seconds. A status change is sent as soon as it is
+    notified; otherwise the job's cached status and elapsed time are checked
+    every ``tick`` seconds. The stream ends after the job terminates or after
+    ``timeout`` seconds, if given.
+    """
+
+    end = time.monotonic() + timeout if timeout is not None else None
+    last = None
+    while True:
+        version = _status_version
+        status = get_status(client, job_id, job_submit_time) or "SUBMITTED"
+        event = {"status": status, "elapsed": elapsed(job_submit_time)}
+        if event != last:
+            yield f"data: {json.dumps(event)}\n\n"
+            last = event
+        if status in TERMINATED or (end is not None and time.monotonic() >= end):
+            return
+        with status_changed:
+            status_changed.wait_for(lambda: _status_version != version, timeout=tick)
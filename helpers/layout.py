@@ -74,6 +74,10 @@ modal_texts = {"solver": ["Leap Hybrid CQM Solver Inaccessible",
     [
         html.Div([
         html.Div("Could not connect to a Leap hybrid CQM solver."),
+        html.Div("""
+    Problems are instead solved locally by a classical dynamic-programming
+    solver over a table of cost and time. Its solutions are optimal when the
+    table is fine enough to prove it, and otherwise the best it finds."""),
         html.Div(["""
     If you are running locally, set environment variables or a
     dwave-cloud-client configuration file as described in the
@@ -141,11 +145,16 @@ copying and pasting into your code."""
 
 description_solutions_print = """The best solution found, formatted for reading,
 and the returned dimod sampleset, which you can copy and paste into your
-code or Python terminal."""
+code or Python terminal. Very large samplesets are kept on the server and
+summarized here instead."""
 
 description_cqm_print = ["""The constrained quadratic model (CQM)
 generated for your configured tour and its constraints.""",
 html.Br(),
+"""The display opens with the number of constraints and terms in each family of
+constraints; select a family and page through it to see its expressions, with
+long expressions shortened.""",
+html.Br(),
 """To understand how the CQM is built up, it can be helpful to look at this display
 for a minimal tour (set the number of legs to one, the maximum leg length to one,
 enable a single mode of locomotion, turn off tollbooths, etc), and then gradually
@@ -0,0 +1,182 @@
+# Copyright 2022 D-Wave Systems Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""Compact binary format for tours and samplesets.
+
+A payload is a fixed prelude (magic, format version, header length), a JSON
+header describing each array, and the raw arrays, each aligned to 8 bytes.
+Leg columns are float32, booleans and binary samples are bit-packed. The
+uncompressed payload can be saved and decoded in place from a memory map;
+:func:`to_transport` compresses and base64-encodes it as text.
+
+The app uses this format only for samplesets held in the server-side result
+store. Tours, samplesets and state written for the browser stay JSON, because
+the app shows these as code for users to copy and paste.
+"""
+
+import base64
+import json
+import mmap
+import struct
+import zlib
+
+import dimod
+import numpy as np
+
+__all__ = ["FORMAT_VERSION", "decode_sampleset", "decode_tour", "encode_sampleset",
+    "encode_tour", "from_transport", "load", "save", "to_transport"]
+
+MAGIC = b"TPLN"
+FORMAT_VERSION = 1
+_PRELUDE = struct.Struct("<4sB3xI")
+_ALIGN = 8
+
+def _pad(size):
+
+    return -size % _ALIGN
+
+def _encode(kind, arrays, **meta):
+    """Lay out ``arrays``, a list of (name, array, packed) tuples, after a header."""
+
+    specs, blocks, offset = [], [], 0
+    for name, array, packed in arrays:
+        array = np.ascontiguousarray(array)
+        shape = list(array.shape)
+        if packed:
+            array = np.packbits(array.astype(bool, copy=False), axis=-1)
+        data = array.tobytes()
+        specs.append({"name": name, "dtype": array.dtype.str, "shape": shape,
+            "packed": packed, "offset": offset, "nbytes": len(data)})
+        blocks += [data, bytes(_pad(len(data)))]
+        offset += len(data) + _pad(len(data))
+
+    header = json.dumps({"kind": kind, "arrays": specs, **meta}).encode()
+    header += b" " * _pad(_PRELUDE.size + len(header))
+
+    return b"".join([_PRELUDE.pack(MAGIC, FORMAT_VERSION, len(header)), header, *blocks])
+
+def _decode(data, kind):
+    """Return the header and arrays of a payload; unpacked arrays are views of ``data``."""
+
+    buffer = memoryview(data)
+    magic, version, header_len = _PRELUDE.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("Not a tour-planning binary payload")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Payload format version {version} is newer than "
+            f"supported version {FORMAT_VERSION}")
+
+    header = json.loads(bytes(buffer[_PRELUDE.size:_PRELUDE.size + header_len]))
+    if header["kind"] != kind:
+        raise ValueError(f"Payload holds a {header['kind']}, not a {kind}")
+
+    start = _PRELUDE.size + header_len
+    arrays = {}
+    for spec in header["arrays"]:
+        array = np.frombuffer(buffer, dtype=spec["dtype"],
+            count=spec["nbytes"] // np.dtype(spec["dtype"]).itemsize,
+            offset=start + spec["offset"])
+        if spec["packed"]:
+            packed_shape = spec["shape"][:-1] + [-(-spec["shape"][-1] // 8)]
+            array = np.unpackbits(array.reshape(packed_shape), axis=-1,
+                count=spec["shape"][-1]).astype(bool)
+        arrays[spec["name"]] = array.reshape(spec["shape"])
+
+    return header, arrays
+
+def encode_tour(legs, decimals=1):
+    """Encode legs, as a list of legs or as columnar arrays, to bytes.
+
+    Lengths and slopes are stored as float32 and rounded back to ``decimals``
+    places on decoding, the precision :func:`tour_planning.set_legs` uses;
+    set ``decimals`` to None to decode the float32 values as they are.
+    """
+
+    keys = ("length", "uphill", "toll")
+    if isinstance(legs, dict):
+        columns = {key: np.asarray(legs[key]) for key in keys}
+    else:
+        columns = {key: np.array([leg[key] for leg in legs]) for key in keys}
+
+    return _encode("tour", [("length", columns["length"].astype(np.float32), False),
+        ("uphill", columns["uphill"].astype(np.float32), False),
+        ("toll", columns["toll"].reshape(-1), True)], decimals=decimals)
+
+def decode_tour(data, columnar=False):
+    """Decode legs encoded by :func:`encode_tour`.
+
+    With ``columnar``, return a dict of "length", "uphill" and "toll" arrays;
+    without rounding these are read-only views of ``data``.
+    """
+
+    header, arrays = _decode(data, "tour")
+    length, uphill = arrays["length"], arrays["uphill"]
+    if header["decimals"] is not None:
+        length = np.round(length.astype(float), header["decimals"])
+        uphill = np.round(uphill.astype(float), header["decimals"])
+
+    if columnar:
+        return {"length": length, "uphill": uphill, "toll": arrays["toll"]}
+
+    return [{"length": l, "uphill": u, "toll": t} for l, u, t in
+        zip(length.tolist(), uphill.tolist(), arrays["toll"].tolist())]
+
+def encode_sampleset(sampleset):
+    """Encode a binary sampleset, with its data vectors and info, to bytes."""
+
+    if sampleset.vartype is not dimod.BINARY:
+        raise ValueError("Only binary samplesets can be bit-packed")
+
+    record = sampleset.record
+    arrays = [("sample", record.sample, True)]
+    for name in record.dtype.names[1:]:
+        vector = record[name]
+        arrays.append((name, vector, vector.dtype == bool and vector.ndim > 0))
+
+    return _encode("sampleset", arrays, variables=list(sampleset.variables),
+        info=sampleset.info)
+
+def decode_sampleset(data):
+    """Decode a sampleset encoded by :func:`encode_sampleset`."""
+
+    header, arrays = _decode(data, "sampleset")
+    samples = arrays.pop("sample").astype(np.int8)
+    energy = arrays.pop("energy")
+    num_occurrences = arrays.pop("num_occurrences")
+
+    return dimod.SampleSet.from_samples((samples, header["variables"]),
+        dimod.BINARY, energy, info=header["info"], num_occurrences=num_occurrences,
+        **arrays)
+
+def to_transport(data, level=6):
+    """Compress and base64-encode a payload for text transport."""
+
+    return base64.b64encode(zlib.compress(data, level)).decode("ascii")
+
+def from_transport(text):
+    """Return the payload of a string written by :func:`to_transport`."""
+
+    return zlib.decompress(base64.b64decode(text))
+
+def save(path, data):
+    """Write an uncompressed payload to ``path``."""
+
+    with open(path, "wb") as f:
+        f.write(data)
+
+def load(path):
+    """Memory-map a payload written by :func:`save` for decoding in place."""
+
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
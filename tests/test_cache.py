@@ -0,0 +1,54 @@
+# Copyright 2022 D-Wave Systems Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import os
+import time
+
+from helpers.cache import LRUCache, ResultStore
+
+def test_lru_cache_ttl():
+    """Test that cached entries expire."""
+
+    lru = LRUCache(maxsize=2, ttl=0.05)
+    lru.put("a", 1)
+
+    assert lru.get("a") == 1
+    time.sleep(0.06)
+    assert "a" not in lru
+    assert lru.get("a") is None
+
+def test_result_store(tmp_path):
+    """Test that stored results beyond the size limit are spilled and loaded back."""
+
+    store = ResultStore(max_bytes=300, spill_directory=tmp_path, max_spill_bytes=200)
+    for key in range(6):
+        store.put(key, [key]*40)
+
+    assert len(os.listdir(tmp_path)) == 2
+    assert 0 not in store           # Spilled files beyond the limit are deleted
+    assert store.get(2) == [2]*40   # Loaded back, spilling another
+    assert len(store) == 5
+    assert store.pop(1) == [1]*40
+
+    store.clear()
+
+    assert len(store) == 0
+    assert os.listdir(tmp_path) == []
+
+    store = ResultStore(max_bytes=300)
+    for key in range(6):
+        store.put(key, [key]*40)
+
+    assert store.get(0) is None
+    assert store.get(5) == [5]*40
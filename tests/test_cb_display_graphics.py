@@ -14,23 +14,37 @@
 
 from parameterized import parameterized
 import pytest
+from unittest.mock import patch
+
+import json
 
 from contextvars import copy_context, ContextVar
 from dash._callback_context import context_value
 from dash._utils import AttributeDict
 
+import numpy as np
 import plotly
 
 import dimod
+from dash import no_update, Patch
 
+from helpers import formatting
 from helpers.formatting import sampleset_to_json, state_to_json, tour_to_json
 
-from app import display_graphics
+import app
+from app import display_feasibility, display_space, display_time
+from tour_planning import set_legs
 
 solutions_print_code = ContextVar("solutions_print_code")
 problem_print_code = ContextVar("problem_print_code")
 locomotion_state = ContextVar("locomotion_state")
 
+def display_graphics(solutions_print_code, problem_print_code, locomotion_state):
+    """Return the figures of all three graphs, each drawn as if its tab were open."""
+
+    return tuple(display(solutions_print_code, problem_print_code, locomotion_state)[0]
+        for display in [display_space, display_time, display_feasibility])
+
 def test_display_graphics_feasible(locomotion_data_default, tour_data_default_2_legs,
     samplesets_feasible_infeasible):
     """Test data graphics generated for all three plot types."""
@@ -139,3 +153,236 @@ def test_display_graphics_problem_print(locomotion_data_default, tour_data_defau
     assert len(output[0].data[0]["x"]) == 2
     assert not "x" in output[1].to_dict()["data"][0].keys()
     assert not "x" in output[2].to_dict()["data"][0].keys()
+
+@patch("helpers.formatting.LARGE_TOUR_LEGS", 1)
+@patch("helpers.formatting.LARGE_SAMPLESET_VALUES", 1)
+def test_display_graphics_stored(locomotion_data_default, tour_data_default_2_legs,
+    samplesets_feasible_infeasible):
+    """Test graphics for a large tour and a sampleset kept in the server-side store."""
+
+    def run_callback():
+        context_value.set(AttributeDict(**
+            {"triggered_inputs": [{"prop_id": "solutions_print_code.value"}],}))
+
+        return display_graphics(solutions_print_code.get(), problem_print_code.get(), \
+            locomotion_state.get())
+
+    legs = tour_data_default_2_legs
+    solutions_print_code.set(sampleset_to_json(samplesets_feasible_infeasible["feasible"],
+        key="stored job"))
+    problem_print_code.set(tour_to_json(legs))
+    locomotion_state.set(state_to_json(locomotion_data_default))
+
+    assert "key" in json.loads(problem_print_code.get())
+    assert len(solutions_print_code.get()) < 200
+
+    ctx = copy_context()
+
+    output = ctx.run(run_callback)
+
+    assert len(output[0].data[0]["x"]) == len(legs)
+    assert type(output[2].data[0]) == plotly.graph_objs.Scatter3d
+
+    formatting.results.pop("stored job")
+    output = ctx.run(run_callback)
+
+    assert len(output[0].data[0]["x"]) == len(legs)
+    assert not "x" in output[1].to_dict()["data"][0].keys()
+
+@patch("helpers.graphics.ICON_IMAGE_LEGS", 1)
+def test_display_graphics_markers(locomotion_data_default, tour_data_default_2_legs,
+    samplesets_feasible_infeasible):
+    """Test that icons of long tours are drawn as marker traces, not images."""
+
+    def run_callback():
+        context_value.set(AttributeDict(**
+            {"triggered_inputs": [{"prop_id": "solutions_print_code.value"}],}))
+
+        return display_graphics(solutions_print_code.get(), problem_print_code.get(), \
+            locomotion_state.get())
+
+    solutions_print_code.set(sampleset_to_json(samplesets_feasible_infeasible["feasible"]))
+    problem_print_code.set(tour_to_json(tour_data_default_2_legs))
+    locomotion_state.set(state_to_json(locomotion_data_default))
+
+    app.figure_cache.clear()
+    ctx = copy_context()
+
+    output = ctx.run(run_callback)
+
+    for fig in output[:2]:
+        assert len(fig.layout.images) == 1      # Background only
+        assert type(fig.data[0]) == plotly.graph_objs.Bar
+        markers = [trace for trace in fig.data[1:] if trace.y[0] < 0]
+        assert sum(len(trace.x) for trace in markers) == 2
+        assert all(type(trace) == plotly.graph_objs.Scatter for trace in fig.data[1:])
+
+@patch("helpers.graphics.MAX_BARS", 10)
+def test_display_graphics_zoom(locomotion_data_default):
+    """Test that long tours are drawn in merged segments and zoomed in at full detail."""
+
+    def run_callback(trigger, relayout, graph_state):
+        context_value.set(AttributeDict(**
+            {"triggered_inputs": [{"prop_id": trigger}],}))
+
+        return display_space(None, problem_print_code.get(), locomotion_state.get(),
+            relayout, "tab_graph", "tab_space", False, graph_state)
+
+    legs = set_legs(40, 2, 10, seed=0)
+    problem_print_code.set(tour_to_json(legs))
+    locomotion_state.set(state_to_json(locomotion_data_default))
+
+    app.figure_cache.clear()
+    ctx = copy_context()
+
+    fig, state = ctx.run(run_callback, "problem_print_code.value", None, None)
+
+    assert len(fig.data[0]["x"]) == 10
+    assert sum(fig.data[0]["x"]) == pytest.approx(sum(leg["length"] for leg in legs))
+
+    x_range = (30, 60)
+    fig, state = ctx.run(run_callback, "space_graph.relayoutData",
+        {"xaxis.range[0]": x_range[0], "xaxis.range[1]": x_range[1]}, None)
+
+    starts = np.cumsum([leg["length"] for leg in legs]) - [leg["length"] for leg in legs]
+    visible = [leg for leg, start in enumerate(starts) if x_range[0] - legs[leg]["length"] <
+        start < x_range[1]]
+    assert list(fig.layout.xaxis.range) == list(x_range)
+    assert set(map(str, visible)) <= set(fig.data[0]["customdata"][:, -1])
+    assert len(fig.data[0]["x"]) <= 10 + 2
+
+    output = ctx.run(run_callback, "space_graph.relayoutData", {"autosize": True}, state)
+
+    assert output == (no_update, no_update)
+
+def test_display_graphics_patch(locomotion_data_default, tour_data_default_2_legs,
+    samplesets_feasible_infeasible):
+    """Test that graphs showing cached figures get patches of what changed."""
+
+    def run_callback(display, trigger, graph_state):
+        context_value.set(AttributeDict(**
+            {"triggered_inputs": [{"prop_id": trigger}],}))
+
+        return display(solutions_print_code.get(), problem_print_code.get(),
+            locomotion_state.get(), graph_state=graph_state)
+
+    solutions_print_code.set(sampleset_to_json(samplesets_feasible_infeasible["feasible"]))
+    problem_print_code.set(tour_to_json(tour_data_default_2_legs))
+    locomotion_state.set(state_to_json(locomotion_data_default))
+
+    app.figure_cache.clear()
+    ctx = copy_context()
+
+    _, space_state = ctx.run(run_callback, display_space, "problem_print_code.value", None)
+    fig, space_state = ctx.run(run_callback, display_space, "solutions_print_code.value",
+        space_state)
+
+    operations = fig.to_plotly_json()["operations"]
+    assert {"data", "layout"} >= {op["location"][0] for op in operations}
+    assert not any(op["location"][:3] == ["data", 0, "x"] for op in operations)
+    assert any(op["location"][:3] == ["data", 0, "texttemplate"] for op in operations)
+
+    _, feasibility_state = ctx.run(run_callback, display_feasibility,
+        "problem_print_code.value", None)
+    fig, _ = ctx.run(run_callback, display_feasibility, "solutions_print_code.value",
+        feasibility_state)
+
+    assert type(fig) == Patch
+
+    output = ctx.run(run_callback, display_space, "solutions_print_code.value", space_state)
+
+    assert output == (no_update, space_state)
+
+def test_display_graphics_decoded_once(locomotion_data_default, tour_data_default_2_legs,
+    samplesets_feasible_infeasible):
+    """Test that inline solutions are decoded once for all graphs."""
+
+    def run_callback():
+        context_value.set(AttributeDict(**
+            {"triggered_inputs": [{"prop_id": "solutions_print_code.value"}],}))
+
+        return display_graphics(solutions_print_code.get(), problem_print_code.get(), \
+            locomotion_state.get())
+
+    solutions_print_code.set(sampleset_to_json(samplesets_feasible_infeasible["feasible"]))
+    problem_print_code.set(tour_to_json(tour_data_default_2_legs))
+    locomotion_state.set(state_to_json(locomotion_data_default))
+
+    app.figure_cache.clear()
+    app.decoded_samples.clear()
+    ctx = copy_context()
+
+    with patch("app.decode_samples", wraps=app.decode_samples) as decode:
+        ctx.run(run_callback)
+        app.figure_cache.clear()
+        ctx.run(run_callback)
+
+    assert decode.call_count == 1
+
+def test_display_graphics_hidden(locomotion_data_default, tour_data_default_2_legs,
+    samplesets_feasible_infeasible):
+    """Test that graphs in hidden tabs are drawn only once opened."""
+
+    def run_callback(trigger, active_tab, graph_tab, graph_solutions, graph_state):
+        context_value.set(AttributeDict(**
+            {"triggered_inputs": [{"prop_id": trigger}],}))
+
+        return display_time(solutions_print_code.get(), problem_print_code.get(),
+            locomotion_state.get(), None, active_tab, graph_tab, graph_solutions,
+            graph_state)
+
+    solutions_print_code.set(sampleset_to_json(samplesets_feasible_infeasible["feasible"]))
+    problem_print_code.set(tour_to_json(tour_data_default_2_legs))
+    locomotion_state.set(state_to_json(locomotion_data_default))
+
+    app.figure_cache.clear()
+    ctx = copy_context()
+
+    for active_tab, graph_tab in [("tab_graph", "tab_space"), ("tab_cqm", "tab_time")]:
+        output = ctx.run(run_callback, "solutions_print_code.value", active_tab,
+            graph_tab, None, None)
+        assert output == (no_update, no_update)
+    assert len(app.figure_cache) == 0
+
+    fig, state = ctx.run(run_callback, "graph_tabs.active_tab", "tab_graph", "tab_time",
+        True, None)
+
+    assert len(fig.data[0]["x"]) == 2
+
+    output = ctx.run(run_callback, "tabs.active_tab", "tab_graph", "tab_time", True, state)
+
+    assert output == (no_update, no_update)
+
+@patch("helpers.graphics.MAX_FEASIBILITY_POINTS", 40)
+def test_display_graphics_feasibility_binned(locomotion_data_default):
+    """Test that feasibility plots of many distinct points keep the best and bin the others."""
+
+    def run_callback():
+        context_value.set(AttributeDict(**
+            {"triggered_inputs": [{"prop_id": "solutions_print_code.value"}],}))
+
+        return display_feasibility(solutions_print_code.get(), problem_print_code.get(),
+            locomotion_state.get())
+
+    legs = set_legs(10, 2, 10, seed=0)
+    labels = [f"{mode}_{leg}" for leg in range(10) for mode in locomotion_data_default]
+    rng = np.random.default_rng(0)
+    samples = np.zeros((300, 10, 4), dtype=np.int8)
+    np.put_along_axis(samples, rng.integers(4, size=(300, 10, 1)), 1, axis=2)
+    energies = rng.permutation(300)
+    sampleset = dimod.SampleSet.from_samples((samples.reshape(300, -1), labels), "BINARY",
+        energies, is_feasible=energies % 2 == 0)
+
+    solutions_print_code.set(sampleset_to_json(sampleset))
+    problem_print_code.set(tour_to_json(legs))
+    locomotion_state.set(state_to_json(locomotion_data_default))
+
+    app.figure_cache.clear()
+    ctx = copy_context()
+
+    fig, _ = ctx.run(run_callback)
+
+    assert sum(len(trace.x) for trace in fig.data) <= 40
+    assert sum(sum(trace.marker.size) for trace in fig.data) == 300
+    assert 0 in {energy for trace in fig.data for energy in trace.customdata[:, 0]}
+    assert "of 300 distinct points" in fig.layout.annotations[0].text
@@ -26,8 +26,11 @@ import json
 import dimod
 from dwave.cloud import api
 
+from helpers import formatting
+from helpers.formatting import sampleset_from_json
 from helpers.jobs import TERMINATED
 
+import app
 from app import display_solutions
 
 job_submit_state = ContextVar('job_submit_state')
@@ -64,8 +67,7 @@ parametrize_vals = [
 ("Status: COMPLETED", "123", sampleset_feasible, "Feasible solutions: 50.0%"),
 ("Status: CANCELLED", "123", "No solutions for last submission", "No solutions for last submission"),
 ("Status: PENDING", "123", no_update, no_update),
-("Status: COMPLETED", "456", json.dumps(sampleset_infeasible.to_serializable()),
-    "No feasible solutions found."),]
+("Status: COMPLETED", "456", sampleset_infeasible, "No feasible solutions found."),]
 
 @pytest.mark.parametrize("job_submit_state_val, job_id_val, solutions_code, solutions_human",
     parametrize_vals)
@@ -88,7 +90,7 @@ def test_display_solutions(job_submit_state_val, job_id_val, solutions_code,
 
     output = ctx.run(run_callback)
 
-    if job_submit_state_val == "Status: COMPLETED" and job_id_val == "123":
+    if job_submit_state_val == "Status: COMPLETED":
 
         assert solutions_code == dimod.SampleSet.from_serializable(json.loads(output[0]))
         assert solutions_human in output[1].split("/n")[0]
@@ -96,3 +98,54 @@ def test_display_solutions(job_submit_state_val, job_id_val, solutions_code,
     else:
 
         assert output == (solutions_code, solutions_human)
+
+@patch("app.client", mock_client)
+def test_display_solutions_presolved():
+    """Test that variables fixed by presolve are restored to returned samplesets."""
+
+    def run_callback():
+        context_value.set(AttributeDict(**
+            {"triggered_inputs": [{"prop_id": "job_submit_state.children"}],
+             "state_values": [{"prop_id": "job_id.children"}]}))
+
+        return display_solutions("Status: COMPLETED", "123")
+
+    app.presolved_fixed.put("123", {"drive_1": 0, "walk_1": 1})
+
+    ctx = copy_context()
+
+    try:
+        output = ctx.run(run_callback)
+    finally:
+        app.presolved_fixed.pop("123")
+
+    restored = sampleset_from_json(output[0])
+
+    assert set(restored.variables) == set(sampleset.variables) | {"drive_1", "walk_1"}
+    assert [sample["walk_1"] for sample in restored.samples()] == [1, 1]
+    assert list(restored.record.is_feasible) == [True, False]
+
+@patch("app.client", mock_client)
+@patch("helpers.formatting.LARGE_SAMPLESET_VALUES", 4)
+def test_display_solutions_stored():
+    """Test that large samplesets are stored server-side and summarized."""
+
+    def run_callback():
+        context_value.set(AttributeDict(**
+            {"triggered_inputs": [{"prop_id": "job_submit_state.children"}],
+             "state_values": [{"prop_id": "job_id.children"}]}))
+
+        return display_solutions("Status: COMPLETED", "123")
+
+    ctx = copy_context()
+
+    output = ctx.run(run_callback)
+
+    assert json.loads(output[0])["key"] == "123"
+    assert json.loads(output[0])["summary"]["num_feasible"] == 1
+    assert json.loads(output[0])["summary"]["best_feasible_energy"] == \
+        sampleset_feasible.record.energy[0]
+    assert isinstance(formatting.results.get("123"), bytes)
+    assert sampleset_from_json(output[0]) == sampleset_feasible
+    assert list(sampleset_from_json(output[0]).record.is_feasible) == [True, False]
+    formatting.results.pop("123")
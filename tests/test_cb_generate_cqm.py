@@ -43,7 +43,7 @@ state_vals.extend([{"prop_id": f"{key}.value"} for key in names_budget_inputs])
 state_vals.extend([{"prop_id": "weights_state.children"}])
 state_vals.extend([{"prop_id": "locomotion_state.children"}])
 
-def mock_print(self):
+def mock_print(self, num_dominated=None, family="All", page=1):
     return self
 
 parametrize_vals = [("changed_input", dimod.ConstrainedQuadraticModel()),
@@ -167,3 +167,99 @@ def test_cqm_generation_locomotion(locomotion_data_default, weight_data_default,
     lines = output.split("\n")
     assert "0.333333333" in lines[lines.index("Time Constraint: ") + 2]
     assert "0.25" in lines[lines.index("Time Constraint: ") + 2] 
+
+
+@patch("app.formatting.cqm_to_display", mock_print)
+def test_cqm_generation_cached(locomotion_data_default, weight_data_default,
+    tour_data_default_2_legs):
+    """Test that budget changes update the cached CQM rather than rebuild it."""
+
+    def run_callback():
+        context_value.set(AttributeDict(
+            **{
+            "triggered_inputs": [{"prop_id": "changed_input.value"}],
+            "state_values": state_vals}))
+
+        return generate_cqm(changed_input.get(), problem_print_code.get(), max_leg_slope.get(),\
+            max_cost.get(), max_time.get(), weights_state.get(), \
+            locomotion_state.get())
+
+    changed_input.set("max_cost")
+    problem_print_code.set(tour_to_json(tour_data_default_2_legs))
+    max_leg_slope.set(6)
+    max_time.set(10)
+    locomotion_state.set(state_to_json(locomotion_data_default))
+    weights_state.set(state_to_json(weight_data_default))
+
+    max_cost.set(10)
+    first = copy_context().run(run_callback)
+    max_cost.set(20)
+    second = copy_context().run(run_callback)
+
+    assert second is first
+    assert second.constraints["Total cost"].rhs == 20
+
+def test_cqm_generation_pages(locomotion_data_default, weight_data_default,
+    tour_data_default_2_legs):
+    """Test that the CQM display summarizes families and pages through one."""
+
+    def run_callback():
+        context_value.set(AttributeDict(
+            **{
+            "triggered_inputs": [{"prop_id": "cqm_page.value"}],
+            "state_values": state_vals}))
+
+        return generate_cqm(changed_input.get(), problem_print_code.get(), max_leg_slope.get(),\
+            max_cost.get(), max_time.get(), weights_state.get(), \
+            locomotion_state.get(), "One-hot", page)
+
+    changed_input.set("num_legs")
+    problem_print_code.set(tour_to_json(tour_data_default_2_legs))
+    max_leg_slope.set(6)
+    for key in names_budget_inputs:
+        globals()[key].set(10)
+    locomotion_state.set(state_to_json(locomotion_data_default))
+    weights_state.set(state_to_json(weight_data_default))
+
+    with patch("helpers.formatting.CQM_PAGE_SIZE", 1):
+        page = 2
+        output = copy_context().run(run_callback)
+        page = 5
+        clamped = copy_context().run(run_callback)
+
+    lines = output.split("\n")
+    assert "One-hot: 2 constraints, 8 terms" in lines
+    assert "Page 2 of 2 (One-hot)" in lines
+    assert [line[:14] for line in lines if line.startswith("\tOne-hot")] == ["\tOne-hot leg1:"]
+    assert "Objective (Maximize Exercise):" not in lines
+    assert clamped == output
+
+@patch("helpers.formatting.MAX_POLYSTRING_TERMS", 3)
+def test_cqm_generation_truncated(locomotion_data_default, weight_data_default,
+    tour_data_default_2_legs):
+    """Test that long expressions are shortened in the CQM display."""
+
+    def run_callback():
+        context_value.set(AttributeDict(
+            **{
+            "triggered_inputs": [{"prop_id": "cqm_family.value"}],
+            "state_values": state_vals}))
+
+        return generate_cqm(changed_input.get(), problem_print_code.get(), max_leg_slope.get(),\
+            max_cost.get(), max_time.get(), weights_state.get(), \
+            locomotion_state.get(), "Cost", 1)
+
+    changed_input.set("num_legs")
+    problem_print_code.set(tour_to_json(tour_data_default_2_legs))
+    max_leg_slope.set(6)
+    for key in names_budget_inputs:
+        globals()[key].set(10)
+    locomotion_state.set(state_to_json(locomotion_data_default))
+    weights_state.set(state_to_json(weight_data_default))
+
+    output = copy_context().run(run_callback)
+
+    lines = output.split("\n")
+    cost = lines[lines.index("Cost Constraint: ") + 2]
+    assert cost.count("*") == 3
+    assert cost.endswith("+ ... (5 more terms) <= 10.0")
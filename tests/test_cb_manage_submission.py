@@ -161,3 +161,46 @@ def test_manage_submission_watchdog(btn_solve_cqm_clicks, wd_job_intervals,
         assert output[6] == job_elapsed_time_val
     else:
         assert int(output[6].split(" ")[1]) <= job_elapsed_time_val
+
+@pytest.mark.parametrize("job_push_val, btn_solve_cqm_disabled, submit_state_out",
+    [({"status": "SUBMITTED", "elapsed": 0}, True, "Status: SUBMITTED"),
+     ({"status": "IN_PROGRESS", "elapsed": 3}, True, "Status: IN_PROGRESS"),
+     ({"status": "COMPLETED", "elapsed": 4}, False, "Status: COMPLETED"),
+     ({"status": "FAILED", "elapsed": 4}, False, "Status: FAILED"),])
+def test_manage_submission_push(job_push_val, btn_solve_cqm_disabled, submit_state_out):
+    """Test that pushed statuses update the job and stop the watchdog."""
+
+    def run_callback():
+        context_value.set(AttributeDict(
+            **{"triggered_inputs": [{"prop_id": "job_push.data"}]}))
+
+        return manage_submission(1, 0, "123", "Status: PENDING", before_test, job_push_val)
+
+    ctx = copy_context()
+
+    output = ctx.run(run_callback)
+
+    assert output == (btn_solve_cqm_disabled, True, no_update, 0, submit_state_out,
+        no_update, f"Elapsed: {job_push_val['elapsed']} sec.")
+
+@pytest.mark.parametrize("job_events_val, ignored", [("push", True), ("polling", False),
+    (None, False)])
+@patch("app.jobs.get_status", mock_get_status)
+def test_manage_submission_watchdog_push(job_events_val, ignored):
+    """Test that watchdog ticks are ignored while job statuses are pushed."""
+
+    def run_callback():
+        context_value.set(AttributeDict(
+            **{"triggered_inputs": [{"prop_id": "wd_job.n_intervals"}]}))
+
+        return manage_submission(1, 3, "1", "Status: PENDING", before_test, None,
+            job_events_val)
+
+    ctx = copy_context()
+
+    output = ctx.run(run_callback)
+
+    if ignored:
+        assert output == 7*(no_update,)
+    else:
+        assert output[0:5] == (True, False, 1*1000, 0, "Status: IN_PROGRESS")
@@ -14,12 +14,14 @@
 
 from parameterized import parameterized
 import pytest
+import threading
 
 from contextvars import copy_context, ContextVar
 from dash._callback_context import context_value
 from dash._utils import AttributeDict
 from dash import no_update
 
+from helpers import jobs
 from helpers.jobs import job_bar, TERMINATED, RUNNING
 
 from app import set_progress_bar
@@ -51,3 +53,35 @@ def test_set_progress_bar(job_submit_state_val, bar_job_status_value, bar_job_st
         assert output == (bar_job_status_value, bar_job_status_color)
     except KeyError:
         assert job_submit_state_val == "Status: BREAK FUNCTION"
+
+@pytest.mark.parametrize("progress, bar_job_status_value",
+    [(None, job_bar["IN_PROGRESS"][0]), (0, job_bar["PENDING"][0]), (0.5, 75), (1, 100)])
+def test_set_progress_bar_local(progress, bar_job_status_value):
+    """Test progress bar for local jobs that report progress."""
+
+    def run_callback():
+        context_value.set(AttributeDict(**
+            {"triggered_inputs": [{"prop_id": "job_submit_state.children"}]}))
+
+        return set_progress_bar("Status: IN_PROGRESS", job_id)
+
+    reported = threading.Event()
+    finished = threading.Event()
+
+    def solve(report):
+        if progress is not None:
+            report(progress)
+        reported.set()
+        finished.wait(timeout=5)
+
+    job_id = jobs.submit_local(solve, "submitted: now")
+    assert reported.wait(timeout=5)
+
+    ctx = copy_context()
+
+    output = ctx.run(run_callback)
+    finished.set()
+    jobs.local_jobs.get(job_id)["thread"].join(timeout=5)
+
+    assert jobs.local_jobs.get(job_id)["status"] == "COMPLETED"
+    assert output == (bar_job_status_value, job_bar["IN_PROGRESS"][1])
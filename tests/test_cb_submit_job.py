@@ -25,7 +25,9 @@ from dash import no_update
 import dimod
 
 from helpers.formatting import state_to_json, state_from_json
+from helpers import jobs
 
+import app
 from app import names_budget_inputs
 
 from app import submit_job
@@ -65,10 +67,14 @@ class fake_computation():
 
 class fake_solver():
 
+    id = "fake_solver"
+    uploads = 0
+
     def __init__(self):
         self.a_fake_computation = fake_computation()
 
     def upload_cqm(self, cqm):
+        fake_solver.uploads += 1
         self.a_fake_computation.cqm = cqm
         return self.a_fake_computation
 
@@ -108,7 +114,8 @@ def test_submit_job(locomotion_data_default, job_submit_time_val, problem_print_
         context_value.set(AttributeDict(
             **{
             "triggered_inputs": [{"prop_id": "job_submit_time.children"}],
-            "state_values": state_vals}))
+            "state_values": state_vals,
+            "updated_props": {}}))
 
         return submit_job(job_submit_time.get(), problem_print_code.get(), \
             max_leg_slope.get(), max_cost.get(), max_time.get(), \
@@ -128,6 +135,7 @@ def test_submit_job(locomotion_data_default, job_submit_time_val, problem_print_
     output = ctx.run(run_callback)
 
     assert output == job_id
+    assert ctx.run(context_value.get).updated_props["bar_job_status"]["value"] == 36
 
 
 parametrize_constants = ["high tea time", problem_print_placeholder, 8, 100, 20]
@@ -159,7 +167,8 @@ def test_submit_job_weights(locomotion_data_default, job_submit_time_val,
         context_value.set(AttributeDict(
             **{
             "triggered_inputs": [{"prop_id": "job_submit_time.children"}],
-            "state_values": state_vals}))
+            "state_values": state_vals,
+            "updated_props": {}}))
 
         return submit_job(job_submit_time.get(), problem_print_code.get(), \
             max_leg_slope.get(), max_cost.get(), max_time.get(), \
@@ -173,6 +182,7 @@ def test_submit_job_weights(locomotion_data_default, job_submit_time_val,
     weights_state.set(weights_val)
     locomotion_state.set(state_to_json(locomotion_data_default))
     max_runtime.set(vars()["max_runtime_val"])
+    jobs.uploaded_cqms.clear()      # The fake solver returns only uploaded CQMs
 
     ctx = copy_context()
 
@@ -191,3 +201,109 @@ def test_submit_job_weights(locomotion_data_default, job_submit_time_val,
             output.constraint["Total cost"] == dimod.constrained.SoftConstraint(
                 weight=weight_vals["weight_cost"]["weight"],
                 penalty=weight_vals["weight_cost"]["penalty"])
+
+@patch("app.client", None)
+def test_submit_job_local(locomotion_data_default):
+    """Test that jobs are solved locally without a Leap solver."""
+
+    def run_callback():
+        context_value.set(AttributeDict(
+            **{
+            "triggered_inputs": [{"prop_id": "job_submit_time.children"}],
+            "state_values": state_vals,
+            "updated_props": {}}))
+
+        return submit_job("high tea time", problem_print_placeholder, 8, 100, 20,
+            weights_json, state_to_json(locomotion_data_default), 5)
+
+    ctx = copy_context()
+
+    output = ctx.run(run_callback)
+
+    assert jobs.is_local(output)
+    jobs.local_jobs.get(output)["thread"].join()
+    assert jobs.get_status(None, output, "high tea time") == "COMPLETED"
+    assert jobs.get_status(None, output, "later") == None
+    sampleset = jobs.get_sampleset(None, output)
+    assert sampleset.first.sample["cycle_0"] == sampleset.first.sample["cycle_1"] == 1
+    assert sampleset.record.is_feasible[0]
+
+@patch("app.client", mock_client)
+def test_submit_job_dominated(locomotion_data_default):
+    """Test that dominated variables are left out of submissions and restored as unused."""
+
+    locomotion_vals = {**locomotion_data_default,
+        "walk": {"speed": 1, "cost": 3, "exercise": 0, "use": True}}
+
+    def run_callback():
+        context_value.set(AttributeDict(
+            **{
+            "triggered_inputs": [{"prop_id": "job_submit_time.children"}],
+            "state_values": state_vals,
+            "updated_props": {}}))
+
+        return submit_job("high tea time", problem_print_placeholder, 8, 100, 20,
+            weights_json, state_to_json(locomotion_vals), "return cqm")
+
+    jobs.uploaded_cqms.clear()
+    ctx = copy_context()
+
+    output = ctx.run(run_callback)
+
+    assert not {"walk_0", "walk_1"} & set(output.variables)
+    assert app.presolved_fixed.pop(output)["walk_1"] == 0
+
+@patch("app.client", mock_client)
+def test_submit_job_fully_presolved(locomotion_data_default):
+    """Test that a CQM with every variable fixed by presolve is recorded solved, not submitted."""
+
+    locomotion_vals = {mode: {**vals, "use": mode == "bus"} for mode, vals in
+        locomotion_data_default.items()}
+
+    def run_callback():
+        context_value.set(AttributeDict(
+            **{
+            "triggered_inputs": [{"prop_id": "job_submit_time.children"}],
+            "state_values": state_vals,
+            "updated_props": {}}))
+
+        return submit_job("high tea time", problem_print_placeholder, 8, 100, 20,
+            weights_json, state_to_json(locomotion_vals), 5)
+
+    fake_solver.uploads = 0
+    jobs.uploaded_cqms.clear()
+    ctx = copy_context()
+
+    output = ctx.run(run_callback)
+
+    assert fake_solver.uploads == 0
+    assert jobs.is_solved(output)
+    assert output in jobs.solved_jobs and output not in jobs.local_jobs
+    assert jobs.get_status(None, output, "high tea time") == "COMPLETED"
+    assert jobs.get_status(None, output, "later") == None
+    assert isinstance(jobs.cancel(None, output), ValueError)
+    sampleset = jobs.get_sampleset(None, output)
+    assert sampleset.first.sample == {"bus_0": 1, "bus_1": 1}
+    assert sampleset.record.is_feasible[0]
+
+@patch("app.client", mock_client)
+def test_submit_job_upload_cached(locomotion_data_default):
+    """Test that resubmitting an unchanged problem skips the upload."""
+
+    def run_callback(max_cost):
+        context_value.set(AttributeDict(
+            **{
+            "triggered_inputs": [{"prop_id": "job_submit_time.children"}],
+            "state_values": state_vals,
+            "updated_props": {}}))
+
+        return submit_job("high tea time", problem_print_placeholder, 8, max_cost, 20,
+            weights_json, state_to_json(locomotion_data_default), 5)
+
+    jobs.uploaded_cqms.clear()
+    uploads = fake_solver.uploads
+
+    for max_cost in [100, 100, 99, 100]:
+        assert copy_context().run(run_callback, max_cost) == "67890"
+
+    assert fake_solver.uploads - uploads == 2
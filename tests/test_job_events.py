@@ -0,0 +1,69 @@
+# Copyright 2022 D-Wave Systems Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import pytest
+from unittest.mock import patch
+import datetime
+import json
+import threading
+
+from helpers import jobs
+
+import app
+
+@pytest.mark.parametrize("query", ["", "?submitted=", "?submitted=high%20tea%20time"])
+def test_job_events_invalid_time(query):
+    """Test that streams with a missing or malformed submission time are refused."""
+
+    response = app.server.test_client().get(f"/events/job/local-123{query}")
+
+    assert response.status_code == 400
+
+def test_job_events_unthreaded():
+    """Test that streams are refused by servers that are not threaded."""
+
+    submit_time = datetime.datetime.now().strftime("%c")
+    url = f"/events/job/local-123?submitted={submit_time}"
+
+    with patch("app.event_streams", threading.BoundedSemaphore(1)) as event_streams:
+        response = app.server.test_client().get(url,
+            environ_overrides={"wsgi.multithread": False})
+
+        assert response.status_code == 503
+        assert event_streams.acquire(blocking=False)
+
+@patch("app.client", None)
+def test_job_events_bounded():
+    """Test that event streams are limited in number and released when closed."""
+
+    submit_time = datetime.datetime.now().strftime("%c")
+    job_id = jobs.submit_local(lambda progress: "sampleset",
+        f"Examples - Tour Planning, submitted: {submit_time}")
+    jobs.local_jobs.get(job_id)["thread"].join(timeout=5)
+    url = f"/events/job/{job_id}?submitted={submit_time}"
+
+    with patch("app.event_streams", threading.BoundedSemaphore(1)):
+        client = app.server.test_client()
+        threaded = {"wsgi.multithread": True}
+
+        response = client.get(url, environ_overrides=threaded)
+        assert response.status_code == 200
+        assert client.get(url, environ_overrides=threaded).status_code == 503
+
+        events = [json.loads(line[len("data: "):]) for line in
+            response.get_data(as_text=True).split("\n\n") if line]
+        response.close()
+
+        assert events[-1]["status"] == "COMPLETED"
+        assert client.get(url, environ_overrides=threaded).status_code == 200
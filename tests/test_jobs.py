@@ -0,0 +1,285 @@
+# Copyright 2022 D-Wave Systems Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import pytest
+from unittest.mock import patch
+import datetime
+import json
+import threading
+import time
+
+from dwave.cloud import api
+
+from helpers import jobs
+
+def problem_status(job_id, status):
+    return api.models.ProblemStatus(id=job_id, type=api.constants.ProblemType.CQM,
+        solver=api.models.SolverIdentity(name="Henry"), submitted_on=time.time(),
+        label="Examples - Tour Planning, submitted: high tea time",
+        status=api.constants.ProblemStatus[status])
+
+statuses = {}
+requests = []
+
+class fake_problems():
+
+    connections = []
+
+    def __init__(self):
+        self.closed = False
+        fake_problems.connections.append(self)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls()
+
+    def get_problem_status(self, job_id):
+        time.sleep(0.01)
+        if job_id == "lost":
+            raise ConnectionError("connection reset")
+        if job_id == "missing":
+            raise api.exceptions.ResourceNotFoundError("Problem does not exist")
+        return statuses.get(job_id, job_id)
+
+    def get_problem_statuses(self, job_ids):
+        requests.append(job_ids)
+        if "missing" in job_ids:
+            raise api.exceptions.ResourceNotFoundError("Problem does not exist")
+        return [statuses[job_id] for job_id in job_ids]
+
+    def close(self):
+        self.closed = True
+
+@patch("helpers.jobs.Problems", fake_problems)
+def test_problems_pool():
+    """Test that pooled clients are reused, bounded, and replaced after failures."""
+
+    fake_problems.connections = []
+    pool = jobs.ProblemsPool(config=None, size=2)
+
+    def request_concurrently(num_requests):
+        threads = [threading.Thread(target=pool.request,
+            args=("get_problem_status", "123")) for _ in range(num_requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    request_concurrently(6)
+
+    assert pool.request("get_problem_status", "123") == "123"
+    assert len(fake_problems.connections) == 2
+
+    with pytest.raises(api.exceptions.ResourceNotFoundError):
+        pool.request("get_problem_status", "missing")
+    assert not any(problems.closed for problems in fake_problems.connections)
+
+    with pytest.raises(ConnectionError):
+        pool.request("get_problem_status", "lost")
+    assert sum(problems.closed for problems in fake_problems.connections) == 1
+
+    request_concurrently(2)
+    assert len(fake_problems.connections) == 3
+
+    metrics = pool.metrics()
+
+    assert metrics["requests"] == 11
+    assert metrics["failures"] == 1
+    assert metrics["reconnects"] == 1
+    assert metrics["max_in_use"] == 2
+    assert metrics["in_use"] == 0
+    assert metrics["idle"] == 2
+    assert metrics["latency_max"] >= metrics["latency_mean"] >= 0.01
+
+class fake_client():
+
+    config = None
+
+def wait_for(predicate, timeout=5):
+    """Return True once ``predicate()`` holds, rechecking on job status changes."""
+
+    with jobs.status_changed:
+        return jobs.status_changed.wait_for(predicate, timeout=timeout)
+
+@patch("helpers.jobs.Problems", fake_problems)
+def test_status_poller():
+    """Test that statuses of all watched jobs are refreshed in bulk until they end."""
+
+    statuses.update({"1": problem_status("1", "COMPLETED"),
+        "2": problem_status("2", "IN_PROGRESS")})
+    requests.clear()
+    client = fake_client()
+    poller = jobs.status_poller(client)
+    poller.interval = 0.02
+
+    assert jobs.get_status(client, "1", "high tea time") is None
+    assert jobs.get_status(client, "2", "high tea time") is None
+    assert jobs.get_status(client, "missing", "high tea time") is None
+
+    assert wait_for(lambda: jobs.get_status(client, "1", "high tea time") == "COMPLETED" and
+        jobs.get_status(client, "2", "high tea time") == "IN_PROGRESS")
+
+    assert jobs.get_status(client, "1", "later") is None
+    assert jobs.get_status(client, "2", "high tea time") == "IN_PROGRESS"
+    assert requests[0] == ["1", "2", "missing"]
+    assert all(job_ids == ["2"] for job_ids in requests[1:])
+    assert "missing" in poller.missing
+
+    statuses["2"] = problem_status("2", "COMPLETED")
+
+    assert wait_for(lambda: jobs.get_status(client, "2", "high tea time") == "COMPLETED")
+    thread = poller._thread
+    if thread is not None:
+        thread.join(timeout=5)
+    assert poller._thread is None
+
+def test_status_events():
+    """Test that status changes of local jobs are pushed as they happen."""
+
+    release = threading.Event()
+    listening = threading.Event()
+    submit_time = datetime.datetime.now().strftime("%c")
+
+    def solve(progress):
+        release.wait(timeout=5)
+        return "sampleset"
+
+    job_id = jobs.submit_local(solve, f"Examples - Tour Planning, submitted: {submit_time}")
+    events = []
+
+    def listen():
+        for event in jobs.status_events(None, job_id, submit_time, tick=10):
+            events.append(json.loads(event[len("data: "):]))
+            listening.set()
+
+    listener = threading.Thread(target=listen)
+    listener.start()
+    assert listening.wait(timeout=5)
+    release.set()
+    jobs.local_jobs.get(job_id)["thread"].join(timeout=5)
+
+    # Well within the 10 s tick, so the change was pushed rather than polled
+    listener.join(timeout=5)
+
+    assert not listener.is_alive()
+    assert events[0]["status"] in ["PENDING", "IN_PROGRESS"]
+    assert events[-1]["status"] == "COMPLETED"
+
+def test_status_events_timeout():
+    """Test that status streams of unfinished jobs end after their timeout."""
+
+    release = threading.Event()
+    submit_time = datetime.datetime.now().strftime("%c")
+    job_id = jobs.submit_local(lambda progress: release.wait(timeout=5),
+        f"Examples - Tour Planning, submitted: {submit_time}")
+
+    events = list(jobs.status_events(None, job_id, submit_time, tick=0.01, timeout=0.05))
+    release.set()
+
+    assert json.loads(events[-1][len("data: "):])["status"] in ["PENDING", "IN_PROGRESS"]
+
+def test_submit_local_failure(caplog):
+    """Test that a failing local job is logged and keeps its error."""
+
+    def solve(progress):
+        raise ValueError("no tour")
+
+    with caplog.at_level("ERROR", logger="helpers.jobs"):
+        job_id = jobs.submit_local(solve, "Examples - Tour Planning, submitted: now")
+        jobs.local_jobs.get(job_id)["thread"].join()
+
+    assert jobs.local_jobs.get(job_id)["status"] == "FAILED"
+    assert jobs.get_error(job_id) == "ValueError: no tour"
+    assert job_id in caplog.text and "no tour" in caplog.text
+
+def test_local_jobs_bounded():
+    """Test that old local jobs are evicted."""
+
+    job_ids = [jobs.submit_local(lambda progress: "sampleset",
+        "Examples - Tour Planning, submitted: now")
+        for _ in range(jobs.local_jobs.maxsize + 1)]
+
+    assert len(jobs.local_jobs) == jobs.local_jobs.maxsize
+    assert job_ids[0] not in jobs.local_jobs
+    assert jobs.get_progress(job_ids[0]) is None
+    jobs.local_jobs.get(job_ids[-1])["thread"].join()
+    assert jobs.get_sampleset(None, job_ids[-1]) == "sampleset"
+
+class fake_answer_client(fake_client):
+
+    def __init__(self):
+        self.answer_ready = threading.Event()
+        self.downloading = threading.Event()
+        self.downloads = 0
+
+    def retrieve_answer(self, job_id):
+        self.downloads += 1
+        self.downloading.set()
+        return self
+
+    @property
+    def sampleset(self):
+        self.answer_ready.wait()
+        return "sampleset"
+
+def test_prefetch_sampleset_shared():
+    """Test that downloads in flight in another process are awaited, not repeated."""
+
+    client = fake_answer_client()
+    client.answer_ready.set()
+
+    jobs.prefetch_pending.put("6", True)
+    def other_process():
+        time.sleep(0.1)
+        jobs.prefetched.put("6", "prefetched sampleset")
+        jobs.prefetch_pending.pop("6")
+    threading.Thread(target=other_process).start()
+
+    assert jobs.get_sampleset(client, "6", poll=0.01) == "prefetched sampleset"
+    assert client.downloads == 0
+
+    jobs.prefetch_pending.put("7", True)
+    threading.Timer(0.1, jobs.prefetch_pending.pop, ["7"]).start()
+
+    assert jobs.get_sampleset(client, "7", poll=0.01) == "sampleset"
+    assert client.downloads == 1
+
+    jobs.prefetch_pending.put("8", True)
+    jobs.prefetch_sampleset(client, "8")
+
+    assert client.downloads == 1
+    jobs.prefetch_pending.pop("8")
+
+@patch("helpers.jobs.Problems", fake_problems)
+def test_prefetch_sampleset():
+    """Test that samplesets of running jobs are downloaded once, ahead of completion."""
+
+    statuses.update({"5": problem_status("5", "IN_PROGRESS")})
+    client = fake_answer_client()
+    poller = jobs.status_poller(client)
+    poller.interval = 0.02
+
+    assert jobs.get_status(client, "5", "high tea time") is None
+
+    assert wait_for(lambda: jobs.get_status(client, "5", "high tea time") == "IN_PROGRESS")
+    assert client.downloading.wait(timeout=5)
+    assert client.downloads == 1
+    assert "5" not in jobs.prefetched
+
+    client.answer_ready.set()
+    assert jobs.get_sampleset(client, "5") == "sampleset"
+    assert jobs.get_sampleset(client, "5") == "sampleset"
+    assert client.downloads == 1
+
+    statuses["5"] = problem_status("5", "COMPLETED")
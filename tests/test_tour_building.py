@@ -12,15 +12,19 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+from itertools import product
 from parameterized import parameterized
+import numpy as np
 import pandas as pd
 import pytest
 import random
 
 import dimod
 
-from tour_planning import (average_tour_budget, build_cqm, leg_ranges,
-    names_leg_inputs, set_legs, tour_budget_boundaries)
+from tour_planning import (TourModel, average_tour_budget, build_aggregated_cqm,
+    build_cqm, decode_samples, dominated_modes, expand_sampleset, fixed_sampleset,
+    group_legs, leg_ranges, names_leg_inputs, presolve_cqm, restore_sampleset,
+    sample_heuristic, set_legs, solve_exact, tour_budget_boundaries, update_cqm)
 
 legs1 = [
     {"length": 10, "uphill": 5, "toll": False},
@@ -101,3 +105,451 @@ def test_set_legs(num_legs_val, max_leg_length_val,
     assert df["length"].sum() >= num_legs_val * min_leg_length_val
     assert df["length"].sum() <= num_legs_val * max_leg_length_val
     set(df["toll"].unique()) == {False, True}
+
+parametrize_names = "legs, max_leg_slope, max_cost, max_time, weight_vals"
+
+weight_vals_soft = {"weight_cost":  {"weight": 33, "penalty": "quadratic"},
+     "weight_time": {"weight": 44, "penalty": "linear"},
+     "weight_slope": {"weight": 55, "penalty": "quadratic"}}
+
+parametrize_vals = [(legs1, 5, 10, 20, weight_vals),
+    (legs2, 8, 15, 25, weight_vals_soft),
+    (set_legs(50, 1, 20), 6, 100, 50, weight_vals_soft)]
+
+@pytest.mark.parametrize(parametrize_names, parametrize_vals)
+def test_build_cqm_methods(locomotion_data_default, legs, max_leg_slope, max_cost,
+    max_time, weight_vals):
+    """Test that array and expression construction build identical CQMs."""
+
+    locomotion_vals = {**locomotion_data_default,
+        "bus": {**locomotion_data_default["bus"], "use": False}}
+
+    for loc in [locomotion_data_default, locomotion_vals]:
+        arrays = build_cqm(legs, max_leg_slope, max_cost, max_time,
+            weight_vals, loc, method="arrays")
+        expressions = build_cqm(legs, max_leg_slope, max_cost, max_time,
+            weight_vals, loc, method="expressions")
+
+        assert arrays.is_equal(expressions)
+        assert list(arrays.variables) == list(expressions.variables)
+        assert list(arrays.constraints) == list(expressions.constraints)
+        assert arrays._soft == expressions._soft
+
+def test_build_cqm_unknown_method(locomotion_data_default):
+    """Test that an unknown construction method is rejected."""
+
+    with pytest.raises(ValueError):
+        build_cqm(legs1, 5, 10, 20, weight_vals, locomotion_data_default,
+            method="unknown")
+
+def test_tour_model(locomotion_data_default):
+    """Test that the tour model holds correct, read-only coefficients."""
+
+    locomotion_vals = {**locomotion_data_default,
+        "bus": {**locomotion_data_default["bus"], "use": False}}
+
+    model = TourModel(legs1, locomotion_vals)
+
+    assert model.modes == ("walk", "cycle", "drive")
+    assert model.cost.shape == model.time.shape == model.exercise.shape == (2, 3)
+    assert model.cost[1].tolist() == [0, 40, 100]
+    assert model.time[0].tolist() == pytest.approx([10, 10/3, 10/7])
+    assert model.exercise[:, 0].tolist() == [50, 200]
+    assert model.toll_mask.tolist() == [[False, False, False], [False, False, True]]
+    assert model.too_steep(6).tolist() == [[False, False, False], [True, True, False]]
+    assert model.labels[3:] == ("walk_1", "cycle_1", "drive_1")
+    assert model.index["drive_1"] == (1, 2)
+
+    with pytest.raises(ValueError):
+        model.cost[0, 0] = 1
+    with pytest.raises(AttributeError):
+        model.modes = ("walk",)
+
+    single = dimod.SampleSet.from_samples({"walk_1": 1, "drive_0": 1, "cycle_1": 0},
+        "BINARY", 0, is_feasible=[True])
+
+    assert decode_samples(single, model).legs() == [(0, "drive"), (1, "walk")]
+    assert decode_samples(single).legs() == [(0, "drive"), (1, "walk")]
+
+    decoded = decode_samples(dimod.SampleSet.from_samples(([[1, 0, 0, 1, 0, 0],
+        [0, 1, 1, 0, 0, 0], [0, 0, 1, 0, 1, 0]], ["walk_1", "cycle_1", "drive_0",
+        "walk_0", "bus_1", "bus_0"]), "BINARY", [-3, -2, -1],
+        is_feasible=[False, True, True]), model)
+
+    assert decoded.modes == ("walk", "cycle", "drive", "bus")
+    assert decoded.choice.tolist() == [[0, 0], [2, 1], [2, 3]]
+    assert decoded.best == 1
+    assert decoded.legs() == [(0, "drive"), (1, "cycle")]
+    assert decoded.legs(2) == [(0, "drive"), (1, "bus")]
+    assert tour_budget_boundaries(legs1, locomotion_vals, model=model) == \
+        tour_budget_boundaries(legs1, locomotion_vals)
+
+parametrize_vals = [(5, 10, 20, weight_vals), (8, 10, 20, weight_vals_soft),
+    (5, 99, 20, weight_vals_soft), (3, 15, 25, weight_vals),
+    (5, 10, 20, {**weight_vals, "weight_slope": weight_vals_soft["weight_slope"]})]
+
+@pytest.mark.parametrize("max_leg_slope, max_cost, max_time, weight_vals", parametrize_vals)
+def test_update_cqm(locomotion_data_default, max_leg_slope, max_cost, max_time, weight_vals):
+    """Test that updating a CQM matches building it anew."""
+
+    model = TourModel(legs2, locomotion_data_default)
+    cqm = build_cqm(legs2, 5, 10, 20, weight_vals_soft, locomotion_data_default)
+
+    output = update_cqm(cqm, model, max_leg_slope, max_cost, max_time, weight_vals)
+    expected = build_cqm(legs2, max_leg_slope, max_cost, max_time, weight_vals,
+        locomotion_data_default)
+
+    rebuilt = max_leg_slope != 5 or \
+        weight_vals["weight_slope"] != weight_vals_soft["weight_slope"]
+    assert (output is not cqm) == rebuilt
+    assert output.is_equal(expected)
+    assert output._soft == expected._soft
+    assert output.constraints["Total cost"].rhs == max_cost
+
+def test_set_legs_seeded():
+    """Test that seeded legs are reproducible and columnar legs match."""
+
+    output = set_legs(20, 2, 10, seed=5)
+
+    assert output == set_legs(20, 2, 10, seed=5)
+    assert output != set_legs(20, 2, 10, seed=6)
+    assert all(type(leg["toll"]) == bool for leg in output)
+    assert not any(leg["toll"] for leg in set_legs(20, 2, 10, "off", seed=5))
+
+    columnar = set_legs(20, 2, 10, seed=5, columnar=True)
+
+    assert columnar["length"].tolist() == [leg["length"] for leg in output]
+    assert columnar["toll"].tolist() == [leg["toll"] for leg in output]
+
+    model = TourModel(columnar, {"walk": {"speed": 1, "cost": 0, "exercise": 1, "use": True}})
+
+    assert model.uphill.tolist() == [leg["uphill"] for leg in output]
+
+@pytest.mark.parametrize("seed, max_leg_slope, max_cost, max_time",
+    [(1, 6, 60, 30), (2, 3, 80, 40), (3, 8, 30, 60), (4, 0, 100, 20), (5, 6, 1, 1)])
+def test_solve_exact(locomotion_data_default, seed, max_leg_slope, max_cost, max_time):
+    """Test that the dynamic program finds the brute-force optimum."""
+
+    legs = set_legs(6, 1, 10, seed=seed)
+    model = TourModel(legs, locomotion_data_default)
+    allowed = ~(model.toll_mask | model.too_steep(max_leg_slope))
+
+    best = None
+    for choice in product(range(model.num_modes), repeat=len(legs)):
+        index = (np.arange(len(legs)), np.array(choice))
+        if allowed[index].all() and model.cost[index].sum() <= max_cost and \
+            model.time[index].sum() <= max_time:
+            best = max(model.exercise[index].sum(), best or 0)
+
+    output = solve_exact(legs, max_leg_slope, max_cost, max_time, locomotion_data_default)
+
+    assert list(output.variables) == list(model.labels)
+    assert output.info["exact"]
+    assert output.record.is_feasible[0] == (best is not None)
+    if best is not None:
+        assert output.first.energy == pytest.approx(-best)
+        cqm = build_cqm(legs, max_leg_slope, max_cost, max_time, weight_vals,
+            locomotion_data_default)
+        assert cqm.check_feasible(output.first.sample)
+
+def _brute_force_exercise(model, max_leg_slope, max_cost, max_time):
+    """Return the most exercise of any feasible tour, or None."""
+
+    allowed = ~(model.toll_mask | model.too_steep(max_leg_slope))
+
+    best = None
+    for choice in product(range(model.num_modes), repeat=model.num_legs):
+        index = (np.arange(model.num_legs), np.array(choice))
+        if allowed[index].all() and model.cost[index].sum() <= max_cost + 1e-6 and \
+            model.time[index].sum() <= max_time + 1e-6:
+            best = model.exercise[index].sum() if best is None else \
+                max(model.exercise[index].sum(), best)
+
+    return best
+
+@pytest.mark.parametrize("seed", range(10))
+def test_solve_exact_random(seed):
+    """Test that the dynamic program bounds, and mostly proves, the brute-force
+    optimum for random tours, locomotion values and budgets."""
+
+    rng = np.random.default_rng(seed)
+    exact = 0
+
+    for _ in range(30):
+        locomotion_vals = {mode: {"speed": rng.uniform(0.5, 20),
+            "cost": rng.uniform(0, 10), "exercise": rng.uniform(0, 5),
+            "use": bool(rng.random() < 0.85)} for mode in ["walk", "cycle", "bus", "drive"]}
+        locomotion_vals["walk"]["use"] = True
+        legs = [{"length": rng.uniform(0.1, 20), "uphill": rng.uniform(0, 10),
+            "toll": bool(rng.random() < 0.2)} for _ in range(rng.integers(1, 8))]
+        max_leg_slope = rng.uniform(0, 10)
+        max_cost, max_time = rng.uniform(1, 400), rng.uniform(1, 100)
+        model = TourModel(legs, locomotion_vals)
+
+        best = _brute_force_exercise(model, max_leg_slope, max_cost, max_time)
+        output = solve_exact(legs, max_leg_slope, max_cost, max_time, locomotion_vals)
+
+        exact += output.info["exact"]
+        if best is None:
+            assert output.info["exact"]
+            assert not output.record.is_feasible[0]
+            continue
+        assert output.info["energy_bound"] <= -best + 1e-6
+        assert output.first.energy >= -best - 1e-6
+        if output.info["exact"]:
+            assert output.record.is_feasible[0]
+            assert output.first.energy == pytest.approx(-best)
+
+    assert exact >= 25
+
+def test_solve_exact_close_states():
+    """Test that partial tours close in cost and time are not merged."""
+
+    locomotion_vals = {"walk": {"speed": 7.67, "cost": 0.15, "exercise": 0.59, "use": True},
+        "cycle": {"speed": 8.33, "cost": 6.49, "exercise": 0.76, "use": True},
+        "bus": {"speed": 1.51, "cost": 7.41, "exercise": 1.51, "use": True},
+        "drive": {"speed": 8.94, "cost": 9.09, "exercise": 4.49, "use": True}}
+    legs = [{"length": length, "uphill": uphill, "toll": False} for length, uphill in
+        [(0.46, 2.33), (11.0, 7.49), (5.08, 5.37), (19.35, 7.85), (7.68, 2.91)]]
+
+    output = solve_exact(legs, 7.49, 396.01, 74.31, locomotion_vals)
+
+    assert output.first.energy == pytest.approx(-1276.400809)
+
+def test_solve_exact_max_cells(locomotion_data_default):
+    """Test that a small table still gives a feasible tour within its bound."""
+
+    legs = set_legs(40, 1, 10, seed=3)
+    cqm = build_cqm(legs, 6, 400, 200, weight_vals, locomotion_data_default)
+
+    output = solve_exact(legs, 6, 400, 200, locomotion_data_default, max_cells=16)
+
+    assert output.record.is_feasible[0]
+    assert cqm.check_feasible(output.first.sample)
+    assert output.first.energy >= output.info["energy_bound"] - 1e-6
+
+def test_solve_exact_lattice():
+    """Test that amounts on a decimal lattice are solved provably exactly."""
+
+    locomotion_vals = {"walk": {"speed": 1, "cost": 0, "exercise": 1, "use": True},
+        "cycle": {"speed": 2, "cost": 1, "exercise": 3, "use": True},
+        "bus": {"speed": 5, "cost": 2, "exercise": 0, "use": True}}
+    legs = set_legs(7, 1, 5, seed=4)
+    model = TourModel(legs, locomotion_vals)
+    max_cost, max_time = 20, 15
+
+    output = solve_exact(legs, 10, max_cost, max_time, locomotion_vals)
+
+    assert output.info["exact"]
+    assert output.first.energy == pytest.approx(-_brute_force_exercise(model, 10,
+        max_cost, max_time))
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("weights", [weight_vals, weight_vals_soft,
+    {"weight_cost":  {"weight": 5, "penalty": "linear"},
+     "weight_time": {"weight": None, "penalty": "linear"},
+     "weight_slope": {"weight": 2, "penalty": "linear"}}])
+def test_solve_exact_soft(locomotion_data_default, seed, weights):
+    """Test that soft constraints are penalized as in the CQM, within the bound."""
+
+    legs = set_legs(6, 1, 10, seed=seed)
+    model = TourModel(legs, locomotion_data_default)
+    cqm = build_cqm(legs, 4, 20, 8, weights, locomotion_data_default)
+
+    choices = np.array(list(product(range(model.num_modes), repeat=len(legs))))
+    samples = np.zeros((len(choices), len(model.labels)), dtype=np.int8)
+    samples[np.arange(len(choices))[:, np.newaxis],
+        np.arange(len(legs))*model.num_modes + choices] = 1
+    tours = dimod.SampleSet.from_samples_cqm((samples, model.labels), cqm)
+    feasible = tours.record.energy[tours.record.is_feasible]
+    best = feasible.min() if len(feasible) else None
+
+    output = solve_exact(legs, 4, 20, 8, locomotion_data_default, weight_vals=weights)
+    expected = dimod.SampleSet.from_samples_cqm(output.first.sample, cqm)
+
+    assert output.first.energy == pytest.approx(expected.first.energy)
+    assert output.record.is_feasible[0] == expected.first.is_feasible == (best is not None)
+    if best is not None:
+        assert output.info["energy_bound"] <= best + 1e-6 <= output.first.energy + 2e-6
+        if output.info["exact"]:
+            assert output.first.energy == pytest.approx(best)
+
+@pytest.mark.parametrize("seed, max_leg_slope, max_cost, max_time",
+    [(1, 6, 60, 30), (2, 3, 80, 40), (3, 8, 30, 60), (4, 0, 100, 20), (5, 6, 1, 1)])
+def test_sample_heuristic(locomotion_data_default, seed, max_leg_slope, max_cost, max_time):
+    """Test that the heuristic returns distinct tours, correctly marked feasible."""
+
+    legs = set_legs(6, 1, 10, seed=seed)
+    model = TourModel(legs, locomotion_data_default)
+    cqm = build_cqm(legs, max_leg_slope, max_cost, max_time, weight_vals,
+        locomotion_data_default)
+    progress = []
+
+    output = sample_heuristic(legs, max_leg_slope, max_cost, max_time,
+        locomotion_data_default, seed=0, progress=progress.append)
+
+    assert list(output.variables) == list(model.labels)
+    assert len({tuple(sample) for sample in output.record.sample}) == len(output)
+    assert progress[-1] == 1
+    for datum in output.data(["sample", "energy", "is_feasible"]):
+        assert datum.is_feasible == cqm.check_feasible(datum.sample)
+        assert datum.energy == pytest.approx(cqm.objective.energy(datum.sample))
+
+    exact = solve_exact(legs, max_leg_slope, max_cost, max_time, locomotion_data_default)
+    feasible = output.filter(lambda datum: datum.is_feasible)
+
+    assert len(feasible) > 0 if exact.first.is_feasible else len(feasible) == 0
+    if exact.first.is_feasible:
+        assert feasible.first.energy == pytest.approx(exact.first.energy)
+
+def test_sample_heuristic_round_off():
+    """Test that tours on a budget up to float round-off are feasible, as for dimod."""
+
+    legs = [{"length": 0.1, "uphill": 1.0, "toll": False},
+        {"length": 0.2, "uphill": 1.0, "toll": False}]
+    locomotion_vals = {"bus": {"speed": 1, "cost": 1, "exercise": 1, "use": True}}
+    cqm = build_cqm(legs, 5, 0.3, 0.3, weight_vals, locomotion_vals)
+
+    output = sample_heuristic(legs, 5, 0.3, 0.3, locomotion_vals, seed=0)
+    exact = solve_exact(legs, 5, 0.3, 0.3, locomotion_vals)
+
+    assert cqm.check_feasible(output.first.sample)
+    assert output.record.is_feasible[0]
+    assert exact.record.is_feasible[0]
+
+@pytest.mark.parametrize("weights", [weight_vals, weight_vals_soft])
+def test_presolve_cqm(locomotion_data_default, weights):
+    """Test that presolve removes fixed variables and preserves every solution."""
+
+    legs = [{"length": 3.0, "uphill": 7.0, "toll": True},
+        {"length": 4.0, "uphill": 1.0, "toll": False},
+        {"length": 5.0, "uphill": 9.0, "toll": False}]
+    locomotion_vals = {mode: locomotion_data_default[mode] for mode in ["walk", "drive"]}
+    cqm = build_cqm(legs, 5, 40, 10, weights, locomotion_vals)
+
+    presolved, fixed = presolve_cqm(cqm)
+
+    assert "Toll to drive on leg 0" not in presolved.constraints
+    # Leg 0 has no allowed mode, so its last variable is kept to violate a constraint
+    if weights["weight_slope"]["weight"] is None:
+        assert fixed == {"drive_0": 0, "walk_2": 0, "drive_2": 1}
+        assert set(presolved.variables) == {"walk_0", "walk_1", "drive_1"}
+    else:
+        assert fixed == {"drive_0": 0}
+    assert "Total cost" in presolved.constraints
+
+    for values in product([0, 1], repeat=len(presolved.variables)):
+        sample = dict(zip(presolved.variables, values))
+        sampleset = restore_sampleset(dimod.SampleSet.from_samples(sample, "BINARY",
+            presolved.objective.energy(sample)), fixed)
+        full = sampleset.first.sample
+
+        assert set(full) == set(cqm.variables)
+        assert sampleset.first.energy == pytest.approx(cqm.objective.energy(full))
+        assert presolved.check_feasible(sample) == cqm.check_feasible(full)
+
+def test_presolve_cqm_all_fixed(locomotion_data_default):
+    """Test the solution of a CQM whose variables are all fixed by presolve."""
+
+    legs = [{"length": 3.0, "uphill": 7.0, "toll": True},
+        {"length": 4.0, "uphill": 1.0, "toll": False}]
+    locomotion_vals = {"bus": locomotion_data_default["bus"]}
+    cqm = build_cqm(legs, 5, 100, 10, weight_vals, locomotion_vals)
+
+    presolved, fixed = presolve_cqm(cqm)
+    sampleset = fixed_sampleset(cqm, {**fixed, "walk_0": 0})
+
+    assert len(presolved.variables) == 0
+    assert sampleset.first.sample == {"bus_0": 1, "bus_1": 1, "walk_0": 0}
+    assert sampleset.first.energy == pytest.approx(cqm.objective.energy(fixed))
+    assert sampleset.record.is_feasible[0]
+
+weight_vals_linear = {"weight_cost":  {"weight": None, "penalty": "linear"},
+     "weight_time": {"weight": 44, "penalty": "linear"},
+     "weight_slope": {"weight": 55, "penalty": "linear"}}
+
+@pytest.mark.parametrize("seed, max_leg_slope, max_cost, max_time",
+    [(1, 4, 60, 40), (2, 6, 30, 25), (3, 2, 90, 60)])
+def test_build_aggregated_cqm(locomotion_data_default, seed, max_leg_slope, max_cost,
+    max_time):
+    """Test that aggregated samples expand to equivalent samples of the full CQM."""
+
+    legs = random.Random(seed).choices(set_legs(8, 1, 3, seed=seed), k=40)
+    model = TourModel(legs, locomotion_data_default)
+    first, group, counts = group_legs(model)
+
+    assert len(first) < model.num_legs
+    assert counts.sum() == model.num_legs
+    assert (counts == np.bincount(group)).all()
+    assert (model.length == model.length[first][group]).all()
+
+    cqm = build_cqm(legs, max_leg_slope, max_cost, max_time, weight_vals_linear,
+        locomotion_data_default, model=model)
+    aggregated = build_aggregated_cqm(legs, max_leg_slope, max_cost, max_time,
+        weight_vals_linear, locomotion_data_default, model=model)
+
+    assert len(aggregated.variables) == len(first)*model.num_modes
+
+    rng = np.random.default_rng(seed)
+    for _ in range(10):
+        modes = rng.integers(model.num_modes, size=model.num_legs)
+        sample = {f"{mode}_group{g}": int(np.sum((group == g) & (modes == m)))
+            for g in range(len(first)) for m, mode in enumerate(model.modes)}
+        sampleset = expand_sampleset(dimod.SampleSet.from_samples(sample, "INTEGER",
+            aggregated.objective.energy(sample)), model)
+        full = sampleset.first.sample
+
+        assert set(full) == set(cqm.variables)
+        assert sampleset.first.energy == pytest.approx(aggregated.objective.energy(sample))
+        assert sampleset.first.energy == pytest.approx(cqm.objective.energy(full))
+        assert aggregated.check_feasible(sample) == cqm.check_feasible(full)
+        assert sum(max(v.violation, 0) for v in aggregated.iter_constraint_data(sample)
+            if v.label.startswith("Too steep")) == pytest.approx(
+            sum(max(v.violation, 0) for v in cqm.iter_constraint_data(full)
+            if v.label.startswith("Too steep")))
+
+def test_build_aggregated_cqm_quadratic(locomotion_data_default):
+    """Test that aggregated CQMs reject quadratic penalties."""
+
+    with pytest.raises(ValueError):
+        build_aggregated_cqm(legs2, 8, 15, 25, weight_vals_soft, locomotion_data_default)
+
+def test_dominated_modes(locomotion_data_default):
+    """Test that dominated modes are found and left out without changing the optimum."""
+
+    locomotion_vals = {**locomotion_data_default,
+        "walk": {"speed": 1, "cost": 3, "exercise": 0, "use": True},
+        "drive": {"speed": 4, "cost": 3, "exercise": 0, "use": True}}
+    legs = [{"length": 3.0, "uphill": 7.0, "toll": True},
+        {"length": 4.0, "uphill": 1.0, "toll": False}]
+    model = TourModel(legs, locomotion_vals)
+
+    dominated = dominated_modes(model, 5)
+
+    # Bus dominates walking and equal driving
+    assert dominated.tolist() == [[True, False, False, True]]*2
+
+    cqm = build_cqm(legs, 5, 30, 3, weight_vals_linear, locomotion_vals, model=model)
+    pruned = build_cqm(legs, 5, 30, 3, weight_vals_linear, locomotion_vals,
+        model=model, dominated=dominated)
+
+    assert set(pruned.variables) == {"cycle_0", "bus_0", "cycle_1", "bus_1"}
+    assert "Toll to drive on leg 0" not in pruned.constraints
+    assert "Too steep to walk on leg 0" not in pruned.constraints
+
+    def best(cqm):
+        energies = []
+        for values in product([0, 1], repeat=len(cqm.variables)):
+            sample = dict(zip(cqm.variables, values))
+            violations = cqm.violations(sample, skip_satisfied=True)
+            if all(cqm.constraints[label].lhs.is_soft() for label in violations):
+                energies.append(cqm.objective.energy(sample) + sum(
+                    cqm.constraints[label].lhs.weight()*max(violation, 0)
+                    for label, violation in violations.items()))
+        return min(energies)
+
+    assert best(pruned) == pytest.approx(best(cqm))
+
+    with pytest.raises(ValueError):
+        build_cqm(legs, 5, 40, 10, weight_vals_linear, locomotion_vals,
+            method="expressions", model=model, dominated=dominated)
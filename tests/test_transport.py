@@ -0,0 +1,65 @@
+# Copyright 2022 D-Wave Systems Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import pytest
+
+import dimod
+import numpy as np
+
+from helpers import transport
+from tour_planning import set_legs
+
+@pytest.mark.parametrize("num_legs, columnar", [(0, False), (13, False), (13, True)])
+def test_tour_round_trip(num_legs, columnar):
+    """Test that tours survive encoding, transport and decoding unchanged."""
+
+    legs = set_legs(num_legs, 2, 10, seed=3, columnar=columnar)
+    text = transport.to_transport(transport.encode_tour(legs))
+    decoded = transport.decode_tour(transport.from_transport(text), columnar=columnar)
+
+    if columnar:
+        for key in ["length", "uphill", "toll"]:
+            assert np.array_equal(decoded[key], legs[key])
+    else:
+        assert decoded == legs
+
+def test_sampleset_round_trip(tmp_path):
+    """Test that samplesets survive encoding, saving and memory-mapped decoding."""
+
+    sampleset = dimod.SampleSet.from_samples(([[0, 1, 1], [1, 0, 1]],
+        ["drive_0", "walk_0", "bus_1"]), "BINARY", [1.5, -2],
+        info={"problem_id": "123"}, is_satisfied=[[True, False], [True, True]],
+        is_feasible=[False, True])
+
+    path = tmp_path / "sampleset.bin"
+    transport.save(path, transport.encode_sampleset(sampleset))
+    decoded = transport.decode_sampleset(transport.load(path))
+
+    assert decoded == sampleset
+    assert decoded.info == sampleset.info
+    assert decoded.record.dtype == sampleset.record.dtype
+    assert np.array_equal(decoded.record.is_satisfied, sampleset.record.is_satisfied)
+    assert list(decoded.record.is_feasible) == [False, True]
+
+def test_payload_checks():
+    """Test that mismatched payloads and unsupported samplesets are rejected."""
+
+    payload = transport.encode_tour(set_legs(3, 2, 10, seed=3))
+
+    with pytest.raises(ValueError, match="not a sampleset"):
+        transport.decode_sampleset(payload)
+    with pytest.raises(ValueError, match="newer"):
+        transport.decode_tour(payload[:4] + bytes([transport.FORMAT_VERSION + 1]) + payload[5:])
+    with pytest.raises(ValueError, match="binary"):
+        transport.encode_sampleset(dimod.SampleSet.from_samples([-1, 1], "SPIN", 0))
@@ -12,7 +12,9 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
-import random
+import math
+from types import MappingProxyType
+
 import numpy as np
 
 import dimod
@@ -40,20 +42,32 @@ weight_ranges = {"weight_cost": [0, 100000],
 budget_ranges =  {"max_cost": [0, 100000],
     "max_time": [0, 100000]}
 
-def set_legs(num_legs, min_leg_length, max_leg_length, tollbooths=True):
-    """Create legs of random length within the configured ranges."""
+def set_legs(num_legs, min_leg_length, max_leg_length, tollbooths=True, seed=None,
+    columnar=False):
+    """Create legs of random length within the configured ranges.
+
+    Lengths, slopes and tollbooths are each drawn in a single call to a
+    ``numpy.random.Generator`` seeded by ``seed``, so the same parameters and
+    seed always regenerate the same tour. Set ``columnar`` to get a dict of
+    "length", "uphill" and "toll" arrays rather than a list of legs.
+    """
 
     toll_probablity = 0.2
     if tollbooths == "off":
         toll_probablity = 0
 
-    return [{
-        "length": round((max_leg_length - min_leg_length)*random.random() +
-            min_leg_length, 1),
-        "uphill": round(10*random.random(), 1),
-        "toll": bool(np.random.choice([True, False], 1,
-            p=[toll_probablity, 1 - toll_probablity])[0])}
-        for i in range(num_legs)]
+    rng = np.random.default_rng(seed)
+
+    length = np.round((max_leg_length - min_leg_length)*rng.random(num_legs) +
+        min_leg_length, 1)
+    uphill = np.round(10*rng.random(num_legs), 1)
+    toll = rng.random(num_legs) < toll_probablity
+
+    if columnar:
+        return {"length": length, "uphill": uphill, "toll": toll}
+
+    return [{"length": l, "uphill": u, "toll": t} for l, u, t in
+        zip(length.tolist(), uphill.tolist(), toll.tolist())]
 
 def average_tour_budget(legs):
     """Return average values of tour cost & time for the given legs.
@@ -89,14 +103,191 @@ names_budget_inputs = list(budget_ranges.keys())
 
 MAX_SOLVER_RUNTIME = 600
 
-def tour_budget_boundaries(legs, locomotion_vals):
+ATOL = 1e-6     # Budget tolerance of local solvers, as in ``dimod`` feasibility checks
+
+class TourModel:
+    """Leg x mode coefficients of a tour for the active modes of locomotion.
+
+    Built once from ``legs``, as a list of legs or as columnar arrays, and
+    ``locomotion_vals`` and read-only thereafter.
+    Rows of the matrices are legs and columns are the active modes, in the
+    variable order of :func:`build_cqm`.
+
+    Attributes:
+        modes: Names of the active modes.
+        length, uphill, toll: Per-leg length, elevation and tollbooth arrays.
+        mode_speed, mode_cost, mode_exercise: Per-mode locomotion values.
+        cost, time, exercise: Leg x mode totals for each choice of mode.
+        toll_mask: Leg x mode mask of driving on a tolled leg.
+        slope_mask: Leg x mode mask of the modes limited by a leg's slope.
+        labels: CQM variable labels, ``"<mode>_<leg>"``, in row-major order.
+        index: Mapping of variable labels to ``(leg, mode_index)``.
+    """
+
+    __slots__ = ("modes", "length", "uphill", "toll", "mode_speed", "mode_cost",
+        "mode_exercise", "cost", "time", "exercise", "toll_mask", "slope_mask",
+        "labels", "index")
+
+    def __init__(self, legs, locomotion_vals):
+
+        modes = tuple(key for key in locomotion_vals.keys() if locomotion_vals[key]["use"])
+
+        if isinstance(legs, dict):      # Columnar legs from ``set_legs``
+            length = np.asarray(legs["length"], dtype=float)
+            uphill = np.asarray(legs["uphill"], dtype=float)
+            toll = np.asarray(legs["toll"], dtype=bool)
+        else:
+            length = np.array([l["length"] for l in legs], dtype=float)
+            uphill = np.array([l["uphill"] for l in legs], dtype=float)
+            toll = np.array([l["toll"] for l in legs], dtype=bool)
+        speed = np.array([locomotion_vals[mode]["speed"] for mode in modes], dtype=float)
+        cost = np.array([locomotion_vals[mode]["cost"] for mode in modes], dtype=float)
+        exercise = np.array([locomotion_vals[mode]["exercise"] for mode in modes], dtype=float)
+
+        arrays = {"length": length, "uphill": uphill, "toll": toll,
+            "mode_speed": speed, "mode_cost": cost, "mode_exercise": exercise,
+            "cost": cost*length[:, np.newaxis],
+            # Matches symbolic division, which multiplies by the reciprocal
+            "time": length[:, np.newaxis]*(1/speed),
+            "exercise": exercise*length[:, np.newaxis]*uphill[:, np.newaxis],
+            "toll_mask": toll[:, np.newaxis] & (np.array(modes) == "drive"),
+            "slope_mask": np.broadcast_to(np.isin(modes, ["walk", "cycle"]),
+                (len(length), len(modes)))}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            array.setflags(write=False)
+            object.__setattr__(self, name, array)
+
+        labels = tuple(f"{mode}_{i}" for i in range(len(length)) for mode in modes)
+        object.__setattr__(self, "modes", modes)
+        object.__setattr__(self, "labels", labels)
+        object.__setattr__(self, "index", MappingProxyType({label: divmod(i, len(modes))
+            for i, label in enumerate(labels)}))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    @property
+    def num_legs(self):
+        return len(self.length)
+
+    @property
+    def num_modes(self):
+        return len(self.modes)
+
+    def coefficients(self, measure):
+        """Return the leg x mode matrix for "Cost", "Time" or "Exercise"."""
+
+        return getattr(self, measure.lower())
+
+    def too_steep(self, max_leg_slope):
+        """Return the leg x mode mask of modes too steep for ``max_leg_slope``."""
+
+        return self.slope_mask & (self.uphill[:, np.newaxis] > max_leg_slope)
+
+def dominated_modes(model, max_leg_slope):
+    """Return the leg x mode mask of modes dominated by another mode of the leg.
+
+    A mode is dominated if another mode of the leg that is not tolled, and not
+    too steep unless the dominated mode is too, costs no more, takes no more
+    time and gives no less exercise; among modes equal in all three, all but
+    the first are dominated. Replacing a dominated mode by its dominating mode
+    never worsens the objective or any constraint, so removing dominated
+    variables keeps an optimal solution.
+    """
+
+    steep = model.too_steep(max_leg_slope)
+    cost, time, exercise = model.cost, model.time, model.exercise
+
+    # Axis 1 is the dominating mode and axis 2 the dominated mode
+    a, b = (slice(None), slice(None), np.newaxis), (slice(None), np.newaxis, slice(None))
+    no_worse = (cost[a] <= cost[b]) & (time[a] <= time[b]) & (exercise[a] >= exercise[b])
+    better = (cost[a] < cost[b]) | (time[a] < time[b]) | (exercise[a] > exercise[b])
+    first = np.arange(model.num_modes)[:, np.newaxis] < np.arange(model.num_modes)
+    dominates = no_worse & (better | first) & ~model.toll_mask[a] & (steep[a] <= steep[b])
+
+    return dominates.any(axis=1)
+
+class DecodedSamples:
+    """Modes of locomotion chosen per leg by each sample of a sampleset.
+
+    Built by :func:`decode_samples` and shared, read-only, by the consumers
+    of a job's samples.
+
+    Attributes:
+        modes: Names of the modes indexed by ``choice``: the active modes of
+            the model followed by any others found in the sampleset.
+        choice: Samples x legs int8 array of mode indices, -1 for unset legs.
+        feasible: Feasibility mask of the samples.
+        best: Row of the lowest-energy feasible sample, or None.
+        energy: Energies of the samples.
+    """
+
+    __slots__ = ("modes", "choice", "feasible", "best", "energy")
+
+    def __init__(self, modes, choice, feasible, energy):
+
+        best = None
+        if feasible.any():
+            rows = np.flatnonzero(feasible)
+            best = int(rows[np.argmin(energy[rows])])
+
+        choice.flags.writeable = False
+        for name, value in [("modes", tuple(modes)), ("choice", choice),
+            ("feasible", feasible), ("best", best), ("energy", energy)]:
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def legs(self, row=None):
+        """Return ``(leg, mode)`` pairs of a sample, by default the best feasible."""
+
+        row = self.best if row is None else row
+        if row is None:
+            return None
+
+        return [(leg, self.modes[mode]) for leg, mode in
+            enumerate(self.choice[row].tolist()) if mode >= 0]
+
+def decode_samples(sampleset, model=None):
+    """Decode every sample of a binary sampleset into a :class:`DecodedSamples`.
+
+    Labels are looked up in the index of ``model`` if given; others are parsed.
+    """
+
+    index = model.index if model is not None else {}
+    modes = list(model.modes) if model is not None else []
+
+    positions = []
+    for label in sampleset.variables:
+        if label in index:
+            positions.append(index[label])
+        else:
+            mode, leg = label.split("_")
+            if mode not in modes:
+                modes.append(mode)
+            positions.append((int(leg), modes.index(mode)))
+    legs, mode_index = np.array(positions, dtype=int).reshape(-1, 2).T
+
+    record = sampleset.record
+    num_legs = max(model.num_legs if model is not None else 0,
+        legs.max() + 1 if len(legs) else 0)
+    choice = np.full((len(record), num_legs), -1, dtype=np.int8)
+    rows, columns = np.nonzero(record.sample == 1)
+    choice[rows, legs[columns]] = mode_index[columns]
+
+    return DecodedSamples(modes, choice, record.is_feasible, record.energy)
+
+def tour_budget_boundaries(legs, locomotion_vals, model=None):
     """Return boundary values of tour cost & time for the given legs."""
 
-    modes = [key for key in locomotion_vals.keys() if locomotion_vals[key]["use"]]
+    if model is None:
+        model = TourModel(legs, locomotion_vals)
 
-    legs_total = sum(l["length"] for l in legs)
-    costs = [locomotion_vals[mode]["cost"] for mode in modes]
-    speeds = [locomotion_vals[mode]["speed"] for mode in modes]
+    legs_total = sum(model.length.tolist())
+    costs = model.mode_cost.tolist()
+    speeds = model.mode_speed.tolist()
     cost_min = round(legs_total * min(costs), 1)
     cost_max = round(legs_total * max(costs), 1)
     cost_avg = round(legs_total * np.mean([min(costs), max(costs)]), 1)
@@ -107,53 +298,30 @@ def tour_budget_boundaries(legs, locomotion_vals):
     return {"cost_min": cost_min, "cost_max": cost_max, "cost_avg": cost_avg,
         "time_min": time_min, "time_max": time_max, "time_avg": time_avg}
 
-def _calculate_total(t, measure, legs, locomotion_vals):
+def _calculate_total(t, measure, model):
     """Helper function for building the CQM."""
 
-    modes = [key for key in locomotion_vals.keys() if locomotion_vals[key]["use"]]
-    num_modes = len(modes)
-
-    num_legs = len(legs)
-
-    if measure == "Exercise":
-        return dimod.quicksum(
-            t[i]*locomotion_vals[t[i].variables[0].split("_")[0]]["exercise"] *
-            legs[i//num_modes]["length"]*legs[i//num_modes]["uphill"] for
-            i in range(num_modes*num_legs))
-    elif measure == "Time":
+    return dimod.quicksum(var*bias for var, bias in
+        zip(t, model.coefficients(measure).ravel().tolist()))
 
-        return dimod.quicksum(
-            t[i]*legs[i//num_modes]["length"]/locomotion_vals[t[i].variables[0].split("_")[0]]["speed"] for
-            i in range(num_modes*num_legs))
-    else: # measure == "Cost"
-        return dimod.quicksum(t[i]*locomotion_vals[t[i].variables[0].split("_")[0]]["cost"] *
-        legs[i//num_modes]["length"] for
-        i in range(num_modes*num_legs))
+def _build_cqm_expressions(legs, max_leg_slope, max_cost, max_time,
+    weight_vals, model):
+    """Build the CQM from symbolic expressions, one variable at a time."""
 
-def build_cqm(legs, max_leg_slope, max_cost, max_time,
-    weight_vals, locomotion_vals):
-    """Build CQM for maximizing exercise. """
-
-    modes = [key for key in locomotion_vals.keys() if locomotion_vals[key]["use"]]
+    modes = model.modes
     num_modes = len(modes)
 
-    num_legs = len(legs)
-    t= [dimod.Binary(f"{mode}_{i}") for i in range(num_legs) for mode in modes]
+    num_legs = model.num_legs
+    toll = model.toll.tolist()
+    uphill = model.uphill.tolist()
+    t= [dimod.Binary(label) for label in model.labels]
 
     cqm = dimod.ConstrainedQuadraticModel()
-    cqm.set_objective(-_calculate_total(t, "Exercise", legs, locomotion_vals))
+    cqm.set_objective(-_calculate_total(t, "Exercise", model))
 
     for leg in range(num_legs):
         cqm.add_constraint(dimod.quicksum(t[num_modes*leg:num_modes*leg+num_modes]) == 1,
             label=f"One-hot leg{leg}")
-    cqm.add_constraint(_calculate_total(t, "Cost", legs, locomotion_vals) <= max_cost,
-        label="Total cost",
-        weight=weight_vals["weight_cost"]["weight"],
-        penalty=weight_vals["weight_cost"]["penalty"])
-    cqm.add_constraint(_calculate_total(t, "Time", legs, locomotion_vals) <= max_time,
-        label="Total time",
-        weight=weight_vals["weight_time"]["weight"],
-        penalty=weight_vals["weight_time"]["penalty"])
 
     if "drive" in modes:
         drive_index = list(modes).index("drive")
@@ -162,20 +330,881 @@ def build_cqm(legs, max_leg_slope, max_cost, max_time,
     if "walk" in modes:
         walk_index = list(modes).index("walk")
     for leg in range(num_legs):
-        if legs[leg]["toll"] and "drive" in modes:
+        if toll[leg] and "drive" in modes:
              cqm.add_constraint(t[num_modes*leg:num_modes*leg+num_modes][drive_index] == 0,
                 label=f"Toll to drive on leg {leg}")
         if "cycle" in modes:
              cqm.add_constraint(t[num_modes*leg:num_modes*leg+num_modes][cycle_index] * \
-                legs[leg]["uphill"] <= max_leg_slope,
+                uphill[leg] <= max_leg_slope,
                 label=f"Too steep to cycle on leg {leg}",
                 weight=weight_vals["weight_slope"]["weight"],
                 penalty=weight_vals["weight_slope"]["penalty"])
         if "walk" in modes:
              cqm.add_constraint(t[num_modes*leg:num_modes*leg+num_modes][walk_index] * \
-                legs[leg]["uphill"] <= max_leg_slope,
+                uphill[leg] <= max_leg_slope,
                 label=f"Too steep to walk on leg {leg}",
                 weight=weight_vals["weight_slope"]["weight"],
                 penalty=weight_vals["weight_slope"]["penalty"])
 
+    cqm.add_constraint(_calculate_total(t, "Cost", model) <= max_cost,
+        label="Total cost",
+        weight=weight_vals["weight_cost"]["weight"],
+        penalty=weight_vals["weight_cost"]["penalty"])
+    cqm.add_constraint(_calculate_total(t, "Time", model) <= max_time,
+        label="Total time",
+        weight=weight_vals["weight_time"]["weight"],
+        penalty=weight_vals["weight_time"]["penalty"])
+
+    return cqm
+
+def _linear_model(biases, labels):
+    """Return a BQM with the given linear biases for the labeled variables."""
+
+    return dimod.BinaryQuadraticModel.from_numpy_vectors(biases.ravel(),
+        ([], [], []), 0.0, "BINARY", variable_order=labels)
+
+def _add_leg_constraints(cqm, model, max_leg_slope, weight_vals, tolls=True,
+    variables=None):
+    """Add per-leg tollbooth (optionally) and "Too steep" constraints.
+
+    Constraints are added only on ``variables`` of the CQM, if given.
+    """
+
+    for leg, (toll, uphill) in enumerate(zip(model.toll.tolist(), model.uphill.tolist())):
+        if tolls and toll and "drive" in model.modes and \
+            (variables is None or f"drive_{leg}" in variables):
+            cqm.add_constraint_from_iterable(
+                [(f"drive_{leg}", 1)], "==", 0,
+                label=f"Toll to drive on leg {leg}")
+        for mode in ["cycle", "walk"]:
+            if mode in model.modes and \
+                (variables is None or f"{mode}_{leg}" in variables):
+                cqm.add_constraint_from_iterable(
+                    [(f"{mode}_{leg}", uphill)], "<=", max_leg_slope,
+                    label=f"Too steep to {mode} on leg {leg}",
+                    weight=weight_vals["weight_slope"]["weight"],
+                    penalty=weight_vals["weight_slope"]["penalty"])
+
+def _build_cqm_arrays(legs, max_leg_slope, max_cost, max_time,
+    weight_vals, model, dominated=None):
+    """Build the CQM from NumPy coefficient arrays, adding linear terms in bulk."""
+
+    num_modes = model.num_modes
+
+    num_legs = model.num_legs
+    labels = model.labels
+    cost, time, exercise = model.cost, model.time, model.exercise
+    variables = None
+
+    if dominated is not None and dominated.any():
+        keep = ~dominated
+        labels = [v for v, k in zip(labels, keep.ravel().tolist()) if k]
+        cost, time, exercise = cost[keep], time[keep], exercise[keep]
+        variables = set(labels)
+
+    cqm = dimod.ConstrainedQuadraticModel()
+    cqm.set_objective(_linear_model(-exercise, labels))
+
+    for leg in range(num_legs):
+        cqm.add_constraint_from_iterable(
+            ((v, 1) for v in model.labels[num_modes*leg:num_modes*leg+num_modes]
+            if variables is None or v in variables), "==", 1,
+            label=f"One-hot leg{leg}")
+
+    _add_leg_constraints(cqm, model, max_leg_slope, weight_vals, variables=variables)
+
+    # Budgets go last so that update_cqm() replaces them without reindexing
+    # the per-leg constraints
+    cqm.add_constraint_from_model(_linear_model(cost, labels), "<=", max_cost,
+        label="Total cost",
+        weight=weight_vals["weight_cost"]["weight"],
+        penalty=weight_vals["weight_cost"]["penalty"], copy=False)
+    cqm.add_constraint_from_model(_linear_model(time, labels), "<=", max_time,
+        label="Total time",
+        weight=weight_vals["weight_time"]["weight"],
+        penalty=weight_vals["weight_time"]["penalty"], copy=False)
+
+    return cqm
+
+def build_cqm(legs, max_leg_slope, max_cost, max_time,
+    weight_vals, locomotion_vals, method="arrays", model=None, dominated=None):
+    """Build CQM for maximizing exercise.
+
+    ``method`` selects how the model is constructed: "arrays" adds the
+    objective and constraints from NumPy coefficient arrays, "expressions"
+    sums symbolic ``dimod.Binary`` variables. Both produce identical models.
+    Pass a :class:`TourModel` of ``legs`` as ``model`` to reuse its coefficients.
+    Variables in a leg x mode mask ``dominated``, such as that of
+    :func:`dominated_modes`, are left out of the CQM ("arrays" method only).
+    """
+
+    if model is None:
+        model = TourModel(legs, locomotion_vals)
+
+    if method == "arrays":
+        return _build_cqm_arrays(legs, max_leg_slope, max_cost, max_time,
+            weight_vals, model, dominated)
+    elif method == "expressions":
+        if dominated is not None:
+            raise ValueError("Leaving out dominated variables requires the arrays method")
+        return _build_cqm_expressions(legs, max_leg_slope, max_cost, max_time,
+            weight_vals, model)
+    else:
+        raise ValueError(f"Unknown CQM construction method: {method}")
+
+def update_cqm(cqm, model, max_leg_slope, max_cost, max_time, weight_vals):
+    """Update budgets, slope limit, weights & penalties of a built CQM.
+
+    ``cqm`` must have been built by :func:`build_cqm` for the tour of ``model``.
+    Budgets, weights and penalties are updated in place, replacing a budget
+    constraint whose right-hand side changed, which is cheap because
+    :func:`build_cqm` adds the budget constraints last.
+    A change to the slope limit or its weight touches every "Too steep"
+    constraint, so the CQM is built anew instead.
+
+    Returns:
+        The updated CQM: ``cqm`` itself or, on a change to the slope limit or
+        its weight, a newly built CQM.
+    """
+
+    slope_label = next((f"Too steep to {mode} on leg 0" for mode in ["cycle", "walk"]
+        if mode in model.modes), None)
+    if slope_label is not None and model.num_legs:
+        slope = cqm.constraints[slope_label]
+        if slope.rhs != max_leg_slope or not _has_weight(slope,
+            weight_vals["weight_slope"]):
+            return _build_cqm_arrays(None, max_leg_slope, max_cost, max_time,
+                weight_vals, model)
+
+    for label, measure, rhs, weight in [("Total cost", "Cost", max_cost, "weight_cost"),
+        ("Total time", "Time", max_time, "weight_time")]:
+        if cqm.constraints[label].rhs != rhs:
+            cqm.remove_constraint(label)
+            cqm.add_constraint_from_model(
+                _linear_model(model.coefficients(measure), model.labels), "<=", rhs,
+                label=label,
+                weight=weight_vals[weight]["weight"],
+                penalty=weight_vals[weight]["penalty"], copy=False)
+        elif not _has_weight(cqm.constraints[label], weight_vals[weight]):
+            cqm.constraints[label].lhs.set_weight(weight_vals[weight]["weight"],
+                weight_vals[weight]["penalty"])
+
+    return cqm
+
+def _has_weight(constraint, weight_val):
+    """Return True if the constraint has the given weight and penalty."""
+
+    if weight_val["weight"] is None:
+        return not constraint.lhs.is_soft()
+
+    return constraint.lhs.is_soft() and \
+        constraint.lhs.weight() == weight_val["weight"] and \
+        constraint.lhs.penalty() == weight_val["penalty"]
+
+def group_legs(model):
+    """Group legs with identical length, uphill and tollbooth.
+
+    Returns:
+        Three-tuple of arrays: each group's first leg, each leg's group, and
+        the number of legs in each group.
+    """
+
+    keys = np.column_stack((model.length, model.uphill, model.toll))
+    _, first, group, counts = np.unique(keys, axis=0, return_index=True,
+        return_inverse=True, return_counts=True)
+
+    return first, group.ravel(), counts
+
+def build_aggregated_cqm(legs, max_leg_slope, max_cost, max_time,
+    weight_vals, locomotion_vals, model=None):
+    """Build a CQM that counts legs per mode in groups of identical legs.
+
+    Each group of legs from :func:`group_legs` has one integer variable per
+    mode, labeled like ``"walk_group3"``, counting its legs that use that
+    mode. The legs of each group add up to the group's size, replacing the
+    one-hot constraints of :func:`build_cqm`, and the tollbooth and "Too
+    steep" constraints apply to whole groups; a group's soft slope penalty
+    is the sum of its legs' linear penalties. Use :func:`expand_sampleset`
+    to assign modes to the legs of returned samples.
+
+    Quadratic penalties are not supported because ``dimod`` applies them to
+    binary variables only.
+    """
+
+    if any(weight_vals[weight]["weight"] is not None and
+        weight_vals[weight]["penalty"] == "quadratic" for weight in weight_vals):
+        raise ValueError("Aggregated CQMs support only linear penalties")
+
+    if model is None:
+        model = TourModel(legs, locomotion_vals)
+
+    first, _, counts = group_legs(model)
+    labels = [f"{mode}_group{g}" for g in range(len(first)) for mode in model.modes]
+
+    cqm = dimod.ConstrainedQuadraticModel()
+    for label, count in zip(labels, np.repeat(counts, model.num_modes).tolist()):
+        cqm.add_variable("INTEGER", label, upper_bound=count)
+
+    cqm.set_objective(zip(labels, (-model.exercise[first]).ravel().tolist()))
+
+    for g, count in enumerate(counts.tolist()):
+        cqm.add_constraint_from_iterable(
+            ((v, 1) for v in labels[model.num_modes*g:model.num_modes*(g + 1)]), "==",
+            count, label=f"Legs in group{g}")
+    cqm.add_constraint_from_iterable(zip(labels, model.cost[first].ravel().tolist()),
+        "<=", max_cost, label="Total cost",
+        weight=weight_vals["weight_cost"]["weight"],
+        penalty=weight_vals["weight_cost"]["penalty"])
+    cqm.add_constraint_from_iterable(zip(labels, model.time[first].ravel().tolist()),
+        "<=", max_time, label="Total time",
+        weight=weight_vals["weight_time"]["weight"],
+        penalty=weight_vals["weight_time"]["penalty"])
+
+    for g, (toll, uphill) in enumerate(zip(model.toll[first].tolist(),
+        model.uphill[first].tolist())):
+        if toll and "drive" in model.modes:
+            cqm.add_constraint_from_iterable(
+                [(f"drive_group{g}", 1)], "==", 0,
+                label=f"Toll to drive in group {g}")
+        for mode in ["cycle", "walk"]:
+            if mode in model.modes and uphill > max_leg_slope:
+                cqm.add_constraint_from_iterable(
+                    [(f"{mode}_group{g}", uphill - max_leg_slope)], "<=", 0,
+                    label=f"Too steep to {mode} in group {g}",
+                    weight=weight_vals["weight_slope"]["weight"],
+                    penalty=weight_vals["weight_slope"]["penalty"])
+
     return cqm
+
+def expand_sampleset(sampleset, model):
+    """Assign modes to legs from samples of :func:`build_aggregated_cqm`.
+
+    Legs of each group take the group's modes in order of leg. Legs beyond
+    a sample's counts, in samples that break a group's size, take no mode.
+
+    Returns:
+        :class:`dimod.SampleSet` over the variables of :func:`build_cqm`,
+        with the CQM objective as energy and any ``is_feasible`` field kept.
+    """
+
+    first, group, counts = group_legs(model)
+    labels = [f"{mode}_group{g}" for g in range(len(first)) for mode in model.modes]
+
+    # Each leg's rank among the legs of its group
+    order = np.argsort(group, kind="stable")
+    rank = np.empty(model.num_legs, dtype=int)
+    rank[order] = np.arange(model.num_legs) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    legs_counts = np.rint(dimod.as_samples((sampleset.record.sample,
+        sampleset.variables))[0][:, [sampleset.variables.index(v) for v in labels]])
+    ends = np.cumsum(legs_counts.reshape(len(sampleset), len(first), model.num_modes),
+        axis=2)
+    modes = (rank[:, np.newaxis] >= ends[:, group]).sum(axis=2)
+
+    samples = np.zeros((len(sampleset), model.num_legs*model.num_modes), dtype=np.int8)
+    rows, legs_index = np.nonzero(modes < model.num_modes)
+    samples[rows, legs_index*model.num_modes + modes[rows, legs_index]] = 1
+
+    vectors = {"is_feasible": sampleset.record.is_feasible} if \
+        "is_feasible" in sampleset.record.dtype.names else {}
+
+    return dimod.SampleSet.from_samples((samples, model.labels), "BINARY",
+        -samples @ model.exercise.ravel(), sort_labels=False, **vectors)
+
+def _satisfied(value, sense, rhs):
+    """Return True if ``value`` satisfies a constraint's sense and right-hand side."""
+
+    if sense is dimod.sym.Sense.Le:
+        return value <= rhs
+    if sense is dimod.sym.Sense.Ge:
+        return value >= rhs
+    return value == rhs
+
+def _substitute(model, fixed):
+    """Return a quadratic model with ``fixed`` values substituted into ``model``."""
+
+    offset = model.offset
+    linear = {}
+    for v, bias in model.iter_linear():
+        if v in fixed:
+            offset += bias*fixed[v]
+        else:
+            linear[v] = bias
+    quadratic = {}
+    for u, v, bias in model.iter_quadratic():
+        if u in fixed and v in fixed:
+            offset += bias*fixed[u]*fixed[v]
+        elif u in fixed or v in fixed:
+            u, value = (v, fixed[u]) if u in fixed else (u, fixed[v])
+            linear[u] = linear.get(u, 0) + bias*value
+        else:
+            quadratic[u, v] = bias
+
+    substituted = dimod.QuadraticModel()
+    for v in linear:
+        substituted.add_variable(model.vartype(v), v,
+            lower_bound=model.lower_bound(v), upper_bound=model.upper_bound(v))
+    substituted.add_linear_from(linear)
+    substituted.add_quadratic_from(quadratic)
+    substituted.offset = offset
+
+    return substituted
+
+def presolve_cqm(cqm):
+    """Remove variables fixed by hard constraints, and trivial constraints.
+
+    Hard constraints on a single binary variable that only one of its values
+    satisfies, such as driving on tolled legs or walking and cycling on legs
+    too steep for a hard slope constraint, fix that variable and are removed.
+    Constraints on at most one variable that any value satisfies, such as
+    slope constraints on gentle legs, are removed too. Fixing variables can
+    leave a leg's one-hot constraint with a single mode, which then fixes that
+    mode in turn.
+
+    Returns:
+        Two-tuple of the presolved CQM and a dict of the fixed variables, for
+        :func:`restore_sampleset`.
+    """
+
+    # Linear constraints on binary variables, as mutable dicts
+    linear = {}
+    offsets = {}
+    containing = {}
+    frozen = set()
+    for label, constraint in cqm.constraints.items():
+        lhs = constraint.lhs
+        if lhs.num_interactions or \
+            any(lhs.vartype(v) is not dimod.BINARY for v in lhs.variables):
+            frozen.update(lhs.variables)
+            continue
+        linear[label] = dict(lhs.linear)
+        offsets[label] = lhs.offset
+        for v in linear[label]:
+            containing.setdefault(v, []).append(label)
+
+    def satisfied(label, value):
+        constraint = cqm.constraints[label]
+        return _satisfied(value, constraint.sense, constraint.rhs)
+
+    # Rounds over constraints changed by the previous round's fixed variables
+    fixed = {}
+    removed = set()
+    pending = dict.fromkeys(linear)
+    while pending:
+        changed = {}
+        for label in pending:
+            if label in removed:
+                continue
+
+            biases = np.fromiter(linear[label].values(), dtype=float, count=len(linear[label]))
+            bounds = (offsets[label] + biases[biases < 0].sum(),
+                offsets[label] + biases[biases > 0].sum())
+
+            if len(linear[label]) <= 1 and all(satisfied(label, bound) for bound in bounds):
+                removed.add(label)
+            elif len(linear[label]) == 1 and not cqm.constraints[label].lhs.is_soft():
+                (v, bias), = linear[label].items()
+                values = [value for value in [0, 1] if
+                    satisfied(label, offsets[label] + bias*value)]
+
+                # dimod counts variable-free constraints as satisfied, so keep
+                # variables that are last in a constraint their value violates
+                others = [other for other in containing[v] if
+                    other != label and other not in removed]
+                if len(values) == 1 and v not in frozen and all(len(linear[other]) > 1 or
+                    satisfied(other, offsets[other] + linear[other][v]*values[0])
+                    for other in others):
+                    removed.add(label)
+                    fixed[v] = values[0]
+                    for other in others:
+                        offsets[other] += linear[other].pop(v)*values[0]
+                        changed[other] = None
+        pending = changed
+
+    presolved = dimod.ConstrainedQuadraticModel()
+    for v in cqm.variables:
+        if v not in fixed:
+            presolved.add_variable(cqm.vartype(v), v,
+                lower_bound=cqm.lower_bound(v), upper_bound=cqm.upper_bound(v))
+
+    presolved.set_objective(_substitute(cqm.objective, fixed))
+
+    for label, constraint in cqm.constraints.items():
+        if label in removed:
+            continue
+        if label in linear:
+            model = dimod.BinaryQuadraticModel(linear[label], {}, offsets[label], "BINARY")
+        else:
+            model = _substitute(constraint.lhs, fixed)
+        soft = constraint.lhs.is_soft()
+        presolved.add_constraint_from_model(model, constraint.sense, constraint.rhs,
+            label=label, weight=constraint.lhs.weight() if soft else None,
+            penalty=constraint.lhs.penalty() if soft else "linear", copy=False)
+
+    return presolved, fixed
+
+def restore_sampleset(sampleset, fixed):
+    """Add the variables fixed by :func:`presolve_cqm` back to a sampleset."""
+
+    if not fixed:
+        return sampleset
+
+    return dimod.append_variables(sampleset, fixed, sort_labels=False)
+
+def fixed_sampleset(cqm, fixed):
+    """Return the sampleset of the single solution of a CQM whose variables are
+    all fixed by :func:`presolve_cqm`, with its energy and feasibility.
+
+    Variables in ``fixed`` but not in ``cqm``, such as dominated variables left
+    out of it, are added to the sample.
+    """
+
+    sampleset = dimod.SampleSet.from_samples_cqm({v: fixed[v] for v in cqm.variables}, cqm)
+
+    return restore_sampleset(sampleset, {v: value for v, value in fixed.items()
+        if v not in cqm.variables})
+
+def _penalty(excess, weight_val):
+    """Return the penalty of a soft constraint violated by ``excess``."""
+
+    excess = np.where(excess > ATOL, excess, 0)
+    if weight_val["penalty"] == "quadratic":
+        return weight_val["weight"]*excess**2
+    return weight_val["weight"]*excess
+
+def _max_excess(value, weight_val):
+    """Return the most a soft constraint can be violated for a penalty of ``value``."""
+
+    if not np.isfinite(value) or weight_val["weight"] <= 0:
+        return np.inf
+    if weight_val["penalty"] == "quadratic":
+        return math.sqrt(max(value, 0)/weight_val["weight"]) + ATOL
+    return max(value, 0)/weight_val["weight"] + ATOL
+
+def _budget_axis(steps, top, max_cells):
+    """Return the cell size and number of cells of a budget's axis of the DP table.
+
+    ``steps`` are the leg x mode amounts of the budget above each leg's least,
+    NaN for forbidden modes, and the axis covers sums of these up to ``top``,
+    or is a single cell if ``top`` is None. Amounts on a decimal lattice get
+    one cell per lattice step if these fit in ``max_cells``, so the axis
+    rounds nothing.
+    """
+
+    if top is None:
+        return np.inf, 1
+
+    units = steps[np.isfinite(steps)]
+    for digits in range(5):
+        size = 10.0**-digits
+        cells = int(np.floor(top/size + ATOL)) + 1
+        if cells > max_cells:
+            break
+        if np.all(np.abs(units/size - np.round(units/size)) <= ATOL):
+            return size, cells
+
+    return (top/(max_cells - 1) if top > 0 else 1.0), max_cells
+
+def _dp_table(values, cost_steps, time_steps, shape):
+    """Fill the DP table over cost x time cells, leg by leg.
+
+    Returns:
+        The most value of tours ending in each cell, -inf if none, and the
+        leg x cell history of the mode chosen for the leg.
+    """
+
+    num_legs = values.shape[0]
+    table = np.full(shape, -np.inf)
+    table[0, 0] = 0
+    history = np.full((num_legs,) + shape, -1, dtype=np.int8)
+
+    for leg in range(num_legs):
+        new = np.full(shape, -np.inf)
+        for mode in np.flatnonzero(np.isfinite(values[leg])):
+            dc, dt = cost_steps[leg, mode], time_steps[leg, mode]
+            if dc >= shape[0] or dt >= shape[1]:
+                continue
+            candidate = table[:shape[0] - dc, :shape[1] - dt] + values[leg, mode]
+            better = candidate > new[dc:, dt:]
+            np.copyto(new[dc:, dt:], candidate, where=better)
+            np.copyto(history[leg, dc:, dt:], mode, where=better)
+        table = new
+
+    return table, history
+
+def _dp_tours(history, cost_steps, time_steps, cells):
+    """Return the tours, as the mode of each leg, of the best values in cells."""
+
+    cost_cell, time_cell = cells
+    tours = np.empty((len(cost_cell), history.shape[0]), dtype=np.int64)
+    for leg in reversed(range(history.shape[0])):
+        modes = history[leg, cost_cell, time_cell].astype(np.int64)
+        tours[:, leg] = modes
+        cost_cell = cost_cell - cost_steps[leg, modes]
+        time_cell = time_cell - time_steps[leg, modes]
+
+    return tours
+
+def solve_exact(legs, max_leg_slope, max_cost, max_time, locomotion_vals,
+    weight_vals=None, max_cells=2**18, max_candidates=256, model=None):
+    """Solve the tour locally with a dynamic program over discretized budgets.
+
+    Each leg takes one mode so as to maximize exercise less the penalties of
+    soft constraints, with the weights & penalties of ``weight_vals`` as for
+    :func:`build_cqm`; without ``weight_vals``, all constraints are hard.
+
+    A table over cells of cost x time holds the most value of the partial
+    tours in each cell. With amounts rounded down to cells, the table's best
+    values bound the optimum; the tours of up to ``max_candidates`` best cells
+    are evaluated at their actual cost and time, and the best is optimal if
+    no cell's bound exceeds it. That is always so if the amounts fit the
+    table at their decimal precision. Otherwise, tours of tables with amounts
+    rounded to the nearest cell and up, the latter meeting hard budgets, are
+    evaluated too, and the table is refined, up to ``max_cells`` cells (fewer
+    for long tours), and narrowed to the amounts over soft budgets that the
+    best tour found leaves worth paying for, over a few rounds.
+
+    Returns:
+        :class:`dimod.SampleSet` with one sample over the variables of
+        :func:`build_cqm`, the CQM objective plus any soft-constraint penalties
+        as energy, as for :meth:`dimod.SampleSet.from_samples_cqm`, and an
+        ``is_feasible`` field for the hard constraints. The sampleset's
+        ``info["exact"]`` is True if the sample is proven optimal or no tour
+        can meet the hard constraints, and ``info["energy_bound"]`` is a lower
+        bound on the optimal energy, None if no tour can. If no tour is found
+        to meet the hard constraints, the sample is the cheapest allowed tour.
+    """
+
+    if model is None:
+        model = TourModel(legs, locomotion_vals)
+
+    if weight_vals is None:
+        weight_vals = {weight: {"weight": None, "penalty": "linear"} for weight in
+            ["weight_cost", "weight_time", "weight_slope"]}
+    soft = {weight: vals["weight"] is not None for weight, vals in weight_vals.items()}
+
+    num_legs = model.num_legs
+    legs_index = np.arange(num_legs)
+
+    too_steep = model.too_steep(max_leg_slope)
+    if soft["weight_slope"]:
+        slope_penalty = np.where(too_steep, _penalty(model.uphill[:, np.newaxis] -
+            max_leg_slope, weight_vals["weight_slope"]), 0)
+        forbidden = model.toll_mask
+    else:
+        slope_penalty = np.zeros(too_steep.shape)
+        forbidden = model.toll_mask | too_steep
+    # Value of each leg's modes: exercise less any slope penalty, -inf if forbidden
+    values = np.where(forbidden, -np.inf, model.exercise - slope_penalty)
+
+    # Amounts of each budget above each leg's least allowed amount
+    budgets = []
+    for amounts, limit, weight in [(model.cost, max_cost, "weight_cost"),
+        (model.time, max_time, "weight_time")]:
+        steps = np.where(forbidden, np.nan, amounts)
+        least = np.nanmin(steps, axis=1, initial=np.inf)
+        steps = steps - least[:, np.newaxis]
+        budgets.append((amounts, steps, least.sum(), limit, weight))
+
+    def evaluate(tours):
+        """Return the energies and hard feasibility of tours."""
+        index = (legs_index, tours)
+        energy = -(model.exercise - slope_penalty)[index].sum(axis=-1)
+        feasible = ~forbidden[index].any(axis=-1)
+        for amounts, _, _, limit, weight in budgets:
+            total = amounts[index].sum(axis=-1)
+            if soft[weight]:
+                energy = energy + _penalty(total - limit, weight_vals[weight])
+            else:
+                feasible = feasible & (total <= limit + ATOL)
+        return energy, feasible
+
+    tour, best_value, bound_value = None, -np.inf, np.inf
+
+    def consider(tours):
+        """Keep the best of the tours that meet the hard constraints."""
+        nonlocal tour, best_value
+        energy, feasible = evaluate(tours)
+        tour_values = np.where(feasible, -energy, -np.inf)
+        if len(tours) and tour_values.max() > best_value:
+            tour, best_value = tours[np.argmax(tour_values)], tour_values.max()
+        return tour_values
+
+    if (~forbidden).any(axis=1).all() and all(soft[weight] or limit - least >= -ATOL
+        for _, _, least, limit, weight in budgets):
+
+        most_value = values.max(axis=1).sum()
+        consider(np.stack([values.argmax(axis=1)] + [np.where(forbidden, np.inf,
+            amounts).argmin(axis=1) for amounts, *_ in budgets]))
+
+        # Long tours get fewer cells, keeping the history under 64 MB
+        table_cells = max(4, min(max_cells, 2**26 // max(num_legs, 1)))
+
+        def axes_tops():
+            """Return the amount each budget's axis covers, None if no tour exceeds it.
+
+            No tour worth more than the best found exceeds a soft budget by
+            more than the penalty of the value it can gain.
+            """
+            tops = []
+            for _, steps, least, limit, weight in budgets:
+                span = np.nanmax(steps, axis=1, initial=0).sum() if num_legs else 0
+                if least + span <= limit + ATOL:
+                    tops.append(None)
+                elif soft[weight]:
+                    tops.append(min(span, limit - least + _max_excess(most_value -
+                        best_value, weight_vals[weight])))
+                else:
+                    tops.append(max(limit - least, 0))
+            return tops
+
+        def best_tours(grids, rounding, offset):
+            """Return the tours of the best cells, their values, and the best
+            value of the remaining cells."""
+            shape = (grids[0][1], grids[1][1])
+            steps = [np.where(forbidden, 0, rounding(np.nan_to_num(steps)/size +
+                offset)).astype(np.int64) for (_, steps, *_), (size, _) in
+                zip(budgets, grids)]
+            table, history = _dp_table(values, steps[0], steps[1], shape)
+            for axis, ((_, _, least, limit, weight), (size, cells)) in \
+                enumerate(zip(budgets, grids)):
+                if soft[weight] and cells > 1:
+                    table = table - np.expand_dims(_penalty(least + size*np.arange(cells) -
+                        limit, weight_vals[weight]), 1 - axis)
+            order = np.argsort(-table, axis=None, kind="stable")
+            order = order[np.isfinite(table.ravel()[order])]
+            rest = table.ravel()[order[max_candidates]] if len(order) > max_candidates \
+                else -np.inf
+            order = order[:max_candidates]
+            return _dp_tours(history, steps[0], steps[1], np.unravel_index(order, shape)), \
+                table.ravel()[order], rest
+
+        # Rounds start on a small table, refining it while the best tour is
+        # not proven optimal and narrowing soft budgets to better tours found
+        cells, tops = min(2**12, table_cells), axes_tops()
+        for _ in range(8):
+            grids = [_budget_axis(steps, top, math.isqrt(cells))
+                for (_, steps, *_), top in zip(budgets, tops)]
+            for axis in [0, 1]:     # An axis of fewer cells leaves more to the other
+                if grids[1 - axis][1] < math.isqrt(cells):
+                    grids[axis] = _budget_axis(budgets[axis][1], tops[axis],
+                        cells // grids[1 - axis][1])
+                    break
+
+            # Tours left out of the table are worth no more than the best found
+            tours, cell_values, rest = best_tours(grids, np.floor, ATOL)
+            tour_values = consider(tours)
+            # A cell's other tours may be worth up to its value if its best falls short
+            short = tour_values < cell_values - ATOL*np.maximum(1, np.abs(cell_values))
+            bound_value = min(bound_value, max(rest, best_value,
+                cell_values[short].max(initial=-np.inf)))
+            if best_value >= bound_value - ATOL*max(1, abs(bound_value)):
+                break
+
+            for rounding, offset in [(np.rint, 0), (np.ceil, -ATOL)]:
+                consider(best_tours(grids, rounding, offset)[0])
+
+            narrowed = axes_tops()
+            if cells == table_cells and all(top is None or new is None or
+                new > 0.9*top for top, new in zip(tops, narrowed)):
+                break
+            cells, tops = min(4*cells, table_cells), narrowed
+
+    else:
+        bound_value = -np.inf
+
+    exact = bool(best_value >= bound_value - ATOL*max(1, abs(bound_value))) \
+        if np.isfinite(bound_value) else True
+    bound = -float(bound_value) if np.isfinite(bound_value) else None
+
+    if tour is None:
+        tour = np.where(forbidden, np.inf, model.cost).argmin(axis=1)
+
+    energy, feasible = evaluate(tour)
+    sample = np.zeros((1, num_legs*model.num_modes), dtype=np.int8)
+    sample[0, legs_index*model.num_modes + tour] = 1
+
+    return dimod.SampleSet.from_samples((sample, model.labels), "BINARY", [float(energy)],
+        sort_labels=False, info={"exact": exact, "energy_bound": bound},
+        is_feasible=[bool(feasible)])
+
+def _move_table(model, allowed, score):
+    """Tabulate ratings of switching each leg from each of its modes to each other.
+
+    ``score(dc, dt, de)`` rates switches by their changes to cost, time and
+    exercise, lower is better; switches to forbidden modes are never chosen.
+
+    Returns:
+        Leg x current mode x new mode array of ratings.
+    """
+
+    rating = np.empty(model.cost.shape + (model.num_modes,))
+    for mode in range(model.num_modes):
+        rating[:, mode] = np.where(allowed, score(model.cost - model.cost[:, [mode]],
+            model.time - model.time[:, [mode]],
+            model.exercise - model.exercise[:, [mode]]), np.inf)
+        rating[:, mode, mode] = np.inf
+
+    return rating
+
+def _apply_moves(model, table, choice, slack_cost, slack_time):
+    """Return legs ordered by the rating of their best moves, and the moves.
+
+    Moves that alone exceed a positive slack in cost or time are skipped.
+    """
+
+    legs = np.arange(model.num_legs)
+    current = legs*model.num_modes + choice
+    rating = table.reshape(-1, model.num_modes)[current]
+    dc = model.cost - model.cost.ravel()[current, np.newaxis]
+    dt = model.time - model.time.ravel()[current, np.newaxis]
+    rating = np.where(((slack_cost >= 0) & (dc > slack_cost)) |
+        ((slack_time >= 0) & (dt > slack_time)), np.inf, rating)
+
+    best = rating.argmin(axis=1)
+    order = np.argsort(rating[legs, best])
+    order = order[np.isfinite(rating[order, best[order]])]
+    best = best[order]
+
+    return order, best, dc[order, best], dt[order, best]
+
+def _repair(model, tables, choice, max_cost, max_time):
+    """Switch modes, losing the least exercise, until the budgets are met.
+
+    ``tables`` holds move tables for an exceeded cost, time, or both, in
+    that order; the last is also tried when the others find no moves.
+    """
+
+    legs = np.arange(model.num_legs)
+    scale_cost = max(max_cost, 1)
+    scale_time = max(max_time, 1)
+
+    while True:
+        excess_cost = model.cost[legs, choice].sum() - max_cost
+        excess_time = model.time[legs, choice].sum() - max_time
+        if excess_cost <= ATOL and excess_time <= ATOL:
+            return True
+
+        for table in dict.fromkeys([(excess_cost > 0) + 2*(excess_time > 0) - 1, 2]):
+            order, new, dc, dt = _apply_moves(model, tables[table], choice,
+                -excess_cost, -excess_time)
+
+            # Apply the prefix of best moves that leaves the least excess
+            excess = np.maximum(np.cumsum(np.append(excess_cost, dc)), 0)/scale_cost + \
+                np.maximum(np.cumsum(np.append(excess_time, dt)), 0)/scale_time
+            num_moves = np.argmin(excess)
+            if num_moves > 0:
+                choice[order[:num_moves]] = new[:num_moves]
+                break
+        else:
+            return False
+
+def _improve(model, table, choice, max_cost, max_time):
+    """Switch modes that gain exercise for as long as they fit the budgets."""
+
+    legs = np.arange(model.num_legs)
+
+    while True:
+        slack_cost = max_cost - model.cost[legs, choice].sum()
+        slack_time = max_time - model.time[legs, choice].sum()
+
+        order, new, dc, dt = _apply_moves(model, table, choice, slack_cost, slack_time)
+        fits = (np.cumsum(dc) <= slack_cost) & (np.cumsum(dt) <= slack_time)
+        num_moves = np.argmin(fits) if not fits.all() else len(fits)
+        if num_moves == 0:
+            return
+        choice[order[:num_moves]] = new[:num_moves]
+
+def sample_heuristic(legs, max_leg_slope, max_cost, max_time, locomotion_vals,
+    num_reads=10, num_sweeps=10, perturbation=0.05, seed=None, progress=None,
+    model=None):
+    """Sample good tours locally with a vectorized greedy and local search.
+
+    Each leg starts with its allowed mode of most exercise; batches of mode
+    switches then repair exceeded budgets, losing the least exercise, and
+    spend any remaining budget on the switches that gain the most. Every
+    sweep perturbs a random ``perturbation`` fraction of legs in replicas of
+    the ``num_reads`` best distinct tours found so far, then repairs and
+    improves them. Forbidden modes and budgets are treated as hard, unlike
+    in :func:`solve_exact`, which honors soft constraints.
+
+    ``progress``, if given, is called with the fraction of sweeps completed.
+
+    Returns:
+        :class:`dimod.SampleSet` of up to ``num_reads`` distinct samples over
+        the variables of :func:`build_cqm`, the CQM objective as energy, and
+        an ``is_feasible`` field.
+    """
+
+    if model is None:
+        model = TourModel(legs, locomotion_vals)
+
+    rng = np.random.default_rng(seed)
+    num_legs = model.num_legs
+    legs_index = np.arange(num_legs)
+
+    forbidden = model.toll_mask | model.too_steep(max_leg_slope)
+    # Legs with no allowed mode keep whichever is cheapest, infeasibly
+    allowed = np.where((~forbidden).any(axis=1, keepdims=True), ~forbidden,
+        model.cost == model.cost.min(axis=1, keepdims=True, initial=np.inf))
+
+    greedy = np.lexsort((model.cost, -np.where(allowed, model.exercise, -np.inf)),
+        axis=1)[:, 0].astype(np.int8) if num_legs else np.empty(0, dtype=np.int8)
+
+    scale_cost = max(max_cost, 1)
+    scale_time = max(max_time, 1)
+    scale_exercise = max(model.exercise[legs_index, greedy].sum(), 1)
+
+    def saving(weight_cost, weight_time):
+        """Rate switches by exercise lost and other budget used per unit of
+        exceeded budget saved, all normalized."""
+        def score(dc, dt, de):
+            saved = -dc*weight_cost/scale_cost - dt*weight_time/scale_time
+            lost = -de/scale_exercise + np.maximum(dc, 0)*(1 - weight_cost)/scale_cost + \
+                np.maximum(dt, 0)*(1 - weight_time)/scale_time
+            return np.where(saved > 0, lost/np.where(saved > 0, saved, 1), np.inf)
+        return score
+
+    def gain(dc, dt, de):
+        """Rate switches by exercise gained per unit of normalized budget used."""
+        used = np.maximum(dc, 0)/scale_cost + np.maximum(dt, 0)/scale_time
+        return np.where(de > 0, -de/(used + 1e-12), np.inf)
+
+    repairs = [_move_table(model, allowed, saving(*weights))
+        for weights in [(1, 0), (0, 1), (1, 1)]]
+    improvements = _move_table(model, allowed, gain)
+
+    # Elite pool of the best distinct tours, each seeding a replica per sweep
+    elite = greedy[np.newaxis, :]
+    for sweep in range(num_sweeps):
+        candidates = np.empty((num_reads, num_legs), dtype=elite.dtype)
+        for read in range(num_reads):
+            choice = elite[read % len(elite)].copy()
+            if num_legs and (sweep > 0 or read > 0):
+                kicked = rng.choice(num_legs, max(1, round(perturbation*num_legs)),
+                    replace=False)
+                options = rng.random((len(kicked), model.num_modes))*allowed[kicked]
+                choice[kicked] = options.argmax(axis=1)
+
+            if _repair(model, repairs, choice, max_cost, max_time):
+                _improve(model, improvements, choice, max_cost, max_time)
+            candidates[read] = choice
+
+        pool = np.vstack((elite, candidates))
+        distinct = {row.tobytes(): i for i, row in enumerate(pool)}
+        elite = pool[sorted(distinct.values())]
+        exercise = model.exercise[legs_index, elite].sum(axis=1)
+        feasible = ~forbidden[legs_index, elite].any(axis=1) & \
+            (model.cost[legs_index, elite].sum(axis=1) <= max_cost + ATOL) & \
+            (model.time[legs_index, elite].sum(axis=1) <= max_time + ATOL)
+        order = np.lexsort((-exercise, ~feasible))[:num_reads]
+        elite, exercise, feasible = elite[order], exercise[order], feasible[order]
+
+        if progress:
+            progress((sweep + 1)/num_sweeps)
+
+    samples = np.zeros((len(elite), num_legs*model.num_modes), dtype=np.int8)
+    samples[np.arange(len(elite))[:, np.newaxis], legs_index*model.num_modes + elite] = 1
+
+    return dimod.SampleSet.from_samples((samples, model.labels), "BINARY",
+        -exercise, sort_labels=False, is_feasible=feasible)